@@ -0,0 +1,134 @@
+import zlib
+from functools import partial
+from typing import Callable, Dict, List, NamedTuple, Optional, Protocol, Sequence
+
+from app.core.config import COMPRESSION_BROTLI_QUALITY, COMPRESSION_GZIP_LEVEL, COMPRESSION_ZSTD_LEVEL
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class Stream(Protocol):
+    def compress(self, data: bytes) -> bytes:
+        ...
+
+    def finish(self) -> bytes:
+        ...
+
+
+class GzipStream:
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliStream:
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdStream:
+    def __init__(self, level: int) -> None:
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def _gzip(data: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _brotli(data: bytes, quality: int) -> bytes:
+    return brotli.compress(data, quality=quality)
+
+
+def _zstd(data: bytes, level: int) -> bytes:
+    # a ZstdCompressor is not safe to share between the threads compressing large bodies
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+class Codec(NamedTuple):
+    """
+    A content coding, compress for a whole body, stream for a body sent in chunks, each of them flushed
+    so the client can decode it as it arrives.
+    """
+    encoding: str
+    compress: Callable[[bytes], bytes]
+    stream: Callable[[], Stream]
+
+
+def available_codecs(
+        *,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+        zstd_level: int = COMPRESSION_ZSTD_LEVEL,
+) -> List[Codec]:
+    """
+    The codecs of the installed libraries, best first, zstd and br are preferred over gzip at equal q.
+    """
+    codecs = []
+    if zstandard is not None:
+        codecs.append(Codec("zstd", partial(_zstd, level=zstd_level), partial(ZstdStream, zstd_level)))
+    if brotli is not None:
+        codecs.append(Codec("br", partial(_brotli, quality=brotli_quality), partial(BrotliStream, brotli_quality)))
+    codecs.append(Codec("gzip", partial(_gzip, level=gzip_level), partial(GzipStream, gzip_level)))
+    return codecs
+
+
+def _qvalues(accept_encoding: str) -> Dict[str, float]:
+    qvalues = {}
+    for part in accept_encoding.split(","):
+        coding, *params = (value.strip() for value in part.split(";"))
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding.lower()] = q
+    return qvalues
+
+
+def negotiate(accept_encoding: Optional[str], codecs: Sequence[Codec]) -> Optional[Codec]:
+    """
+    The codec of the Accept-Encoding header, RFC 7231 section 5.3.4, None for the identity.
+
+    - The highest q wins, ties go to the earliest of codecs, q=0 refuses a coding.
+    - * stands for every coding the header does not name.
+    """
+    if not accept_encoding:
+        return None
+    qvalues = _qvalues(accept_encoding)
+    best, best_q = None, 0.0
+    for codec in codecs:
+        q = qvalues.get(codec.encoding, qvalues.get("*", 0.0))
+        if q > best_q:
+            best, best_q = codec, q
+    return best
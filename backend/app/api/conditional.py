@@ -0,0 +1,110 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, FrozenSet, NamedTuple, Optional
+
+from fastapi import HTTPException
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.config import VERSION
+
+# revalidate on every use, with the validators below, and keep out of shared caches
+CACHE_CONTROL = "private, no-cache"
+
+
+def _tag(*parts: Any) -> str:
+    # the app version is part of every tag, a deploy may change the representation of an unchanged row
+    digest = hashlib.blake2b(":".join(map(str, (VERSION, *parts))).encode(), digest_size=10).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class Validators(NamedTuple):
+    """
+    ETag and Last-Modified of a representation. ETags are weak, they stand for the content, not its bytes.
+    """
+    etag: str
+    last_modified: Optional[datetime] = None
+
+    @classmethod
+    def for_row(cls, kind: str, key: Any, updated_at: datetime) -> "Validators":
+        """
+        Of a representation built from one row, identified by kind and key, that changes with its updated_at.
+        """
+        updated_at = _utc(updated_at)
+        return cls(etag=_tag(kind, key, updated_at.isoformat()), last_modified=updated_at)
+
+    @classmethod
+    def for_content(cls, content: bytes) -> "Validators":
+        """
+        Of a representation with no single updated_at, aggregates and lists, from a hash of its body.
+        """
+        return cls(etag=_tag(hashlib.blake2b(content, digest_size=16).hexdigest()))
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"ETag": self.etag, "Cache-Control": CACHE_CONTROL}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+    def apply(self, response: Response) -> None:
+        response.headers.update(self.headers())
+
+
+class NotModified(HTTPException):
+    def __init__(self, validators: Validators) -> None:
+        super().__init__(status_code=status.HTTP_304_NOT_MODIFIED, headers=validators.headers())
+
+
+async def not_modified_handler(request: Request, exc: NotModified) -> Response:
+    # a 304 has no body, the default handler would write the detail
+    return Response(status_code=exc.status_code, headers=exc.headers)
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return _utc(parsedate_to_datetime(value))
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class ConditionalRequest:
+    """
+    The If-None-Match and If-Modified-Since headers of a GET, RFC 7232.
+
+    - If-None-Match wins when both are sent, its tags are compared weakly and * matches anything.
+    - If-Modified-Since is compared at the second, the precision of HTTP dates, an invalid date is ignored.
+    """
+    def __init__(self, *, if_none_match: Optional[str] = None, if_modified_since: Optional[str] = None) -> None:
+        self.etags: Optional[FrozenSet[str]] = None
+        if if_none_match:
+            self.etags = frozenset(tag.strip().replace("W/", "", 1) for tag in if_none_match.split(","))
+        self.modified_since = _parse_http_date(if_modified_since)
+
+    @property
+    def is_conditional(self) -> bool:
+        """
+        Whether the request can be answered with a 304 at all, worth looking up the validators early for.
+        """
+        return self.etags is not None or self.modified_since is not None
+
+    def is_not_modified(self, validators: Validators) -> bool:
+        if self.etags is not None:
+            return "*" in self.etags or validators.etag.replace("W/", "", 1) in self.etags
+        if self.modified_since is not None and validators.last_modified is not None:
+            return validators.last_modified.replace(microsecond=0) <= self.modified_since
+        return False
+
+    def check(self, validators: Validators) -> None:
+        """
+        Raises NotModified when the client's copy is still current.
+        """
+        if self.is_not_modified(validators):
+            raise NotModified(validators)
@@ -1,32 +1,87 @@
-from typing import Optional
+from typing import Optional, Union
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
-from app.core.config import SECRET_KEY, API_PREFIX
-from app.models.user import UserInDB
+from app.core.config import SECRET_KEY, API_PREFIX, AUTH_STATELESS_PRINCIPAL
+from app.models.token import JWTPayload
+from app.models.user import UserInDB, UserPrincipal
 from app.api.dependencies.database import get_repository
 from app.db.repositories.users import UsersRepository
-from app.services import auth_service
+from app.services import auth_service, principal_cache, revocation_list
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{API_PREFIX}/users/login/token")
 
 
+def check_token_not_revoked(payload: JWTPayload) -> None:
+    if payload.user_id is not None and revocation_list.is_revoked(user_id=payload.user_id, issued_at=payload.iat):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+def bind_unit_of_work(user_repo: UsersRepository, user: Optional[Union[UserPrincipal, UserInDB]]) -> None:
+    """
+    Lets the unit of work keep the user's reads on the primary after they write.
+    """
+    if user is not None and user_repo.uow is not None:
+        user_repo.uow.user_id = user.id
+
+
 async def get_user_from_token(
         *,
         token: str = Depends(oauth2_scheme),
         user_repo: UsersRepository = Depends(get_repository(UsersRepository)),
 ) -> Optional[UserInDB]:
-    try:
-        username = auth_service.get_username_from_token(token=token, secret_key=str(SECRET_KEY))
-        user = await user_repo.get_user_by_username(username=username)
-    except Exception as e:
-        raise e
+    """
+    Tokens that were already verified and resolved are served from the principal cache,
+    which saves the JWT decode and the users lookup on every authenticated request. Hits are
+    still checked against the revocation list, a revoked token's entry is dropped and rejected below.
+    """
+    cached_user = principal_cache.get(token, is_revoked=revocation_list.is_revoked)
+    if cached_user:
+        bind_unit_of_work(user_repo, cached_user)
+        return cached_user
+
+    payload = auth_service.get_payload_from_token(token=token, secret_key=str(SECRET_KEY))
+    check_token_not_revoked(payload)
+    user = await user_repo.get_user_by_username(username=payload.username)
+    if user:
+        principal_cache.set(token, user, token_expires_at=payload.exp, token_issued_at=payload.iat)
+    bind_unit_of_work(user_repo, user)
     return user
 
 
-def get_current_active_user(current_user: UserInDB = Depends(get_user_from_token)) -> Optional[UserInDB]:
+async def get_principal_from_token(
+        *,
+        token: str = Depends(oauth2_scheme),
+        user_repo: UsersRepository = Depends(get_repository(UsersRepository)),
+) -> Optional[Union[UserPrincipal, UserInDB]]:
+    """
+    With AUTH_STATELESS_PRINCIPAL the caller is rebuilt from the token claims and checked against
+    the in-memory revocation list, no query involved. Tokens issued before the claims existed
+    fall back to the users table.
+    """
+    if AUTH_STATELESS_PRINCIPAL:
+        payload = auth_service.get_payload_from_token(token=token, secret_key=str(SECRET_KEY))
+        if payload.user_id is not None:
+            check_token_not_revoked(payload)
+            principal = UserPrincipal.construct(
+                id=payload.user_id,
+                email=payload.sub,
+                username=payload.username,
+                is_active=payload.is_active,
+                is_superuser=payload.is_superuser,
+            )
+            bind_unit_of_work(user_repo, principal)
+            return principal
+    return await get_user_from_token(token=token, user_repo=user_repo)
+
+
+def check_user_is_active(current_user: Optional[Union[UserPrincipal, UserInDB]]) -> None:
     if not current_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -39,4 +94,19 @@ def get_current_active_user(current_user: UserInDB = Depends(get_user_from_token
             detail="Not an active user.",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+def get_current_active_user(
+        current_user: Union[UserPrincipal, UserInDB] = Depends(get_principal_from_token)
+) -> Union[UserPrincipal, UserInDB]:
+    """
+    Only id, username, email, is_active and is_superuser are guaranteed on the returned user,
+    depend on get_current_active_user_record when the full users row is needed.
+    """
+    check_user_is_active(current_user)
+    return current_user
+
+
+def get_current_active_user_record(current_user: UserInDB = Depends(get_user_from_token)) -> Optional[UserInDB]:
+    check_user_is_active(current_user)
     return current_user
@@ -1,12 +1,20 @@
-from fastapi import HTTPException, Depends, Path, status
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Optional
+
+from fastapi import HTTPException, Depends, Path, Query, status
+from starlette.requests import Request
 
 from app.models.user import UserInDB
-from app.models.cleaning import CleaningInDB
+from app.models.cleaning import CleaningInDB, CleaningFeedFilters, CleaningFeedSort, CleaningType
 
 from app.db.repositories.cleanings import CleaningsRepository
+from app.db.unit_of_work import UnitOfWork
 
-from app.api.dependencies.database import get_repository
+from app.api.conditional import ConditionalRequest, Validators
+from app.api.dependencies.database import get_repository, get_unit_of_work
 from app.api.dependencies.auth import get_current_active_user
+from app.api.dependencies.conditional import get_conditional_request
 
 
 async def get_cleaning_by_id_from_path(
@@ -22,6 +30,22 @@ async def get_cleaning_by_id_from_path(
     return cleaning
 
 
+async def check_cleaning_not_modified(
+        cleaning_id: int = Path(..., ge=1),
+        current_user: UserInDB = Depends(get_current_active_user),
+        conditional: ConditionalRequest = Depends(get_conditional_request),
+        cleanings_repo: CleaningsRepository = Depends(get_repository(CleaningsRepository))
+) -> None:
+    """
+    Answers a conditional request from the cleaning's updated_at alone, before the cleaning is loaded.
+    """
+    if not conditional.is_conditional:
+        return
+    updated_at = await cleanings_repo.get_cleaning_updated_at(id=cleaning_id)
+    if updated_at is not None:
+        conditional.check(Validators.for_row("cleanings", cleaning_id, updated_at))
+
+
 def check_cleaning_modification_permissions(
         current_user: UserInDB = Depends(get_current_active_user),
         cleaning: CleaningInDB = Depends(get_cleaning_by_id_from_path),
@@ -30,4 +54,66 @@ def check_cleaning_modification_permissions(
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Action forbidden. User are only able to modify they own."
-        )
\ No newline at end of file
+        )
+
+
+def get_cleaning_feed_filters(
+        cleaning_type: Optional[CleaningType] = Query(None),
+        min_price: Optional[float] = Query(None, ge=0),
+        max_price: Optional[float] = Query(None, ge=0),
+        created_since: Optional[datetime] = Query(None),
+        sort: CleaningFeedSort = Query(CleaningFeedSort.newest),
+) -> CleaningFeedFilters:
+    return CleaningFeedFilters(
+        cleaning_type=cleaning_type,
+        min_price=min_price,
+        max_price=max_price,
+        created_since=created_since,
+        sort=sort,
+    )
+
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl")
+
+
+async def iter_ndjson_lines(request: Request) -> AsyncIterator[bytes]:
+    """
+    Non blank lines of the request body as they arrive, so NDJSON imports aren't buffered whole.
+    """
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def iter_records(records: list) -> AsyncIterator[Any]:
+    for record in records:
+        yield record
+
+
+async def get_cleaning_import_records(
+        request: Request, uow: UnitOfWork = Depends(get_unit_of_work)
+) -> AsyncIterator[Any]:
+    """
+    Records of a bulk import, a JSON array of cleanings or one cleaning per line with an NDJSON content type.
+    The connection authenticating the request is released first, none is held while the body arrives.
+    """
+    await uow.release()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_CONTENT_TYPES:
+        return iter_ndjson_lines(request)
+    try:
+        records = json.loads(await request.body())
+    except ValueError:
+        records = None
+    if not isinstance(records, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a JSON array of cleanings or NDJSON.",
+        )
+    return iter_records(records)
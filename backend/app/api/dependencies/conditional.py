@@ -0,0 +1,12 @@
+from typing import Optional
+
+from fastapi import Header
+
+from app.api.conditional import ConditionalRequest
+
+
+def get_conditional_request(
+        if_none_match: Optional[str] = Header(None),
+        if_modified_since: Optional[str] = Header(None),
+) -> ConditionalRequest:
+    return ConditionalRequest(if_none_match=if_none_match, if_modified_since=if_modified_since)
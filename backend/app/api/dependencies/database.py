@@ -1,17 +1,44 @@
-from typing import Callable, Type
+from functools import lru_cache
+from typing import AsyncGenerator, Callable, Optional, Type
 from databases import Database
 
-from fastapi import Depends
+from fastapi import Depends, HTTPException
+from starlette import status
 from starlette.requests import Request
 
 from app.db.repositories.base import BaseRepository
+from app.db.unit_of_work import UnitOfWork
+from app.services import recent_writers
 
 
 def get_database(request: Request) -> Database:
-    return request.app.state._db
+    db = getattr(request.app.state, "_db", None)
+    if db is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="The database is unavailable.")
+    return db
 
 
+def get_replica_database(request: Request) -> Optional[Database]:
+    return getattr(request.app.state, "_db_replica", None)
+
+
+async def get_unit_of_work(
+        db: Database = Depends(get_database),
+        replica: Optional[Database] = Depends(get_replica_database),
+) -> AsyncGenerator[UnitOfWork, None]:
+    uow = UnitOfWork(db, replica=replica, recent_writers=recent_writers)
+    try:
+        yield uow
+    finally:
+        await uow.close()
+
+
+@lru_cache(maxsize=None)
 def get_repository(repo_type: Type[BaseRepository]) -> Callable:
-    def get_repo(db: Database = Depends(get_database)) -> Type[BaseRepository]:
-        return repo_type(db)
+    """
+    Memoized so every Depends(get_repository(X)) of a request shares one dependency,
+    which FastAPI then resolves only once.
+    """
+    def get_repo(uow: UnitOfWork = Depends(get_unit_of_work)) -> Type[BaseRepository]:
+        return uow.get_repository(repo_type)
     return get_repo
\ No newline at end of file
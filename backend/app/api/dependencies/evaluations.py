@@ -1,11 +1,10 @@
-from typing import List
-
-from fastapi import HTTPException, Depends, Path, status
+from fastapi import HTTPException, Depends, status
 
 from app.models.user import UserInDB
 from app.models.cleaning import CleaningInDB
-from app.models.offer import OfferInDB
-from app.models.evaluation import EvaluationInDB
+from app.models.offer import OfferAction, OfferInDB, OfferAuthorizationContext
+from app.models.evaluation import EvaluationInDB, EvaluationAggregate
+from app.models.pagination import Page, PageParams
 
 from app.db.repositories.evaluations import EvaluationsRepository
 
@@ -13,29 +12,28 @@ from app.api.dependencies.database import get_repository
 from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.user import get_user_by_username_from_path
 from app.api.dependencies.cleanings import get_cleaning_by_id_from_path
-from app.api.dependencies.offers import get_offer_for_cleaning_from_user_by_path
+from app.api.dependencies.pagination import get_page_params
+from app.api.dependencies.offers import (
+    check_offer_transition_allowed,
+    get_offer_authorization_context_from_path,
+    get_offer_for_cleaning_from_user_by_path,
+)
 
 
-async def check_evaluation_create_permissions(
+def check_evaluation_create_permissions(
         current_user: UserInDB = Depends(get_current_active_user),
-        cleaning: CleaningInDB = Depends(get_cleaning_by_id_from_path),
-        cleaner: UserInDB = Depends(get_user_by_username_from_path),
+        context: OfferAuthorizationContext = Depends(get_offer_authorization_context_from_path),
         offer: OfferInDB = Depends(get_offer_for_cleaning_from_user_by_path),
-        evals_repo: EvaluationsRepository = Depends(get_repository(EvaluationsRepository))
 ) -> None:
-    if cleaning.owner != current_user.id:
+    if context.cleaning_owner != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Users are unable to leave evaluations for cleaning jobs that they do not own."
         )
 
-    if offer.status != "accepted":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Only users with accepted offers can be evaluated"
-        )
+    check_offer_transition_allowed(offer, OfferAction.complete)
 
-    if offer.user_id != cleaner.id:
+    if offer.user_id != context.user_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="You are not authorized to leave an evaluation for this user."
@@ -44,9 +42,10 @@ async def check_evaluation_create_permissions(
 
 async def list_evaluation_for_cleaner_from_path(
         cleaner: UserInDB = Depends(get_user_by_username_from_path),
+        page: PageParams = Depends(get_page_params),
         evals_repo: EvaluationsRepository = Depends(get_repository(EvaluationsRepository))
-) -> List[EvaluationInDB]:
-    return await evals_repo.list_evaluations_for_cleaner(cleaner=cleaner)
+) -> Page[EvaluationInDB]:
+    return await evals_repo.list_evaluations_for_cleaner(cleaner=cleaner, page=page)
 
 
 async def get_cleaner_evaluation_for_cleaning_from_path(
@@ -58,3 +57,13 @@ async def get_cleaner_evaluation_for_cleaning_from_path(
     if not evaluation:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No evaluation found for that cleaning")
     return evaluation
+
+
+async def get_cleaner_aggregates_from_path(
+        cleaner: UserInDB = Depends(get_user_by_username_from_path),
+        evals_repo: EvaluationsRepository = Depends(get_repository(EvaluationsRepository))
+) -> EvaluationAggregate:
+    aggregates = await evals_repo.get_cleaner_aggregates(cleaner=cleaner)
+    if not aggregates:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No evaluations found for that cleaner")
+    return aggregates
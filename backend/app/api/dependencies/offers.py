@@ -1,53 +1,90 @@
-from typing import List
+from fastapi import HTTPException, Depends, Path, status
 
-from fastapi import HTTPException, Depends, status
-
-from app.models.offer import OfferInDB
+from app.models.offer import OfferAction, OfferInDB, OfferAuthorizationContext
 from app.models.user import UserInDB
 from app.models.cleaning import CleaningInDB
-from app.db.repositories.offers import OffersRepository
+from app.models.pagination import Page, PageParams
+from app.db.repositories.offers import OFFER_TRANSITIONS, OffersRepository
 
 from app.api.dependencies.database import get_repository
 from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.cleanings import get_cleaning_by_id_from_path
-from app.api.dependencies.user import get_user_by_username_from_path
+from app.api.dependencies.pagination import get_page_params
 
 
-async def get_offer_for_cleaning_from_user(
-        *, user: UserInDB, cleaning: CleaningInDB, offers_repo: OffersRepository
-) -> OfferInDB:
-    offer = await offers_repo.get_offer_for_cleaning_from_user(cleaning=cleaning, user=user)
-    if not offer:
+def check_authorization_context_found(context: OfferAuthorizationContext) -> None:
+    if not context:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No Cleaning found with that id.")
+    if context.user_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No user found with that username")
+
+
+def get_offer_from_authorization_context(context: OfferAuthorizationContext) -> OfferInDB:
+    if not context.offer:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Offer not found.")
-    return offer
+    return context.offer
 
 
-async def get_offer_for_cleaning_from_user_by_path(
-        user: UserInDB = Depends(get_user_by_username_from_path),
-        cleaning: CleaningInDB = Depends(get_cleaning_by_id_from_path),
-        offers_repo: OffersRepository = Depends(get_repository(OffersRepository))
+def check_offer_transition_allowed(offer: OfferInDB, action: OfferAction) -> None:
+    """
+    Fails early on an offer already loaded for authorization, the transition itself checks again.
+    """
+    transition = OFFER_TRANSITIONS[action]
+    if offer.status not in transition.allowed_from:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=transition.error)
+
+
+async def get_offer_authorization_context_from_path(
+        cleaning_id: int = Path(..., ge=1),
+        username: str = Path(..., min_length=3, regex="^[a-zA-Z0-9_-]+$"),
+        current_user: UserInDB = Depends(get_current_active_user),
+        offers_repo: OffersRepository = Depends(get_repository(OffersRepository)),
+) -> OfferAuthorizationContext:
+    """
+    The cleaning, the user named in the path and their offer, loaded in one query.
+    """
+    context = await offers_repo.get_offer_authorization_context(cleaning_id=cleaning_id, username=username)
+    check_authorization_context_found(context)
+    return context
+
+
+async def get_current_user_authorization_context_from_path(
+        cleaning_id: int = Path(..., ge=1),
+        current_user: UserInDB = Depends(get_current_active_user),
+        offers_repo: OffersRepository = Depends(get_repository(OffersRepository)),
+) -> OfferAuthorizationContext:
+    """
+    The cleaning and the current user's offer for it, loaded in one query.
+    """
+    context = await offers_repo.get_offer_authorization_context(cleaning_id=cleaning_id, user_id=current_user.id)
+    check_authorization_context_found(context)
+    return context
+
+
+def get_offer_for_cleaning_from_user_by_path(
+        context: OfferAuthorizationContext = Depends(get_offer_authorization_context_from_path),
 ) -> OfferInDB:
-    return await get_offer_for_cleaning_from_user(user=user, cleaning=cleaning, offers_repo=offers_repo)
+    return get_offer_from_authorization_context(context)
 
 
 async def list_offers_for_cleaning_by_id_from_path(
         cleaning: CleaningInDB = Depends(get_cleaning_by_id_from_path),
+        page: PageParams = Depends(get_page_params),
         offers_repo: OffersRepository = Depends(get_repository(OffersRepository))
-) -> List[OfferInDB]:
-    return await offers_repo.list_offers_for_cleaning(cleaning=cleaning)
+) -> Page[OfferInDB]:
+    return await offers_repo.list_offers_for_cleaning(cleaning=cleaning, page=page)
 
 
-async def check_offer_create_permissions(
+def check_offer_create_permissions(
         current_user: UserInDB = Depends(get_current_active_user),
-        cleaning: CleaningInDB = Depends(get_cleaning_by_id_from_path),
-        offers_repo: OffersRepository = Depends(get_repository(OffersRepository)),
+        context: OfferAuthorizationContext = Depends(get_current_user_authorization_context_from_path),
 ) -> None:
-    if cleaning.owner == current_user.id:
+    if context.cleaning_owner == current_user.id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Users are unable to create offers for cleaning jobs they own."
         )
-    if await offers_repo.get_offer_for_cleaning_from_user(cleaning=cleaning, user=current_user):
+    if context.offer:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Users aren't allowed create more than one offer for cleaning job."
@@ -66,10 +103,10 @@ def check_offer_list_permissions(
 
 def check_offer_get_permissions(
         current_user: UserInDB = Depends(get_current_active_user),
-        cleaning: CleaningInDB = Depends(get_cleaning_by_id_from_path),
+        context: OfferAuthorizationContext = Depends(get_offer_authorization_context_from_path),
         offer: OfferInDB = Depends(get_offer_for_cleaning_from_user_by_path)
 ) -> None:
-    if cleaning.owner != current_user.id and offer.user_id != current_user.id:
+    if context.cleaning_owner != current_user.id and offer.user_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Unable to access offer."
@@ -78,45 +115,17 @@ def check_offer_get_permissions(
 
 def check_offer_acceptance_permissions(
         current_user: UserInDB = Depends(get_current_active_user),
-        cleaning: CleaningInDB = Depends(get_cleaning_by_id_from_path),
+        context: OfferAuthorizationContext = Depends(get_offer_authorization_context_from_path),
         offer: OfferInDB = Depends(get_offer_for_cleaning_from_user_by_path),
-        existing_offers: List[OfferInDB] = Depends(list_offers_for_cleaning_by_id_from_path)
 ) -> None:
-    if cleaning.owner != current_user.id:
+    if context.cleaning_owner != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only the owner of the cleaning may accept offers."
         )
-    if offer.status != "pending":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Can only accept offers that are currently pending."
-        )
-    if "accepted" in [o.status for o in existing_offers]:
+    check_offer_transition_allowed(offer, OfferAction.accept)
+    if context.has_accepted_offer:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="The cleaning job already has an accepted offer"
         )
-
-
-async def get_offer_for_cleaning_from_current_user(
-        current_user: UserInDB = Depends(get_current_active_user),
-        cleaning: CleaningInDB = Depends(get_cleaning_by_id_from_path),
-        offers_repo: OffersRepository = Depends(get_repository(OffersRepository))
-) -> OfferInDB:
-    return await get_offer_for_cleaning_from_user(user=current_user, cleaning=cleaning, offers_repo=offers_repo)
-
-
-def check_offer_cancel_permissions(offer: OfferInDB = Depends(get_offer_for_cleaning_from_current_user)) -> None:
-    if offer.status != "accepted":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Can only cancel offers that have been accepted."
-        )
-
-
-def check_offer_rescind_permissions(offer: OfferInDB = Depends(get_offer_for_cleaning_from_current_user)) -> None:
-    if offer.status != "pending":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Can only rescind currently pending offer"
-        )
\ No newline at end of file
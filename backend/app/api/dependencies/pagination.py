@@ -0,0 +1,18 @@
+from typing import Optional
+
+from fastapi import HTTPException, Query, status
+
+from app.core.config import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.models.pagination import PageParams, decode_cursor
+
+
+def get_page_params(
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None),
+) -> PageParams:
+    if cursor is None:
+        return PageParams(limit=limit)
+    try:
+        return PageParams(limit=limit, cursor=decode_cursor(cursor))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
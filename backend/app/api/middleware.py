@@ -0,0 +1,257 @@
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.api.compression import Codec, Stream, available_codecs, negotiate
+from app.core.config import (
+    COMPRESSION_EXCLUDED_ROUTES,
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_THREADPOOL_MIN_SIZE,
+    REPEATED_QUERY_THRESHOLD,
+    REQUEST_QUERY_BUDGET,
+)
+from app.core.metrics import request_latency
+from app.db.accounting import RequestQueries, request_queries
+
+logger = logging.getLogger(__name__)
+
+
+def _route_names(routes: Any) -> Dict[Callable, str]:
+    names = {}
+    for route in routes:
+        if getattr(route, "endpoint", None) is not None and getattr(route, "name", None):
+            names[route.endpoint] = route.name
+        if getattr(route, "routes", None):
+            names.update(_route_names(route.routes))
+    return names
+
+
+class RouteNames:
+    """
+    Name of the route that served a request, read from the endpoint routing left in the scope.
+    """
+    def __init__(self) -> None:
+        self._names: Optional[Dict[Callable, str]] = None
+
+    def __call__(self, scope: Scope) -> str:
+        if self._names is None:
+            router: Optional[BaseRoute] = getattr(scope.get("app"), "router", None)
+            self._names = _route_names(getattr(router, "routes", []))
+        return self._names.get(scope.get("endpoint"), "unmatched")
+
+
+class MetricsMiddleware:
+    """
+    Observes the latency of every http request in request_latency, labelled by the name of the
+    route that served it, e.g. offers:accept-offer-from-user, never by its raw path.
+    Requests no route matched are labelled unmatched.
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.route_name = RouteNames()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_latency.labels(self.route_name(scope), scope["method"], str(status_code)).observe(
+                time.perf_counter() - started
+            )
+
+
+class ServerTimingMiddleware:
+    """
+    Accounts the queries of every http request and reports them in a Server-Timing header,
+    db (time in queries, their count in desc) and app (time until the response started).
+
+    - A warning lists the queries of requests that ran more than REQUEST_QUERY_BUDGET of them or the
+      same statement REPEATED_QUERY_THRESHOLD times or more, the usual shape of an N+1.
+    - Streamed bodies query after the header is sent, the warning still covers them.
+    """
+    def __init__(
+            self,
+            app: ASGIApp,
+            *,
+            query_budget: int = REQUEST_QUERY_BUDGET,
+            repeated_threshold: int = REPEATED_QUERY_THRESHOLD,
+    ) -> None:
+        self.app = app
+        self.query_budget = query_budget
+        self.repeated_threshold = repeated_threshold
+        self.route_name = RouteNames()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = request_queries.set(queries)
+        started = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={queries.seconds * 1000:.2f};desc="{len(queries)} queries", '
+                    f"app;dur={(time.perf_counter() - started) * 1000:.2f}",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_queries.reset(token)
+            self.check_budget(scope, queries)
+
+    def check_budget(self, scope: Scope, queries: RequestQueries) -> None:
+        repeated = queries.repeated(self.repeated_threshold)
+        if len(queries) <= self.query_budget and not repeated:
+            return
+        logger.warning(
+            "%s %s (%s) ran %d queries in %.2fms, budget %d, repeated: %s\n%s",
+            scope["method"],
+            scope["path"],
+            self.route_name(scope),
+            len(queries),
+            queries.seconds * 1000,
+            self.query_budget,
+            ", ".join(f"{name} x{count}" for name, count in repeated.items()) or "none",
+            "\n".join(f"  {seconds * 1000:8.2f}ms {name}" for name, seconds in queries.queries),
+        )
+
+
+def _is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type == "application/json" or media_type.endswith("+json")
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies with the coding the client prefers of zstd, br and gzip, the first two
+    only when their libraries are installed.
+
+    - Bodies under min_size, media types other than text and JSON, responses that already have a
+      Content-Encoding and those of the routes named in exclude_routes go out as they are.
+    - Bodies of threadpool_min_size or more are compressed in the threadpool, off the event loop, the
+      compressors release the GIL.
+    - Streamed bodies are compressed chunk by chunk, whatever their size, each chunk flushed.
+    - ETags are weak, a compressed body keeps the ETag of its identity.
+    - Text and JSON responses carry Vary: Accept-Encoding whether they were compressed or not, so shared
+      caches keep their identity and compressed copies apart.
+    """
+    def __init__(
+            self,
+            app: ASGIApp,
+            *,
+            min_size: int = COMPRESSION_MIN_SIZE,
+            threadpool_min_size: int = COMPRESSION_THREADPOOL_MIN_SIZE,
+            exclude_routes: Iterable[str] = COMPRESSION_EXCLUDED_ROUTES,
+            codecs: Optional[Sequence[Codec]] = None,
+    ) -> None:
+        self.app = app
+        self.min_size = min_size
+        self.threadpool_min_size = threadpool_min_size
+        self.exclude_routes = frozenset(exclude_routes)
+        self.codecs = available_codecs() if codecs is None else codecs
+        self.route_name = RouteNames()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codec = None
+        if scope["method"] != "HEAD":
+            codec = negotiate(Headers(scope=scope).get("accept-encoding"), self.codecs)
+        if codec is None:
+            async def send_identity(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    self.add_vary(MutableHeaders(scope=message))
+                await send(message)
+
+            await self.app(scope, receive, send_identity)
+            return
+
+        start: Optional[Message] = None
+        stream: Optional[Stream] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, stream, passthrough
+            if message["type"] == "http.response.start":
+                # held until the first chunk of the body tells whether it is worth compressing
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if stream is None:
+                headers = MutableHeaders(scope=start)
+                if not self.should_compress(scope, headers, body, more_body):
+                    passthrough = True
+                    self.add_vary(headers)
+                    await send(start)
+                    await send(message)
+                    return
+                self.add_vary(headers)
+                headers["Content-Encoding"] = codec.encoding
+                if not more_body:
+                    body = await self.compress(codec.compress, body)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                del headers["Content-Length"]
+                stream = codec.stream()
+                await send(start)
+
+            body = await self.compress(stream.compress, body)
+            if not more_body:
+                body += stream.finish()
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def add_vary(headers: MutableHeaders) -> None:
+        """
+        Responses the client's Accept-Encoding may change, i.e. text and JSON the app didn't encode itself.
+        """
+        if "content-encoding" in headers or not _is_compressible(headers.get("content-type", "")):
+            return
+        if "accept-encoding" not in headers.get("vary", "").lower():
+            headers.add_vary_header("Accept-Encoding")
+
+    def should_compress(self, scope: Scope, headers: MutableHeaders, body: bytes, more_body: bool) -> bool:
+        if "content-encoding" in headers or not _is_compressible(headers.get("content-type", "")):
+            return False
+        if not more_body and len(body) < self.min_size:
+            return False
+        return not self.exclude_routes or self.route_name(scope) not in self.exclude_routes
+
+    async def compress(self, compress: Callable[[bytes], bytes], body: bytes) -> bytes:
+        if len(body) >= self.threadpool_min_size:
+            return await run_in_threadpool(compress, body)
+        return compress(body)
@@ -0,0 +1,105 @@
+import functools
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
+from starlette.responses import JSONResponse, StreamingResponse
+
+from app.core.config import STREAM_CHUNK_SIZE
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _encode_model(obj: Any) -> Any:
+    # models nested where the response model doesn't name a model type, datetimes and enums are handled by orjson
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+@functools.lru_cache(maxsize=None)
+def _projection(response_model: Type[BaseModel]) -> Tuple[Tuple[str, Any, Optional[Type[BaseModel]]], ...]:
+    # (name, default, model of the value when it is a model or a list of them) of every field
+    return tuple(
+        (
+            name,
+            field.default,
+            field.type_ if isinstance(field.type_, type) and issubclass(field.type_, BaseModel) else None,
+        )
+        for name, field in response_model.__fields__.items()
+    )
+
+
+def project(content: Any, response_model: Type[BaseModel]) -> Any:
+    """
+    content as response_model would have it, the fields of response_model only, the ones content doesn't have
+    set to their default, without validating the values again.
+    """
+    if isinstance(content, list):
+        return [project(item, response_model) for item in content]
+    if not isinstance(content, BaseModel):
+        return content
+    projected = {}
+    for name, default, model in _projection(response_model):
+        value = getattr(content, name, default)
+        projected[name] = value if model is None or value is None else project(value, model)
+    return projected
+
+
+def dumps(content: Any, *, response_model: Optional[Type[BaseModel]] = None) -> bytes:
+    if response_model is not None:
+        content = project(content, response_model)
+    if orjson is not None:
+        return orjson.dumps(content, default=_encode_model)
+    return json.dumps(content, default=pydantic_encoder, separators=(",", ":")).encode()
+
+
+async def iter_json_array(
+        items: AsyncIterable[BaseModel], *, response_model: Type[BaseModel], chunk_size: int = STREAM_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """
+    Encodes items as one JSON array, chunk_size items at a time.
+
+    - Items are written as response_model, like a response_model on the route would do.
+    - At most one chunk is held in memory, whatever the number of rows behind items.
+    """
+    separator = b"["
+    chunk = []
+    async for item in items:
+        chunk.append(dumps(item, response_model=response_model))
+        if len(chunk) >= chunk_size:
+            yield separator + b",".join(chunk)
+            separator, chunk = b",", []
+    if chunk:
+        yield separator + b",".join(chunk)
+        separator = b","
+    yield b"]" if separator == b"," else b"[]"
+
+
+class JSONStreamingResponse(StreamingResponse):
+    media_type = "application/json"
+
+    def __init__(
+            self, items: AsyncIterable[BaseModel], *, response_model: Type[BaseModel], **kwargs
+    ) -> None:
+        super().__init__(iter_json_array(items, response_model=response_model), **kwargs)
+
+
+class TrustedJSONResponse(JSONResponse):
+    """
+    For routes returning repository output as is, which was validated when the repository built it.
+
+    Return it from the route instead of the models themselves, FastAPI then skips validating them against
+    response_model again and running jsonable_encoder, and the content is encoded by orjson when installed.
+    Pass the route's response_model, only its fields are written, those the content lacks as their default.
+    """
+    def __init__(self, content: Any, *, response_model: Optional[Type[BaseModel]] = None, **kwargs: Any) -> None:
+        self.response_model = response_model
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content, response_model=self.response_model)
@@ -3,8 +3,9 @@ from fastapi import APIRouter
 from app.api.routes.cleanings import router as cleanings_router
 from app.api.routes.users import router as users_router
 from app.api.routes.profiles import router as profiles_router
-from app.api.routes.offers import router as offer_router
+from app.api.routes.offers import router as offer_router, batch_router as offer_batch_router
 from app.api.routes.evaluations import router as evaluations_router
+from app.api.routes.health import router as health_router
 
 
 router = APIRouter()
@@ -14,4 +15,6 @@ router.include_router(cleanings_router, prefix="/cleanings", tags=["cleanings"])
 router.include_router(users_router, prefix="/users", tags=["users"])
 router.include_router(profiles_router, prefix="/profiles", tags=["profiles"])
 router.include_router(offer_router, prefix="/cleanings/{cleaning_id}/offers", tags=["offers"])
+router.include_router(offer_batch_router, prefix="/offers", tags=["offers"])
 router.include_router(evaluations_router, prefix="/users/{username}/evaluations", tags=["evaluations"])
+router.include_router(health_router, prefix="/health", tags=["health"])
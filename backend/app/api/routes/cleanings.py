@@ -1,23 +1,60 @@
-from typing import List
-from fastapi import APIRouter, Body, Depends, HTTPException, Path
+from typing import Any, AsyncIterator, List
+from fastapi import APIRouter, Body, Depends, HTTPException, Path, Query, Response
 from starlette.status import HTTP_201_CREATED, HTTP_404_NOT_FOUND, HTTP_204_NO_CONTENT
 
 from app.api.dependencies.auth import get_current_active_user
-from app.api.dependencies.cleanings import get_cleaning_by_id_from_path, check_cleaning_modification_permissions
-from app.models.cleaning import CleaningCreate, CleaningPublic, CleaningInDB, CleaningUpdate
+from app.api.conditional import Validators
+from app.api.dependencies.cleanings import (
+    get_cleaning_by_id_from_path,
+    check_cleaning_not_modified,
+    check_cleaning_modification_permissions,
+    get_cleaning_feed_filters,
+    get_cleaning_import_records,
+)
+from app.models.cleaning import CleaningCreate, CleaningPublic, CleaningInDB, CleaningUpdate, CleaningFeedFilters, \
+    CleaningSearchResult, CleaningImportResult
+from app.models.pagination import Page, PageParams
 from app.db.repositories.cleanings import CleaningsRepository
 from app.api.dependencies.database import get_repository
+from app.api.dependencies.pagination import get_page_params
+from app.api.responses import JSONStreamingResponse, TrustedJSONResponse
 from app.models.user import UserInDB
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[CleaningPublic], name="cleanings:list-all-user-cleanings")
+@router.get(
+    "/",
+    response_model=Page[CleaningPublic],
+    response_class=TrustedJSONResponse,
+    name="cleanings:list-all-user-cleanings",
+)
 async def list_all_user_cleanings(
         current_user: UserInDB = Depends(get_current_active_user),
+        page: PageParams = Depends(get_page_params),
         repo: CleaningsRepository = Depends(get_repository(CleaningsRepository))
-) -> List[CleaningPublic]:
-    return await repo.list_all_user_cleanings(requesting_user=current_user)
+) -> TrustedJSONResponse:
+    return TrustedJSONResponse(
+        await repo.list_all_user_cleanings(requesting_user=current_user, page=page), response_model=Page[CleaningPublic]
+    )
+
+
+@router.get(
+    "/stream/",
+    response_model=List[CleaningPublic],
+    response_class=JSONStreamingResponse,
+    name="cleanings:stream-all-user-cleanings",
+)
+async def stream_all_user_cleanings(
+        current_user: UserInDB = Depends(get_current_active_user),
+        repo: CleaningsRepository = Depends(get_repository(CleaningsRepository))
+) -> JSONStreamingResponse:
+    """
+    Every cleaning of the current user in one unpaginated JSON array, encoded while rows are read.
+    """
+    return JSONStreamingResponse(
+        repo.iterate_all_user_cleanings(requesting_user=current_user), response_model=CleaningPublic
+    )
 
 
 @router.post("/", response_model=CleaningPublic, name="cleanings:create-cleaning", status_code=HTTP_201_CREATED)
@@ -38,15 +75,78 @@ async def create_new_cleanings(
     return created_cleaning
 
 
-@router.get("/", response_model=List[CleaningPublic], name="cleanings:get-all-cleanings")
-async def get_all_cleanings(cleanings_repo: CleaningsRepository = Depends(get_repository(CleaningsRepository))) -> List[CleaningInDB]:
-    return await cleanings_repo.get_all_cleaning()
+@router.post(
+    "/bulk/",
+    response_model=CleaningImportResult,
+    name="cleanings:bulk-create-cleanings",
+    status_code=HTTP_201_CREATED,
+)
+async def bulk_create_cleanings(
+        current_user: UserInDB = Depends(get_current_active_user),
+        records: AsyncIterator[Any] = Depends(get_cleaning_import_records),
+        cleanings_repo: CleaningsRepository = Depends(get_repository(CleaningsRepository))
+) -> CleaningImportResult:
+    """
+    Create many cleanings in one request, from a JSON array or NDJSON (application/x-ndjson).
+    Valid records are created together, the invalid ones are reported by index, a 422 when none is valid.
+    """
+    return await cleanings_repo.import_cleanings(records=records, requesting_user=current_user)
 
 
-@router.get("/{cleaning_id}/", response_model=CleaningPublic, name="cleanings:get-cleaning-by-id")
+@router.get(
+    "/feed/",
+    response_model=Page[CleaningPublic],
+    response_class=TrustedJSONResponse,
+    name="cleanings:get-cleaning-feed",
+)
+async def get_cleaning_feed(
+        current_user: UserInDB = Depends(get_current_active_user),
+        filters: CleaningFeedFilters = Depends(get_cleaning_feed_filters),
+        page: PageParams = Depends(get_page_params),
+        cleanings_repo: CleaningsRepository = Depends(get_repository(CleaningsRepository))
+) -> TrustedJSONResponse:
+    """
+    Open cleaning jobs of other users, those with an accepted offer are left out.
+    """
+    return TrustedJSONResponse(
+        await cleanings_repo.get_cleaning_feed(requesting_user=current_user, filters=filters, page=page),
+        response_model=Page[CleaningPublic],
+    )
+
+
+@router.get(
+    "/search/",
+    response_model=Page[CleaningSearchResult],
+    response_class=TrustedJSONResponse,
+    name="cleanings:search-cleanings",
+)
+async def search_cleanings(
+        q: str = Query(..., min_length=1, max_length=200),
+        current_user: UserInDB = Depends(get_current_active_user),
+        page: PageParams = Depends(get_page_params),
+        cleanings_repo: CleaningsRepository = Depends(get_repository(CleaningsRepository))
+) -> TrustedJSONResponse:
+    """
+    Full text search over cleaning names and descriptions, best matches first.
+    """
+    return TrustedJSONResponse(
+        await cleanings_repo.search_cleanings(query=q, page=page), response_model=Page[CleaningSearchResult]
+    )
+
+
+@router.get(
+    "/{cleaning_id}/",
+    response_model=CleaningPublic,
+    name="cleanings:get-cleaning-by-id",
+    dependencies=[Depends(check_cleaning_not_modified)],
+)
 async def get_cleaning_by_id(
-        cleaning: CleaningInDB = Depends(get_cleaning_by_id_from_path)
+        response: Response,
+        cleaning: CleaningInDB = Depends(get_cleaning_by_id_from_path),
+        cleanings_repo: CleaningsRepository = Depends(get_repository(CleaningsRepository))
 ) -> CleaningPublic:
+    updated_at = await cleanings_repo.get_cleaning_updated_at(id=cleaning.id)
+    Validators.for_row("cleanings", cleaning.id, updated_at).apply(response)
     return cleaning
 
 
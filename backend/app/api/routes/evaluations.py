@@ -1,21 +1,26 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, Body, Path, status
+from fastapi import APIRouter, Depends, Body, Path, Response, status
 
 from app.models.evaluation import EvaluationCreate, EvaluationInDB, EvaluationPublic, EvaluationAggregate
 from app.models.user import UserInDB
-from app.models.cleaning import CleaningInDB
+from app.models.offer import OfferAuthorizationContext
+from app.models.pagination import Page
 
 
 from app.db.repositories.evaluations import EvaluationsRepository
 
+from app.api.conditional import ConditionalRequest, Validators
+from app.api.dependencies.conditional import get_conditional_request
 from app.api.dependencies.database import get_repository
-from app.api.dependencies.cleanings import get_cleaning_by_id_from_path
+from app.api.responses import JSONStreamingResponse, TrustedJSONResponse, dumps
+from app.api.dependencies.offers import get_offer_authorization_context_from_path
 from app.api.dependencies.user import get_user_by_username_from_path
 from app.api.dependencies.evaluations import (
     check_evaluation_create_permissions,
     list_evaluation_for_cleaner_from_path,
-    get_cleaner_evaluation_for_cleaning_from_path
+    get_cleaner_evaluation_for_cleaning_from_path,
+    get_cleaner_aggregates_from_path,
 )
 
 
@@ -31,34 +36,58 @@ router = APIRouter()
 )
 async def create_evaluation_for_cleaner(
         evaluation_create: EvaluationCreate = Body(...),
-        cleaning: CleaningInDB = Depends(get_cleaning_by_id_from_path),
-        cleaner: UserInDB = Depends(get_user_by_username_from_path),
+        context: OfferAuthorizationContext = Depends(get_offer_authorization_context_from_path),
         evals_repo: EvaluationsRepository = Depends(get_repository(EvaluationsRepository))
 ) -> EvaluationInDB:
     return await evals_repo.create_evaluation_for_cleaner(
-        evaluation_create=evaluation_create, cleaner=cleaner, cleaning=cleaning
+        evaluation_create=evaluation_create, cleaning_id=context.cleaning_id, cleaner_id=context.user_id
     )
 
 
 @router.get(
     "/",
-    response_model=List[EvaluationPublic],
+    response_model=Page[EvaluationPublic],
+    response_class=TrustedJSONResponse,
     name="evaluations:list-evaluations-for-cleaner",
 )
 async def list_evaluations_for_cleaner(
-        evaluations: List[EvaluationPublic] = Depends(list_evaluation_for_cleaner_from_path)
-) -> List[EvaluationPublic]:
-    return evaluations
+        evaluations: Page[EvaluationInDB] = Depends(list_evaluation_for_cleaner_from_path),
+        conditional: ConditionalRequest = Depends(get_conditional_request),
+) -> TrustedJSONResponse:
+    response = TrustedJSONResponse(evaluations, response_model=Page[EvaluationPublic])
+    validators = Validators.for_content(response.body)
+    conditional.check(validators)
+    validators.apply(response)
+    return response
 
 
 @router.get(
-    "/stats/", response_model=EvaluationAggregate, name="evaluations:get-stats-for-cleaner",
+    "/stream/",
+    response_model=List[EvaluationPublic],
+    response_class=JSONStreamingResponse,
+    name="evaluations:stream-evaluations-for-cleaner",
 )
-async def get_stats_for_cleaner(
+async def stream_evaluations_for_cleaner(
         cleaner: UserInDB = Depends(get_user_by_username_from_path),
         evals_repo: EvaluationsRepository = Depends(get_repository(EvaluationsRepository))
+) -> JSONStreamingResponse:
+    return JSONStreamingResponse(
+        evals_repo.iterate_evaluations_for_cleaner(cleaner=cleaner), response_model=EvaluationPublic
+    )
+
+
+@router.get(
+    "/stats/", response_model=EvaluationAggregate, name="evaluations:get-stats-for-cleaner",
+)
+async def get_stats_for_cleaner(
+        response: Response,
+        aggregates: EvaluationAggregate = Depends(get_cleaner_aggregates_from_path),
+        conditional: ConditionalRequest = Depends(get_conditional_request),
 ) -> EvaluationAggregate:
-    return await evals_repo.get_cleaner_aggregates(cleaner=cleaner)
+    validators = Validators.for_content(dumps(aggregates))
+    conditional.check(validators)
+    validators.apply(response)
+    return aggregates
 
 
 @router.get(
@@ -67,6 +96,13 @@ async def get_stats_for_cleaner(
     name="evaluations:get-evaluation-for-cleaner"
 )
 async def get_evaluation_for_cleaner(
-        evaluation: EvaluationInDB = Depends(get_cleaner_evaluation_for_cleaning_from_path)
+        response: Response,
+        evaluation: EvaluationInDB = Depends(get_cleaner_evaluation_for_cleaning_from_path),
+        conditional: ConditionalRequest = Depends(get_conditional_request),
 ) -> EvaluationPublic:
+    validators = Validators.for_row(
+        "evaluations", f"{evaluation.cleaning_id}-{evaluation.cleaner_id}", evaluation.updated_at
+    )
+    conditional.check(validators)
+    validators.apply(response)
     return evaluation
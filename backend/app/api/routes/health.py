@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE
+
+from app.models.health import Readiness
+
+
+router = APIRouter()
+
+
+@router.get("/ready/", response_model=Readiness, name="health:readiness")
+async def readiness(request: Request, response: Response) -> Readiness:
+    """
+    Reports the pool as the app last used it, probes never query or open connections themselves.
+    """
+    pool = getattr(request.app.state, "_db_pool", None)
+    replica_pool = getattr(request.app.state, "_db_replica_pool", None)
+    ready = pool is not None and pool.is_healthy and (replica_pool is None or replica_pool.is_healthy)
+    if not ready:
+        response.status_code = HTTP_503_SERVICE_UNAVAILABLE
+    return Readiness(
+        ready=ready,
+        pool=pool.stats() if pool is not None else None,
+        replica_pool=replica_pool.stats() if replica_pool is not None else None,
+    )
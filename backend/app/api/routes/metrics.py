@@ -0,0 +1,70 @@
+from typing import Any, Iterable, Tuple
+
+from fastapi import APIRouter
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.metrics import Exposition, hashing_latency, query_latency, request_latency
+from app.services import auth_service
+
+
+router = APIRouter()
+
+# pool label, app.state attribute
+POOLS = (("primary", "_db_pool"), ("replica", "_db_replica_pool"))
+
+
+def add_pool_metrics(exposition: Exposition, pools: Iterable[Tuple[str, Any]]) -> None:
+    stats = [({"pool": name}, pool.stats()) for name, pool in pools]
+    exposition.add_samples(
+        "phresh_db_pool_connections",
+        "Open connections of the pool, by state.",
+        "gauge",
+        [({**labels, "state": "in_use"}, s.in_use) for labels, s in stats]
+        + [({**labels, "state": "idle"}, s.idle) for labels, s in stats],
+    )
+    exposition.add_samples(
+        "phresh_db_pool_max_connections", "Most connections the pool opens.", "gauge",
+        [(labels, s.max_size) for labels, s in stats],
+    )
+    exposition.add_samples(
+        "phresh_db_pool_waiting", "Acquires waiting for a connection.", "gauge",
+        [(labels, s.waiting) for labels, s in stats],
+    )
+    exposition.add_samples(
+        "phresh_db_pool_acquires_total", "Connections acquired from the pool.", "counter",
+        [(labels, s.acquires) for labels, s in stats],
+    )
+    exposition.add_samples(
+        "phresh_db_pool_acquire_timeouts_total", "Acquires that ran out of time.", "counter",
+        [(labels, s.timeouts) for labels, s in stats],
+    )
+    exposition.add_samples(
+        "phresh_db_pool_acquire_wait_seconds_total", "Time spent waiting for connections.", "counter",
+        [(labels, s.wait_seconds) for labels, s in stats],
+    )
+
+
+def add_hashing_metrics(exposition: Exposition) -> None:
+    stats = auth_service.hashing_pool.stats()
+    exposition.add_samples(
+        "phresh_auth_hashing_in_flight", "Hashing jobs running or queued.", "gauge", [(None, stats["in_flight"])]
+    )
+    exposition.add_samples(
+        "phresh_auth_hashing_jobs_total",
+        "Hashing jobs, by outcome.",
+        "counter",
+        [({"outcome": outcome}, stats[outcome]) for outcome in ("completed", "failed", "rejected")],
+    )
+
+
+@router.get("/metrics", name="metrics", include_in_schema=False)
+async def metrics(request: Request) -> Response:
+    exposition = Exposition()
+    exposition.add_histograms(request_latency)
+    exposition.add_histograms(query_latency)
+    pools = [(name, getattr(request.app.state, attr, None)) for name, attr in POOLS]
+    add_pool_metrics(exposition, [(name, pool) for name, pool in pools if pool is not None])
+    exposition.add_histograms(hashing_latency)
+    add_hashing_metrics(exposition)
+    return Response(exposition.render(), media_type=Exposition.CONTENT_TYPE)
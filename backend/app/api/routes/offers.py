@@ -1,14 +1,18 @@
 from typing import List
+
 from fastapi import APIRouter, Path, Body, status, Depends, HTTPException
 
-from app.models.offer import OfferCreate, OfferUpdate, OfferInDB, OfferPublic
-from app.models.cleaning import CleaningInDB
+from app.models.offer import (
+    OfferAction, OfferCreate, OfferUpdate, OfferInDB, OfferPublic, OfferAuthorizationContext, OfferBatchCreate,
+    OfferBatchDecide, OfferBatchOutcome,
+)
 from app.models.user import UserInDB
+from app.models.pagination import Page
 
-from app.api.dependencies.cleanings import get_cleaning_by_id_from_path, get_current_active_user
-# from app.api.dependencies.offers import check_offer_create_permissions
 from app.db.repositories.offers import OffersRepository
+from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.database import get_repository
+from app.api.responses import TrustedJSONResponse
 from app.api.dependencies.offers import (
     check_offer_create_permissions,
     check_offer_get_permissions,
@@ -16,13 +20,13 @@ from app.api.dependencies.offers import (
     get_offer_for_cleaning_from_user_by_path,
     list_offers_for_cleaning_by_id_from_path,
     check_offer_acceptance_permissions,
-    check_offer_cancel_permissions,
-    get_offer_for_cleaning_from_current_user,
-    check_offer_rescind_permissions
+    get_current_user_authorization_context_from_path,
 )
 
 
 router = APIRouter()
+# offers across many cleanings, mounted outside of /cleanings/{cleaning_id}
+batch_router = APIRouter()
 
 
 @router.post(
@@ -33,25 +37,25 @@ router = APIRouter()
     dependencies=[Depends(check_offer_create_permissions)]
 )
 async def create_offer(
-        cleaning: CleaningInDB = Depends(get_cleaning_by_id_from_path),
-        current_user: UserInDB = Depends(get_current_active_user),
+        context: OfferAuthorizationContext = Depends(get_current_user_authorization_context_from_path),
         offers_repo: OffersRepository = Depends(get_repository(OffersRepository)),
 ) -> OfferPublic:
     return await offers_repo.create_offer_for_cleaning(
-        new_offer=OfferCreate(cleaning_id=cleaning.id, user_id=current_user.id)
+        new_offer=OfferCreate(cleaning_id=context.cleaning_id, user_id=context.user_id)
     )
 
 
 @router.get(
     "/",
-    response_model=List[OfferPublic],
+    response_model=Page[OfferPublic],
+    response_class=TrustedJSONResponse,
     name="offers:list-offers-for-cleaning",
     dependencies=[Depends(check_offer_list_permissions)]
 )
 async def list_offer_for_cleanings(
-        offers: List[OfferInDB] = Depends(list_offers_for_cleaning_by_id_from_path)
-) -> List[OfferPublic]:
-    return offers
+        offers: Page[OfferInDB] = Depends(list_offers_for_cleaning_by_id_from_path)
+) -> TrustedJSONResponse:
+    return TrustedJSONResponse(offers, response_model=Page[OfferPublic])
 
 
 @router.get(
@@ -79,27 +83,51 @@ async def accept_offer(
     return await offers_repo.accept_offer(offer=offer, offer_update=OfferUpdate(status="accepted"))
 
 
-@router.put(
-    "/",
-    response_model=OfferPublic,
-    name="offers:cancel-offer-from-user",
-    dependencies=[Depends(check_offer_cancel_permissions)]
-)
+@router.put("/", response_model=OfferPublic, name="offers:cancel-offer-from-user")
 async def cancel_offer(
-        offer: OfferInDB = Depends(get_offer_for_cleaning_from_current_user),
+        cleaning_id: int = Path(..., ge=1),
+        current_user: UserInDB = Depends(get_current_active_user),
         offers_repo: OffersRepository = Depends(get_repository(OffersRepository))
 ) -> OfferPublic:
-    return await offers_repo.cancel_offer(offer=offer, offer_update=OfferUpdate(status="cancelled"))
+    """
+    Cancel the current user's accepted offer, the other offers for the cleaning become pending again.
+    """
+    return await offers_repo.transition_offer(
+        cleaning_id=cleaning_id, user_id=current_user.id, action=OfferAction.cancel
+    )
 
 
-@router.delete(
-    "/",
-    response_model=int,
-    name="offers:rescind-offer-from-user",
-    dependencies=[Depends(check_offer_rescind_permissions)]
-)
+@router.delete("/", response_model=int, name="offers:rescind-offer-from-user")
 async def rescind_offer(
-        offer: OfferInDB = Depends(get_offer_for_cleaning_from_current_user),
+        cleaning_id: int = Path(..., ge=1),
+        current_user: UserInDB = Depends(get_current_active_user),
         offers_repo: OffersRepository = Depends(get_repository(OffersRepository))
-) -> OfferPublic:
-    return await offers_repo.rescind_offer(offer=offer)
+) -> int:
+    rescinded = await offers_repo.transition_offer(
+        cleaning_id=cleaning_id, user_id=current_user.id, action=OfferAction.rescind
+    )
+    return rescinded.user_id
+
+
+@batch_router.post("/batch/", response_model=List[OfferBatchOutcome], name="offers:create-offers-batch")
+async def create_offers_batch(
+        batch: OfferBatchCreate = Body(...),
+        current_user: UserInDB = Depends(get_current_active_user),
+        offers_repo: OffersRepository = Depends(get_repository(OffersRepository)),
+) -> List[OfferBatchOutcome]:
+    """
+    Offers from the current user for many cleaning jobs, one outcome per cleaning.
+    """
+    return await offers_repo.create_offers_for_cleanings(cleaning_ids=batch.cleaning_ids, requesting_user=current_user)
+
+
+@batch_router.put("/batch/", response_model=List[OfferBatchOutcome], name="offers:decide-offers-batch")
+async def decide_offers_batch(
+        batch: OfferBatchDecide = Body(...),
+        current_user: UserInDB = Depends(get_current_active_user),
+        offers_repo: OffersRepository = Depends(get_repository(OffersRepository)),
+) -> List[OfferBatchOutcome]:
+    """
+    Accept or reject pending offers across the current user's cleaning jobs, one outcome per decision.
+    """
+    return await offers_repo.decide_offers(decisions=batch.decisions, requesting_user=current_user)
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Path, Body, Depends, HTTPException
+from fastapi import APIRouter, Path, Body, Depends, HTTPException, Response
 from starlette import status
 
+from app.api.conditional import ConditionalRequest, Validators
 from app.api.dependencies.auth import get_current_active_user
+from app.api.dependencies.conditional import get_conditional_request
 from app.api.dependencies.database import get_repository
 from app.db.repositories.profiles import ProfilesRepository
 from app.models.profile import ProfileUpdate, ProfilePublic
@@ -13,12 +15,19 @@ router = APIRouter()
 @router.get("/{username}/", response_model=ProfilePublic, name="profiles:get-profile-by-username")
 async def get_profile_by_username(
         *, username: str = Path(..., min_length=3, regex="^[a-zA-Z0-9-_]+$"),
+        response: Response,
         current_user: UserInDB = Depends(get_current_active_user),
+        conditional: ConditionalRequest = Depends(get_conditional_request),
         repo: ProfilesRepository = Depends(get_repository(ProfilesRepository))
 ) -> ProfilePublic:
+    if conditional.is_conditional:
+        updated_at = await repo.get_profile_updated_at_by_username(username=username)
+        if updated_at is not None:
+            conditional.check(Validators.for_row("profiles", username, updated_at))
     profile = await repo.get_profile_by_username(username=username)
     if not profile:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No profile found with that username")
+    Validators.for_row("profiles", username, profile.updated_at).apply(response)
     return profile
 
 
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Body, Path, Depends, HTTPException
+from fastapi import APIRouter, Body, Path, Depends, HTTPException, Response
 from starlette.status import HTTP_201_CREATED, HTTP_404_NOT_FOUND, HTTP_401_UNAUTHORIZED, HTTP_400_BAD_REQUEST
 
-from app.api.dependencies.auth import get_current_active_user
+from app.api.conditional import ConditionalRequest, Validators
+from app.api.dependencies.auth import get_current_active_user_record
+from app.api.dependencies.conditional import get_conditional_request
 from app.api.dependencies.database import get_repository
 from app.models.user import UserCreate, UserPublic, UserInDB
 from app.models.token import AccessToken
@@ -44,6 +46,11 @@ async def user_login_with_email_and_password(
 
 @router.get("/me/", response_model=UserPublic, name="users:get-current-user")
 async def get_currently_authenticated_user(
-        current_user: UserInDB = Depends(get_current_active_user)
+        response: Response,
+        current_user: UserInDB = Depends(get_current_active_user_record),
+        conditional: ConditionalRequest = Depends(get_conditional_request),
 ) -> UserPublic:
+    validators = Validators.for_row("users", current_user.id, current_user.updated_at)
+    conditional.check(validators)
+    validators.apply(response)
     return current_user
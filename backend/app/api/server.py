@@ -1,7 +1,10 @@
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
+from app.api.conditional import NotModified, not_modified_handler
+from app.api.middleware import CompressionMiddleware, MetricsMiddleware, ServerTimingMiddleware
 from app.api.routes import router as api_router
+from app.api.routes.metrics import router as metrics_router
 from app.core import config, tasks
 
 
@@ -15,11 +18,16 @@ def get_application():
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(ServerTimingMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    app.add_exception_handler(NotModified, not_modified_handler)
 
     app.add_event_handler("startup", tasks.create_start_app_handler(app))
     app.add_event_handler("shutdown", tasks.create_stop_app_handler(app))
 
     app.include_router(api_router, prefix="/api")
+    app.include_router(metrics_router)
     return app
 
 
@@ -1,6 +1,6 @@
 from databases import DatabaseURL
 from starlette.config import Config
-from starlette.datastructures import Secret
+from starlette.datastructures import CommaSeparatedStrings, Secret
 
 
 config = Config(".env")
@@ -17,6 +17,52 @@ JWT_AUDIENCE = config("JWT_AUDIENCE", cast=str, default="phresh:auth")
 JWT_ALGORITHM = config("JWT_ALGORITHM", cast=str, default="HS256")
 JWT_TOKEN_PREFIX = config("JWT_TOKEN_PREFIX", cast=str, default="Bearer")
 
+PASSWORD_HASHING_EXECUTOR = config("PASSWORD_HASHING_EXECUTOR", cast=str, default="thread")
+PASSWORD_HASHING_MAX_WORKERS = config("PASSWORD_HASHING_MAX_WORKERS", cast=int, default=4)
+PASSWORD_HASHING_MAX_QUEUE = config("PASSWORD_HASHING_MAX_QUEUE", cast=int, default=64)
+
+PRINCIPAL_CACHE_MAX_SIZE = config("PRINCIPAL_CACHE_MAX_SIZE", cast=int, default=10_000)
+PRINCIPAL_CACHE_TTL_SECONDS = config("PRINCIPAL_CACHE_TTL_SECONDS", cast=float, default=30.0)
+
+# build the current user from token claims alone, only routes that need the full row query users
+AUTH_STATELESS_PRINCIPAL = config("AUTH_STATELESS_PRINCIPAL", cast=bool, default=False)
+TOKEN_REVOCATION_REFRESH_SECONDS = config("TOKEN_REVOCATION_REFRESH_SECONDS", cast=float, default=30.0)
+
+DEFAULT_PAGE_SIZE = config("DEFAULT_PAGE_SIZE", cast=int, default=20)
+MAX_PAGE_SIZE = config("MAX_PAGE_SIZE", cast=int, default=100)
+# rows encoded per chunk of a streamed list response
+STREAM_CHUNK_SIZE = config("STREAM_CHUNK_SIZE", cast=int, default=100)
+# rows validated and inserted per statement of a bulk import, and the most one import may hold
+BULK_IMPORT_CHUNK_SIZE = config("BULK_IMPORT_CHUNK_SIZE", cast=int, default=500)
+BULK_IMPORT_MAX_ROWS = config("BULK_IMPORT_MAX_ROWS", cast=int, default=10_000)
+# most offers created or decided by one batch request
+OFFER_BATCH_MAX_SIZE = config("OFFER_BATCH_MAX_SIZE", cast=int, default=100)
+
+# response compression, bodies under the min size go out as they are, those of the threadpool size or more
+# are compressed off the event loop; levels are those of dynamic content, not of static assets
+COMPRESSION_MIN_SIZE = config("COMPRESSION_MIN_SIZE", cast=int, default=1024)
+COMPRESSION_THREADPOOL_MIN_SIZE = config("COMPRESSION_THREADPOOL_MIN_SIZE", cast=int, default=128 * 1024)
+COMPRESSION_GZIP_LEVEL = config("COMPRESSION_GZIP_LEVEL", cast=int, default=6)
+COMPRESSION_BROTLI_QUALITY = config("COMPRESSION_BROTLI_QUALITY", cast=int, default=4)
+COMPRESSION_ZSTD_LEVEL = config("COMPRESSION_ZSTD_LEVEL", cast=int, default=3)
+# names of the routes whose responses are never compressed, e.g. offers:list-offers-for-cleaning
+COMPRESSION_EXCLUDED_ROUTES = config("COMPRESSION_EXCLUDED_ROUTES", cast=CommaSeparatedStrings, default="")
+
+# connection pool, timeouts in seconds except the statement one, 0 disables a timeout or lifetime
+DB_POOL_MIN_SIZE = config("DB_POOL_MIN_SIZE", cast=int, default=2)
+DB_POOL_MAX_SIZE = config("DB_POOL_MAX_SIZE", cast=int, default=10)
+DB_POOL_ACQUIRE_TIMEOUT = config("DB_POOL_ACQUIRE_TIMEOUT", cast=float, default=10.0)
+DB_POOL_MAX_LIFETIME = config("DB_POOL_MAX_LIFETIME", cast=float, default=3600.0)
+DB_POOL_MAX_IDLE_TIME = config("DB_POOL_MAX_IDLE_TIME", cast=float, default=300.0)
+DB_STATEMENT_TIMEOUT_MS = config("DB_STATEMENT_TIMEOUT_MS", cast=int, default=30_000)
+# reads of repository methods marked as such go to the replica pool, when there is one, unless the
+# user wrote within the last READ_YOUR_WRITES_SECONDS
+DB_REPLICA_POOL_MIN_SIZE = config("DB_REPLICA_POOL_MIN_SIZE", cast=int, default=2)
+DB_REPLICA_POOL_MAX_SIZE = config("DB_REPLICA_POOL_MAX_SIZE", cast=int, default=10)
+READ_YOUR_WRITES_SECONDS = config("READ_YOUR_WRITES_SECONDS", cast=float, default=5.0)
+# requests running more queries than the budget, or one statement this many times, are logged
+REQUEST_QUERY_BUDGET = config("REQUEST_QUERY_BUDGET", cast=int, default=10)
+REPEATED_QUERY_THRESHOLD = config("REPEATED_QUERY_THRESHOLD", cast=int, default=3)
 
 POSTGRES_USER = config("POSTGRES_USER", cast=str)
 POSTGRES_PASSWORD = config("POSTGRES_PASSWORD", cast=Secret)
@@ -29,4 +75,5 @@ DATABASE_URL = config(
     "DATABASE_URL",
     cast=DatabaseURL,
     default=f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
-)
\ No newline at end of file
+)
+DATABASE_REPLICA_URL = config("DATABASE_REPLICA_URL", cast=DatabaseURL, default=None)
@@ -0,0 +1,126 @@
+import bisect
+import math
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# seconds, fine grained where queries and most requests land
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Cumulative counts per upper bound, the last bucket being +Inf, plus the sum and count of observations.
+    """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> List[Tuple[float, int]]:
+        total, cumulative = 0, []
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class HistogramFamily:
+    """
+    One histogram per combination of label values, created on first use.
+    """
+    def __init__(
+            self, name: str, help: str, label_names: Sequence[str], *, buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[Tuple[str, ...], Histogram] = {}
+
+    def labels(self, *values: str) -> Histogram:
+        histogram = self._histograms.get(values)
+        if histogram is None:
+            histogram = self._histograms[values] = Histogram(self.buckets)
+        return histogram
+
+    def items(self) -> Iterable[Tuple[Tuple[str, ...], Histogram]]:
+        return sorted(self._histograms.items())
+
+    def clear(self) -> None:
+        self._histograms.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Mapping[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Exposition:
+    """
+    Builds a Prometheus text format (0.0.4) page, one add_* call per metric family.
+    """
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self) -> None:
+        self._lines: List[str] = []
+
+    def add_histograms(self, family: HistogramFamily) -> None:
+        self._header(family.name, family.help, "histogram")
+        for values, histogram in family.items():
+            labels = dict(zip(family.label_names, values))
+            for bound, count in histogram.cumulative_counts():
+                self._lines.append(f"{family.name}_bucket{_labels({**labels, 'le': _number(bound)})} {count}")
+            self._lines.append(f"{family.name}_sum{_labels(labels)} {_number(histogram.sum)}")
+            self._lines.append(f"{family.name}_count{_labels(labels)} {histogram.count}")
+
+    def add_samples(
+            self, name: str, help: str, kind: str, samples: Iterable[Tuple[Optional[Mapping[str, str]], float]]
+    ) -> None:
+        """
+        kind is gauge or counter, samples are (labels, value) pairs.
+        """
+        self._header(name, help, kind)
+        for labels, value in samples:
+            self._lines.append(f"{name}{_labels(labels or {})} {_number(value)}")
+
+    def _header(self, name: str, help: str, kind: str) -> None:
+        self._lines.append(f"# HELP {name} {help}")
+        self._lines.append(f"# TYPE {name} {kind}")
+
+    def render(self) -> str:
+        return "\n".join(self._lines) + "\n"
+
+
+request_latency = HistogramFamily(
+    "phresh_http_request_duration_seconds",
+    "Time to serve a request, by route name, method and status code.",
+    ("route", "method", "status"),
+)
+query_latency = HistogramFamily(
+    "phresh_db_query_duration_seconds",
+    "Time to run a registered repository query, by query constant.",
+    ("query",),
+)
+hashing_latency = HistogramFamily(
+    "phresh_auth_hashing_duration_seconds",
+    "Password hashing jobs, time waiting for a worker (queue) and on the worker (run), by function.",
+    ("function", "phase"),
+)
@@ -1,16 +1,40 @@
+import asyncio
 from typing import Callable
 from fastapi import FastAPI
 
 from app.db.tasks import connect_to_db, close_db_connection
+from app.services import auth_service, revocation_list
 
 
 def create_start_app_handler(app: FastAPI) -> Callable:
     async def start_app() -> None:
         await connect_to_db(app)
+        await start_revocation_refresher(app)
     return start_app
 
 
 def create_stop_app_handler(app: FastAPI) -> Callable:
     async def stop_app() -> None:
+        await stop_revocation_refresher(app)
         await close_db_connection(app)
+        auth_service.hashing_pool.shutdown()
     return stop_app
+
+
+async def start_revocation_refresher(app: FastAPI) -> None:
+    db = getattr(app.state, "_db", None)
+    if db is None:
+        return
+    await revocation_list.refresh(db)
+    app.state._revocation_refresher = asyncio.create_task(revocation_list.run_refresher(db))
+
+
+async def stop_revocation_refresher(app: FastAPI) -> None:
+    refresher = getattr(app.state, "_revocation_refresher", None)
+    if refresher is None:
+        return
+    refresher.cancel()
+    try:
+        await refresher
+    except asyncio.CancelledError:
+        pass
@@ -0,0 +1,118 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from databases import Database
+
+from app.db.statements import statements
+
+WHITESPACE = re.compile(r"\s+")
+
+
+class RequestQueries:
+    """
+    The queries one request ran, by statement name (the text, shortened, of unregistered ones) with
+    their duration.
+    """
+    def __init__(self) -> None:
+        self.queries: List[Tuple[str, float]] = []
+        self.seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.queries.append((name, seconds))
+        self.seconds += seconds
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """
+        Statements that ran at least threshold times, usually a loop issuing one query per item.
+        """
+        counts = Counter(name for name, _ in self.queries)
+        return {name: count for name, count in counts.items() if count >= threshold}
+
+
+# set by the Server-Timing middleware for the duration of a request
+request_queries: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+def query_name(query: Any) -> str:
+    statement = statements.get(query) if isinstance(query, str) else None
+    if statement is not None:
+        return statement.name
+    text = WHITESPACE.sub(" ", str(query)).strip()
+    return text if len(text) <= 80 else f"{text[:77]}..."
+
+
+def record_query(name: str, seconds: float) -> None:
+    queries = request_queries.get()
+    if queries is not None:
+        queries.record(name, seconds)
+
+
+@contextmanager
+def accounted(query: Any) -> Iterator[None]:
+    """
+    Times the block as a run of query, for the request being served if any.
+    """
+    if request_queries.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_query(query_name(query), time.perf_counter() - started)
+
+
+async def accounted_iteration(query: Any, records: AsyncIterator[Mapping]) -> AsyncIterator[Mapping]:
+    """
+    Like accounted for a cursor, only the time spent waiting for rows counts, not the consumer's.
+    """
+    if request_queries.get() is None:
+        async for record in records:
+            yield record
+        return
+    seconds, started = 0.0, time.perf_counter()
+    try:
+        async for record in records:
+            seconds += time.perf_counter() - started
+            yield record
+            started = time.perf_counter()
+        seconds += time.perf_counter() - started
+    finally:
+        record_query(query_name(query), seconds)
+
+
+class AccountedDatabase(Database):
+    """
+    Database whose query methods count towards the request being served, for code that queries it
+    directly instead of through a unit of work, which accounts for its own queries.
+    """
+    async def fetch_all(self, query: Any, values: dict = None) -> List[Mapping]:
+        with accounted(query):
+            return await super().fetch_all(query, values)
+
+    async def fetch_one(self, query: Any, values: dict = None) -> Optional[Mapping]:
+        with accounted(query):
+            return await super().fetch_one(query, values)
+
+    async def fetch_val(self, query: Any, values: dict = None, column: Any = 0) -> Any:
+        with accounted(query):
+            return await super().fetch_val(query, values, column=column)
+
+    async def execute(self, query: Any, values: dict = None) -> Any:
+        with accounted(query):
+            return await super().execute(query, values)
+
+    async def execute_many(self, query: Any, values: list) -> None:
+        with accounted(query):
+            return await super().execute_many(query, values)
+
+    async def iterate(self, query: Any, values: dict = None) -> AsyncIterator[Mapping]:
+        async for record in accounted_iteration(query, super().iterate(query, values)):
+            yield record
@@ -0,0 +1,46 @@
+"""
+Database maintenance commands, run from the backend directory:
+
+    python -m app.db.commands rebuild-rating-stats
+"""
+import argparse
+import asyncio
+import os
+
+from databases import Database
+
+from app.core.config import DATABASE_URL
+from app.db.repositories.evaluations import EvaluationsRepository
+from app.db.unit_of_work import UnitOfWork
+
+
+async def rebuild_rating_stats(uow: UnitOfWork) -> None:
+    cleaners = await uow.get_repository(EvaluationsRepository).rebuild_cleaner_rating_stats()
+    print(f"Rebuilt rating stats for {cleaners} cleaners.")
+
+
+COMMANDS = {
+    "rebuild-rating-stats": rebuild_rating_stats,
+}
+
+
+async def run(command: str) -> None:
+    db_url = f"{DATABASE_URL}_test" if os.environ.get("TESTING") else DATABASE_URL
+    db = Database(db_url, min_size=1, max_size=1)
+    await db.connect()
+    try:
+        async with UnitOfWork(db) as uow:
+            await COMMANDS[command](uow)
+    finally:
+        await db.disconnect()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args()
+    asyncio.run(run(args.command))
+
+
+if __name__ == "__main__":
+    main()
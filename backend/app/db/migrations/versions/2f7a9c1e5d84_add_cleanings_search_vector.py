@@ -0,0 +1,48 @@
+"""add_cleanings_search_vector
+
+Revision ID: 2f7a9c1e5d84
+Revises: 8e2d4c6b1a97
+Create Date: 2026-10-18 15:22:36.904415
+"""
+
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '2f7a9c1e5d84'
+down_revision = '8e2d4c6b1a97'
+branch_labels = None
+depends_on = None
+
+
+def add_cleanings_search_vector() -> None:
+    """
+    Full text search over cleaning names and descriptions.
+    - search_vector is generated by postgres on every insert and update, name matches weigh more than description ones.
+    - The GIN index answers the @@ match without reading the table.
+    """
+    op.add_column(
+        "cleanings",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR,
+            sa.Computed(
+                "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+                "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+                persisted=True,
+            ),
+            nullable=False,
+        ),
+    )
+    op.create_index("ix_cleanings_search_vector", "cleanings", ["search_vector"], postgresql_using="gin")
+
+
+def upgrade() -> None:
+    add_cleanings_search_vector()
+
+
+def downgrade() -> None:
+    op.drop_index("ix_cleanings_search_vector", table_name="cleanings")
+    op.drop_column("cleanings", "search_vector")
@@ -0,0 +1,47 @@
+"""add_keyset_pagination_indexes
+
+Revision ID: 44cc6e8ddc91
+Revises: c203d7fd4025
+Create Date: 2026-10-18 11:02:17.514820
+"""
+
+
+from alembic import op
+
+
+revision = '44cc6e8ddc91'
+down_revision = 'c203d7fd4025'
+branch_labels = None
+depends_on = None
+
+
+KEYSET_INDEXES = (
+    # (index name, table, filter column, tie breaker)
+    ("ix_cleanings_owner_created_at_id", "cleanings", "owner", "id"),
+    ("ix_offers_cleaning_id_created_at_user_id", "user_offers_for_cleanings", "cleaning_id", "user_id"),
+    (
+        "ix_cleaner_evaluations_cleaner_id_created_at_cleaning_id",
+        "cleaning_to_cleaner_evaluations",
+        "cleaner_id",
+        "cleaning_id",
+    ),
+)
+
+
+def create_keyset_pagination_indexes() -> None:
+    """
+    List endpoints page on (created_at, tie breaker) within one owner, cleaning or cleaner.
+    - Each index starts with the filtered column, so a page is a range scan from the cursor position.
+    - Scanned backwards for the newest first ordering, no sort and no offset, so every page costs the same.
+    """
+    for name, table, filter_column, tie_breaker in KEYSET_INDEXES:
+        op.create_index(name, table, [filter_column, "created_at", tie_breaker])
+
+
+def upgrade() -> None:
+    create_keyset_pagination_indexes()
+
+
+def downgrade() -> None:
+    for name, table, _, _ in KEYSET_INDEXES:
+        op.drop_index(name, table_name=table)
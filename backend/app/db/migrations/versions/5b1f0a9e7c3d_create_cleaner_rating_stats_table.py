@@ -0,0 +1,81 @@
+"""create_cleaner_rating_stats_table
+
+Revision ID: 5b1f0a9e7c3d
+Revises: 44cc6e8ddc91
+Create Date: 2026-10-18 12:40:03.118602
+"""
+
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '5b1f0a9e7c3d'
+down_revision = '44cc6e8ddc91'
+branch_labels = None
+depends_on = None
+
+
+RATINGS = ("professionalism", "completeness", "efficiency", "overall_rating")
+STARS = ("zero_stars", "one_stars", "two_stars", "three_stars", "four_stars", "five_stars")
+
+
+def create_cleaner_rating_stats_table() -> None:
+    """
+    Running totals of every cleaner's evaluations, so their stats are a primary key read.
+    - Sum and count per rating, averages are sum / count over the non null ratings.
+    - One counter per overall rating value, min and max are the lowest and highest non empty one.
+    """
+    op.create_table(
+        "cleaner_rating_stats",
+        sa.Column("cleaner_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("total_evaluations", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("total_no_show", sa.Integer, nullable=False, server_default="0"),
+        *[
+            column
+            for rating in RATINGS
+            for column in (
+                sa.Column(f"{rating}_sum", sa.BigInteger, nullable=False, server_default="0"),
+                sa.Column(f"{rating}_count", sa.Integer, nullable=False, server_default="0"),
+            )
+        ],
+        *[sa.Column(stars, sa.Integer, nullable=False, server_default="0") for stars in STARS],
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+
+
+def backfill_cleaner_rating_stats() -> None:
+    op.execute(
+        """
+        INSERT INTO cleaner_rating_stats
+        SELECT cleaner_id,
+               COUNT(*),
+               COUNT(*) FILTER (WHERE no_show),
+               COALESCE(SUM(professionalism), 0),
+               COUNT(professionalism),
+               COALESCE(SUM(completeness), 0),
+               COUNT(completeness),
+               COALESCE(SUM(efficiency), 0),
+               COUNT(efficiency),
+               COALESCE(SUM(overall_rating), 0),
+               COUNT(overall_rating),
+               COUNT(*) FILTER (WHERE overall_rating = 0),
+               COUNT(*) FILTER (WHERE overall_rating = 1),
+               COUNT(*) FILTER (WHERE overall_rating = 2),
+               COUNT(*) FILTER (WHERE overall_rating = 3),
+               COUNT(*) FILTER (WHERE overall_rating = 4),
+               COUNT(*) FILTER (WHERE overall_rating = 5),
+               now()
+        FROM cleaning_to_cleaner_evaluations
+        GROUP BY cleaner_id;
+        """
+    )
+
+
+def upgrade() -> None:
+    create_cleaner_rating_stats_table()
+    backfill_cleaner_rating_stats()
+
+
+def downgrade() -> None:
+    op.drop_table("cleaner_rating_stats")
@@ -0,0 +1,46 @@
+"""add_unique_accepted_offer_index
+
+Revision ID: 7c3e1b9d2a46
+Revises: 2f7a9c1e5d84
+Create Date: 2026-10-18 16:48:12.570283
+"""
+
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '7c3e1b9d2a46'
+down_revision = '2f7a9c1e5d84'
+branch_labels = None
+depends_on = None
+
+
+def make_accepted_offer_index_unique() -> None:
+    """
+    At most one accepted offer per cleaning, enforced by postgres instead of a check made before the update.
+    - Concurrent accepts of one cleaning are serialized on this index entry only, the loser gets a unique violation.
+    - It replaces the plain partial index the cleaning feed uses to skip taken jobs, same columns and predicate.
+    """
+    op.drop_index("ix_offers_accepted_cleaning_id", table_name="user_offers_for_cleanings")
+    op.create_index(
+        "uq_offers_accepted_cleaning_id",
+        "user_offers_for_cleanings",
+        ["cleaning_id"],
+        unique=True,
+        postgresql_where=sa.text("status = 'accepted'"),
+    )
+
+
+def upgrade() -> None:
+    make_accepted_offer_index_unique()
+
+
+def downgrade() -> None:
+    op.drop_index("uq_offers_accepted_cleaning_id", table_name="user_offers_for_cleanings")
+    op.create_index(
+        "ix_offers_accepted_cleaning_id",
+        "user_offers_for_cleanings",
+        ["cleaning_id"],
+        postgresql_where=sa.text("status = 'accepted'"),
+    )
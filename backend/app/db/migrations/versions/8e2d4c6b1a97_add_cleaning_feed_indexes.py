@@ -0,0 +1,43 @@
+"""add_cleaning_feed_indexes
+
+Revision ID: 8e2d4c6b1a97
+Revises: 5b1f0a9e7c3d
+Create Date: 2026-10-18 14:05:51.330917
+"""
+
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '8e2d4c6b1a97'
+down_revision = '5b1f0a9e7c3d'
+branch_labels = None
+depends_on = None
+
+
+def create_cleaning_feed_indexes() -> None:
+    """
+    The feed pages through all cleanings by (created_at, id) or (price, id).
+    - One index per sort, the feed reads it from the cursor position and stops after a page of open jobs.
+    - Jobs with an accepted offer are skipped through a partial index holding only accepted offers,
+      a small fraction of the offers table.
+    """
+    op.create_index("ix_cleanings_created_at_id", "cleanings", ["created_at", "id"])
+    op.create_index("ix_cleanings_price_id", "cleanings", ["price", "id"])
+    op.create_index(
+        "ix_offers_accepted_cleaning_id",
+        "user_offers_for_cleanings",
+        ["cleaning_id"],
+        postgresql_where=sa.text("status = 'accepted'"),
+    )
+
+
+def upgrade() -> None:
+    create_cleaning_feed_indexes()
+
+
+def downgrade() -> None:
+    op.drop_index("ix_offers_accepted_cleaning_id", table_name="user_offers_for_cleanings")
+    op.drop_index("ix_cleanings_price_id", table_name="cleanings")
+    op.drop_index("ix_cleanings_created_at_id", table_name="cleanings")
@@ -0,0 +1,44 @@
+"""create_token_revocations_table
+
+Revision ID: c203d7fd4025
+Revises: 84411c8787b8
+Create Date: 2026-10-18 09:12:41.208331
+"""
+
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'c203d7fd4025'
+down_revision = '84411c8787b8'
+branch_labels = None
+depends_on = None
+
+
+def create_token_revocations_table() -> None:
+    """
+    Deny list for stateless access tokens.
+    - One row per user, every token of that user issued at or before revoked_at is rejected.
+    - Revoking again only moves revoked_at forward, so the table stays as small as the number of users.
+    """
+    op.create_table(
+        "token_revocations",
+        sa.Column(
+            "user_id",
+            sa.Integer,
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column(
+            "revoked_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False, index=True,
+        ),
+    )
+
+
+def upgrade() -> None:
+    create_token_revocations_table()
+
+
+def downgrade() -> None:
+    op.drop_table("token_revocations")
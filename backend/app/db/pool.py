@@ -0,0 +1,83 @@
+import asyncio
+import time
+from typing import Any, Optional
+
+from asyncpg.pool import Pool, PoolConnectionProxy
+
+from app.models.health import PoolStats
+
+
+class MonitoredPool:
+    """
+    Stands in for the asyncpg pool databases acquires connections from.
+
+    - Acquiring waits at most acquire_timeout seconds, then raises asyncio.TimeoutError.
+    - Every max_lifetime seconds the open connections are expired, asyncpg replaces them as they
+      are released or next acquired.
+    - Counts acquires, waiters and the time spent waiting, and whether the last acquire failed,
+      so health can be reported without touching the database.
+    """
+    def __init__(self, pool: Pool, *, acquire_timeout: float, max_lifetime: float) -> None:
+        self._pool = pool
+        self._acquire_timeout = acquire_timeout or None
+        self._max_lifetime = max_lifetime
+        self._expired_at = time.monotonic()
+        self.waiting = 0
+        self.acquires = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pool, name)
+
+    async def acquire(self) -> PoolConnectionProxy:
+        if self._max_lifetime and time.monotonic() - self._expired_at >= self._max_lifetime:
+            self._expired_at = time.monotonic()
+            await self._pool.expire_connections()
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            connection = await self._pool.acquire(timeout=self._acquire_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.last_error = f"no connection available within {self._acquire_timeout}s"
+            raise
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e) or type(e).__name__
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.waiting -= 1
+            self.acquires += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.last_error = None
+        return connection
+
+    async def release(self, connection: PoolConnectionProxy) -> None:
+        await self._pool.release(connection)
+
+    @property
+    def is_healthy(self) -> bool:
+        return not self._pool.is_closing() and self.last_error is None
+
+    def stats(self) -> PoolStats:
+        size, idle = self._pool.get_size(), self._pool.get_idle_size()
+        return PoolStats(
+            size=size,
+            min_size=self._pool.get_min_size(),
+            max_size=self._pool.get_max_size(),
+            in_use=size - idle,
+            idle=idle,
+            waiting=self.waiting,
+            acquires=self.acquires,
+            timeouts=self.timeouts,
+            errors=self.errors,
+            wait_seconds=self.wait_seconds,
+            max_wait_seconds=self.max_wait_seconds,
+            last_error=self.last_error,
+        )
@@ -1,6 +1,123 @@
+import functools
+import inspect
+from typing import TYPE_CHECKING, Any, Callable, Mapping, Optional, Sequence, Type, TypeVar
+
 from databases import Database
+from fastapi import HTTPException
+from pydantic import BaseModel
+from starlette.status import HTTP_400_BAD_REQUEST
+
+from app.models.pagination import FIRST_PAGE_CURSOR, Cursor, Page, PageParams, encode_cursor
+
+if TYPE_CHECKING:
+    from app.db.unit_of_work import Column, UnitOfWork
+
+Repository = TypeVar("Repository", bound="BaseRepository")
+Method = TypeVar("Method", bound=Callable)
+
+
+def _within(mode: str) -> Callable[[Method], Method]:
+    def decorator(method: Method) -> Method:
+        if inspect.isasyncgenfunction(method):
+            @functools.wraps(method)
+            async def generator_wrapper(self: "BaseRepository", *args: Any, **kwargs: Any) -> Any:
+                if self.uow is None:
+                    async for item in method(self, *args, **kwargs):
+                        yield item
+                    return
+                with getattr(self.uow, mode)():
+                    async for item in method(self, *args, **kwargs):
+                        yield item
+            return generator_wrapper
+
+        @functools.wraps(method)
+        async def wrapper(self: "BaseRepository", *args: Any, **kwargs: Any) -> Any:
+            if self.uow is None:
+                return await method(self, *args, **kwargs)
+            with getattr(self.uow, mode)():
+                return await method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# repository methods are marked as one or the other, reads may be served by the replica,
+# writes and anything unmarked go to the primary
+reads = _within("reading")
+writes = _within("writing")
 
 
 class BaseRepository:
-    def __init__(self, db: Database) -> None:
+    def __init__(self, db: Database, *, uow: Optional["UnitOfWork"] = None) -> None:
         self.db = db
+        self.uow = uow
+
+    def get_repository(self, repo_type: Type[Repository]) -> Repository:
+        """
+        Nested repositories come from the unit of work when there is one, so they share its instances.
+        """
+        if self.uow is not None:
+            return self.uow.get_repository(repo_type)
+        return repo_type(self.db)
+
+    @reads
+    async def fetch_one_by_identity(
+            self,
+            *,
+            table: str,
+            column: "Column",
+            value: Any,
+            query: str,
+            values: dict,
+            identity_columns: Sequence["Column"],
+    ) -> Optional[Mapping]:
+        """
+        fetch_one that goes through the unit of work's identity map, rows already loaded are not queried again.
+        """
+        if self.uow is None:
+            return await self.db.fetch_one(query=query, values=values)
+
+        row = self.uow.identity_map.get(table, column, value)
+        if row is None:
+            row = await self.db.fetch_one(query=query, values=values)
+            self.uow.identity_map.add(table, row, columns=identity_columns)
+        return row
+
+    def invalidate_identities(self, table: str) -> None:
+        if self.uow is not None:
+            self.uow.identity_map.invalidate(table)
+
+    @reads
+    async def fetch_page(
+            self,
+            *,
+            query: str,
+            values: dict,
+            page: PageParams,
+            key: str,
+            model: Type[BaseModel],
+            sort_column: str = "created_at",
+            first_page: Cursor = FIRST_PAGE_CURSOR,
+    ) -> Page:
+        """
+        Runs a keyset query, ordered by (<sort_column>, <key>) and bound to :cursor_value, :cursor_key and :limit.
+        One extra row is fetched to tell whether there is a next page. first_page is a position before every row,
+        newest first on created_at by default. A cursor of another kind than first_page, e.g. a price from the feed
+        replayed on a list sorted by created_at, is a 400.
+        """
+        if page.cursor is not None and not isinstance(page.cursor.value, type(first_page.value)):
+            raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+        cursor = page.cursor or first_page
+        rows = await self.db.fetch_all(
+            query=query,
+            values={
+                **values,
+                "cursor_value": cursor.value,
+                "cursor_key": cursor.key,
+                "limit": page.limit + 1,
+            },
+        )
+        next_cursor = None
+        if len(rows) > page.limit:
+            rows = rows[:page.limit]
+            next_cursor = encode_cursor(Cursor(value=rows[-1][sort_column], key=rows[-1][key]))
+        return Page(items=[model(**row) for row in rows], next_cursor=next_cursor)
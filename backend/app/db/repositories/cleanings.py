@@ -1,9 +1,20 @@
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, AsyncIterable, AsyncIterator, List, Optional, Sequence, Tuple
+
+from pydantic import ValidationError
+
 from fastapi import HTTPException
-from starlette.status import HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND, HTTP_403_FORBIDDEN
+from starlette.status import HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND, HTTP_403_FORBIDDEN, HTTP_422_UNPROCESSABLE_ENTITY
 
-from app.db.repositories.base import BaseRepository
-from app.models.cleaning import CleaningCreate, CleaningUpdate, CleaningInDB, CleaningPublic
-from typing import List
+from app.db.repositories.base import BaseRepository, reads, writes
+from app.core.config import BULK_IMPORT_CHUNK_SIZE, BULK_IMPORT_MAX_ROWS, DEFAULT_PAGE_SIZE
+from app.models.cleaning import (
+    CleaningCreate, CleaningUpdate, CleaningInDB, CleaningPublic, CleaningFeedFilters, CleaningFeedSort,
+    CleaningSearchResult, CleaningImportCreated, CleaningImportError, CleaningImportResult,
+)
+from app.models.pagination import FIRST_PAGE_CURSOR, Cursor, Page, PageParams
 
 from app.models.user import UserInDB
 
@@ -13,16 +24,29 @@ CREATE_CLEANING_QUERY = """
     RETURNING id, name, description, price, cleaning_type, owner, created_at, updated_at;
 """
 
+BULK_CREATE_CLEANINGS_QUERY = """
+    INSERT INTO cleanings (name, description, price, cleaning_type, owner)
+    SELECT name, description, price, cleaning_type, :owner
+    FROM unnest(
+        CAST(:names AS text[]),
+        CAST(:descriptions AS text[]),
+        CAST(:prices AS numeric[]),
+        CAST(:cleaning_types AS text[])
+    ) WITH ORDINALITY AS new_cleanings (name, description, price, cleaning_type, position)
+    ORDER BY position
+    RETURNING id, name, description, price, cleaning_type, owner, created_at, updated_at;
+"""
+
 GET_CLEANING_BY_ID_QUERY = """
-    SELECT id, name, description, price, cleaning_type, owner
+    SELECT id, name, description, price, cleaning_type, owner, updated_at
     FROM cleanings
     WHERE id = :id;
 """
 
-
-GET_ALL_CLEANING_QUERY = """
-    SELECT id, name, description, price, cleaning_type, owner
-    FROM cleanings;
+GET_CLEANING_UPDATED_AT_QUERY = """
+    SELECT updated_at
+    FROM cleanings
+    WHERE id = :id;
 """
 
 UPDATE_CLEANING_BY_ID_QUERY = """
@@ -43,29 +67,265 @@ DELETE_CLEANING_BY_ID_QUERY = """
 """
 
 LIST_ALL_USER_CLEANINGS_QUERY = """
+    SELECT id, name, description, price, cleaning_type, owner, created_at, updated_at
+    FROM cleanings
+    WHERE owner = :owner AND (created_at, id) < (:cursor_value, :cursor_key)
+    ORDER BY created_at DESC, id DESC
+    LIMIT :limit;
+"""
+
+CLEANING_FEED_QUERY = """
+    SELECT id, name, description, price, cleaning_type, owner, created_at, updated_at
+    FROM cleanings
+    WHERE owner IS DISTINCT FROM :owner
+      AND NOT EXISTS (
+          SELECT 1
+          FROM user_offers_for_cleanings
+          WHERE cleaning_id = cleanings.id AND status = 'accepted'
+      )
+      AND ({sort_column}, id) {comparison} (:cursor_value, :cursor_key)
+      {filters}
+    ORDER BY {sort_column} {direction}, id {direction}
+    LIMIT :limit;
+"""
+
+# sort -> (sort column, direction, keyset comparison, position before every row)
+CLEANING_FEED_SORTS = {
+    CleaningFeedSort.newest: ("created_at", "DESC", "<", FIRST_PAGE_CURSOR),
+    CleaningFeedSort.price_asc: ("price", "ASC", ">", Cursor(value=Decimal("-100000000"), key=0)),
+    CleaningFeedSort.price_desc: ("price", "DESC", "<", Cursor(value=Decimal("100000000"), key=0)),
+}
+
+CLEANING_FEED_FILTERS = {
+    "cleaning_type": "AND cleaning_type = :cleaning_type",
+    "min_price": "AND price >= :min_price",
+    "max_price": "AND price <= :max_price",
+    "created_since": "AND created_at >= :created_since",
+}
+
+SEARCH_CLEANINGS_QUERY = """
+    SELECT id, name, description, price, cleaning_type, owner, created_at, updated_at, rank,
+           ts_headline('english', coalesce(description, name), query, :headline_options) AS snippet
+    FROM (
+        SELECT cleanings.id, name, description, price, cleaning_type, owner, created_at, updated_at, query,
+               ts_rank(search_vector, query, 32) AS rank
+        FROM cleanings, websearch_to_tsquery('english', :query) AS query
+        WHERE search_vector @@ query
+          AND (ts_rank(search_vector, query, 32), cleanings.id)
+              < (CAST(CAST(:cursor_value AS numeric) AS real), :cursor_key)
+        ORDER BY rank DESC, id DESC
+        LIMIT :limit
+    ) AS page
+    ORDER BY rank DESC, id DESC;
+"""
+
+# ts_rank normalization 32 keeps ranks below 1, so 1 sorts before every match.
+# Cursor numbers are bound as Decimal, i.e. numeric, and cast on to real so they compare with the real
+# ts_rank returns, a numeric comparison would not match the rank the previous page ended on.
+SEARCH_FIRST_PAGE_CURSOR = Cursor(value=Decimal(1), key=0)
+SEARCH_HEADLINE_OPTIONS = "StartSel=<b>, StopSel=</b>, MaxWords=30, MinWords=10, MaxFragments=2"
+
+ITERATE_ALL_USER_CLEANINGS_QUERY = """
     SELECT id, name, description, price, cleaning_type, owner, created_at, updated_at
     FROM cleanings
     WHERE owner = :owner
+    ORDER BY created_at DESC, id DESC;
 """
 
 
 class CleaningsRepository(BaseRepository):
+    @writes
     async def create_cleaning(self, *, new_cleaning: CleaningCreate, requesting_user: UserInDB) -> CleaningPublic:
         cleaning = await self.db.fetch_one(
             query=CREATE_CLEANING_QUERY, values={**new_cleaning.dict(), "owner": requesting_user.id}
         )
         return CleaningPublic(**cleaning)
 
+    @writes
+    async def bulk_create_cleanings(
+            self, *, new_cleanings: Sequence[CleaningCreate], requesting_user: UserInDB
+    ) -> List[CleaningPublic]:
+        """
+        Inserts every cleaning in one statement, returned in the order they were given.
+        """
+        if not new_cleanings:
+            return []
+        created = await self.db.fetch_all(
+            query=BULK_CREATE_CLEANINGS_QUERY,
+            values={
+                "owner": requesting_user.id,
+                "names": [c.name for c in new_cleanings],
+                "descriptions": [c.description for c in new_cleanings],
+                "prices": [Decimal(str(c.price)) for c in new_cleanings],
+                "cleaning_types": [c.cleaning_type for c in new_cleanings],
+            },
+        )
+        # ids are drawn from the sequence in position order
+        return [CleaningPublic(**cleaning) for cleaning in sorted(created, key=lambda c: c["id"])]
+
+    @writes
+    async def import_cleanings(
+            self, *, records: AsyncIterable[Any], requesting_user: UserInDB
+    ) -> CleaningImportResult:
+        """
+        Creates cleanings from raw records, either parsed JSON objects or NDJSON lines.
+        - Every record is read and validated before a connection is leased, a slow upload holds none.
+        - Records are validated BULK_IMPORT_CHUNK_SIZE at a time, the event loop gets to run other requests
+          between chunks, at most BULK_IMPORT_MAX_ROWS are accepted.
+        - Invalid records are reported by index and skipped, the valid ones are created in one transaction,
+          BULK_IMPORT_CHUNK_SIZE per statement. An import creating nothing is a 422.
+        """
+        if self.uow is not None:
+            await self.uow.release()
+        result = CleaningImportResult()
+        valid: List[Tuple[int, CleaningCreate]] = []
+        chunk: List[Any] = []
+        read = 0
+        async for record in records:
+            if read >= BULK_IMPORT_MAX_ROWS:
+                raise HTTPException(
+                    status_code=HTTP_400_BAD_REQUEST,
+                    detail=f"Too many cleanings, at most {BULK_IMPORT_MAX_ROWS} can be imported at once.",
+                )
+            chunk.append(record)
+            read += 1
+            if len(chunk) == BULK_IMPORT_CHUNK_SIZE:
+                self._validate_import_chunk(chunk, start=read - len(chunk), valid=valid, result=result)
+                chunk = []
+                await asyncio.sleep(0)
+        self._validate_import_chunk(chunk, start=read - len(chunk), valid=valid, result=result)
+
+        if not valid:
+            raise HTTPException(
+                status_code=HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=[error.dict() for error in result.errors] or "No cleanings to import.",
+            )
+        async with self.db.transaction():
+            for start in range(0, len(valid), BULK_IMPORT_CHUNK_SIZE):
+                chunk = valid[start:start + BULK_IMPORT_CHUNK_SIZE]
+                created = await self.bulk_create_cleanings(
+                    new_cleanings=[new_cleaning for _, new_cleaning in chunk], requesting_user=requesting_user
+                )
+                result.created.extend(
+                    CleaningImportCreated(index=index, cleaning=cleaning)
+                    for (index, _), cleaning in zip(chunk, created)
+                )
+        return result
+
+    @staticmethod
+    def _validate_import_chunk(
+            chunk: List[Any], *, start: int, valid: List[Tuple[int, CleaningCreate]], result: CleaningImportResult
+    ) -> None:
+        for index, record in enumerate(chunk, start=start):
+            try:
+                if isinstance(record, (str, bytes)):
+                    new_cleaning = CleaningCreate.parse_raw(record)
+                else:
+                    new_cleaning = CleaningCreate.parse_obj(record)
+            except ValidationError as e:
+                result.errors.append(CleaningImportError(index=index, errors=e.errors()))
+                continue
+            valid.append((index, new_cleaning))
+
+    @reads
     async def get_cleaning_by_id(self, *, id: int, requesting_user: UserInDB) -> CleaningInDB:
-        cleaning = await self.db.fetch_one(query=GET_CLEANING_BY_ID_QUERY, values={"id": id})
+        cleaning = await self.fetch_one_by_identity(
+            table="cleanings",
+            column="id",
+            value=id,
+            query=GET_CLEANING_BY_ID_QUERY,
+            values={"id": id},
+            identity_columns=("id",),
+        )
         if not cleaning:
             return None
         return CleaningInDB(**cleaning)
 
-    async def list_all_user_cleanings(self, requesting_user: UserInDB) -> List[CleaningInDB]:
-        cleanings = await self.db.fetch_all(query=LIST_ALL_USER_CLEANINGS_QUERY, values={"owner": requesting_user.id})
-        return [CleaningInDB(**l) for l in cleanings]
+    @reads
+    async def get_cleaning_updated_at(self, *, id: int) -> Optional[datetime]:
+        """
+        When the cleaning last changed, from the row get_cleaning_by_id loaded if it did, None when it doesn't exist.
+        Cheaper than loading the cleaning, so conditional requests are answered before that.
+        """
+        cleaning = self.uow.identity_map.get("cleanings", "id", id) if self.uow is not None else None
+        if cleaning is not None:
+            return cleaning["updated_at"]
+        return await self.db.fetch_val(query=GET_CLEANING_UPDATED_AT_QUERY, values={"id": id})
+
+    @reads
+    async def list_all_user_cleanings(
+            self, requesting_user: UserInDB, *, page: PageParams = PageParams(limit=DEFAULT_PAGE_SIZE)
+    ) -> Page[CleaningInDB]:
+        return await self.fetch_page(
+            query=LIST_ALL_USER_CLEANINGS_QUERY,
+            values={"owner": requesting_user.id},
+            page=page,
+            key="id",
+            model=CleaningInDB,
+        )
+
+    @reads
+    async def get_cleaning_feed(
+            self,
+            *,
+            requesting_user: UserInDB,
+            filters: CleaningFeedFilters,
+            page: PageParams = PageParams(limit=DEFAULT_PAGE_SIZE),
+    ) -> Page[CleaningInDB]:
+        """
+        Cleanings of other users that don't have an accepted offer yet. Only the filters that are set
+        end up in the query, so each combination gets a plan using the sort column's index.
+        """
+        sort_column, direction, comparison, first_page = CLEANING_FEED_SORTS[filters.sort]
+        filter_values = {
+            name: value for name, value in filters.dict(exclude={"sort"}).items() if value is not None
+        }
+        query = CLEANING_FEED_QUERY.format(
+            sort_column=sort_column,
+            direction=direction,
+            comparison=comparison,
+            filters="\n      ".join(CLEANING_FEED_FILTERS[name] for name in filter_values),
+        )
+        return await self.fetch_page(
+            query=query,
+            values={"owner": requesting_user.id, **filter_values},
+            page=page,
+            key="id",
+            model=CleaningInDB,
+            sort_column=sort_column,
+            first_page=first_page,
+        )
+
+    @reads
+    async def search_cleanings(
+            self, *, query: str, page: PageParams = PageParams(limit=DEFAULT_PAGE_SIZE)
+    ) -> Page[CleaningSearchResult]:
+        """
+        Cleanings whose name or description match a web search style query, e.g. `oven -carpet "deep clean"`.
+        - Matches come from the GIN index on search_vector, best ranked first.
+        - Snippets are only built for the rows of the requested page.
+        """
+        return await self.fetch_page(
+            query=SEARCH_CLEANINGS_QUERY,
+            values={"query": query, "headline_options": SEARCH_HEADLINE_OPTIONS},
+            page=page,
+            key="id",
+            model=CleaningSearchResult,
+            sort_column="rank",
+            first_page=SEARCH_FIRST_PAGE_CURSOR,
+        )
+
+    @reads
+    async def iterate_all_user_cleanings(self, requesting_user: UserInDB) -> AsyncIterator[CleaningInDB]:
+        """
+        Every cleaning of the user through a server side cursor, rows are fetched in small batches as consumed.
+        """
+        async for cleaning in self.db.iterate(
+            query=ITERATE_ALL_USER_CLEANINGS_QUERY, values={"owner": requesting_user.id}
+        ):
+            yield CleaningInDB(**cleaning)
 
+    @writes
     async def update_cleaning(
             self, *, cleaning: CleaningInDB, cleaning_update: CleaningUpdate
     ) -> CleaningPublic:
@@ -81,7 +341,12 @@ class CleaningsRepository(BaseRepository):
             query=UPDATE_CLEANING_BY_ID_QUERY,
             values=cleaning_update_params.dict()
         )
+        self.invalidate_identities("cleanings")
         return CleaningPublic(**updated_cleaning)
 
+    @writes
     async def delete_cleaning_by_id(self, *, cleaning: CleaningInDB) -> int:
-        return await self.db.execute(query=DELETE_CLEANING_BY_ID_QUERY, values={"id": cleaning.id})
+        deleted_id = await self.db.execute(query=DELETE_CLEANING_BY_ID_QUERY, values={"id": cleaning.id})
+        self.invalidate_identities("cleanings")
+        self.invalidate_identities("user_offers_for_cleanings")
+        return deleted_id
@@ -1,39 +1,88 @@
-from typing import List
+from typing import AsyncIterator, Optional
 
-from databases import Database
+from fastapi import HTTPException, status
 
-from app.db.repositories.base import BaseRepository
-from app.db.repositories.offers import OffersRepository
+from app.core.config import DEFAULT_PAGE_SIZE
+from app.db.repositories.base import BaseRepository, reads, writes
+from app.db.repositories.offers import OFFER_TRANSITIONS, offer_transition_values
 
 from app.models.cleaning import CleaningInDB
 from app.models.user import UserInDB
 from app.models.evaluation import EvaluationCreate, EvaluationUpdate, EvaluationInDB, EvaluationAggregate
+from app.models.offer import OfferAction
+from app.models.pagination import Page, PageParams
 
 
 CREATE_OWNER_EVALUATION_FOR_CLEANER_QUERY = """
-    INSERT INTO cleaning_to_cleaner_evaluations (
-        cleaning_id,
-        cleaner_id,
-        no_show,
-        headline,
-        comment,
-        professionalism,
-        completeness,
-        efficiency,
-        overall_rating
-    )
-    VALUES (
-        :cleaning_id,
-        :cleaner_id,
-        :no_show,
-        :headline,
-        :comment,
-        :professionalism,
-        :completeness,
-        :efficiency,
-        :overall_rating
+    WITH completed_offer AS (
+        UPDATE user_offers_for_cleanings
+        SET status = :to
+        WHERE cleaning_id = :cleaning_id AND user_id = :cleaner_id AND status = ANY(CAST(:allowed_from AS text[]))
+        RETURNING cleaning_id, user_id
+    ), created_evaluation AS (
+        INSERT INTO cleaning_to_cleaner_evaluations (
+            cleaning_id,
+            cleaner_id,
+            no_show,
+            headline,
+            comment,
+            professionalism,
+            completeness,
+            efficiency,
+            overall_rating
+        )
+        SELECT cleaning_id,
+               user_id,
+               CAST(:no_show AS boolean),
+               CAST(:headline AS text),
+               CAST(:comment AS text),
+               CAST(:professionalism AS integer),
+               CAST(:completeness AS integer),
+               CAST(:efficiency AS integer),
+               CAST(:overall_rating AS integer)
+        FROM completed_offer
+        RETURNING no_show, cleaning_id, cleaner_id, headline, comment, professionalism, completeness, efficiency, overall_rating, created_at, updated_at
+    ), rating_stats AS (
+        INSERT INTO cleaner_rating_stats AS stats
+        SELECT cleaner_id,
+               1,
+               no_show::int,
+               COALESCE(professionalism, 0),
+               (professionalism IS NOT NULL)::int,
+               COALESCE(completeness, 0),
+               (completeness IS NOT NULL)::int,
+               COALESCE(efficiency, 0),
+               (efficiency IS NOT NULL)::int,
+               overall_rating,
+               1,
+               (overall_rating = 0)::int,
+               (overall_rating = 1)::int,
+               (overall_rating = 2)::int,
+               (overall_rating = 3)::int,
+               (overall_rating = 4)::int,
+               (overall_rating = 5)::int,
+               now()
+        FROM created_evaluation
+        ON CONFLICT (cleaner_id) DO UPDATE
+        SET total_evaluations     = stats.total_evaluations + EXCLUDED.total_evaluations,
+            total_no_show         = stats.total_no_show + EXCLUDED.total_no_show,
+            professionalism_sum   = stats.professionalism_sum + EXCLUDED.professionalism_sum,
+            professionalism_count = stats.professionalism_count + EXCLUDED.professionalism_count,
+            completeness_sum      = stats.completeness_sum + EXCLUDED.completeness_sum,
+            completeness_count    = stats.completeness_count + EXCLUDED.completeness_count,
+            efficiency_sum        = stats.efficiency_sum + EXCLUDED.efficiency_sum,
+            efficiency_count      = stats.efficiency_count + EXCLUDED.efficiency_count,
+            overall_rating_sum    = stats.overall_rating_sum + EXCLUDED.overall_rating_sum,
+            overall_rating_count  = stats.overall_rating_count + EXCLUDED.overall_rating_count,
+            zero_stars            = stats.zero_stars + EXCLUDED.zero_stars,
+            one_stars             = stats.one_stars + EXCLUDED.one_stars,
+            two_stars             = stats.two_stars + EXCLUDED.two_stars,
+            three_stars           = stats.three_stars + EXCLUDED.three_stars,
+            four_stars            = stats.four_stars + EXCLUDED.four_stars,
+            five_stars            = stats.five_stars + EXCLUDED.five_stars,
+            updated_at            = now()
     )
-    RETURNING no_show, cleaning_id, cleaner_id, headline, comment, professionalism, completeness, efficiency, overall_rating, created_at, updated_at;
+    SELECT * FROM created_evaluation;
 """
 
 GET_CLEANER_EVALUATION_FOR_CLEANING_QUERY = """
@@ -65,45 +114,139 @@ LIST_EVALUATIONS_FOR_CLEANER_QUERY = """
            created_at,
            updated_at
     FROM cleaning_to_cleaner_evaluations
-    WHERE cleaner_id = :cleaner_id;
+    WHERE cleaner_id = :cleaner_id AND (created_at, cleaning_id) < (:cursor_value, :cursor_key)
+    ORDER BY created_at DESC, cleaning_id DESC
+    LIMIT :limit;
 """
 
-GET_CLEANER_AGGREGATE_RATINGS_QUERY = """
-    SELECT        
-        AVG(professionalism) AS avg_professionalism,
-        AVG(completeness)    AS avg_completeness,
-        AVG(efficiency)      AS avg_efficiency,
-        AVG(overall_rating)  AS avg_overall_rating,
-        MIN(overall_rating)  AS min_overall_rating,
-        MAX(overall_rating)  AS max_overall_rating,
-        COUNT(cleaning_id)   AS total_evaluations,
-        SUM(no_show::int)    AS total_no_show,
-        COUNT(overall_rating) FILTER(WHERE overall_rating = 1) AS one_stars,
-        COUNT(overall_rating) FILTER(WHERE overall_rating = 2) AS two_stars,
-        COUNT(overall_rating) FILTER(WHERE overall_rating = 3) AS three_stars,
-        COUNT(overall_rating) FILTER(WHERE overall_rating = 4) AS four_stars,
-        COUNT(overall_rating) FILTER(WHERE overall_rating = 5) AS five_stars
+ITERATE_EVALUATIONS_FOR_CLEANER_QUERY = """
+    SELECT no_show,
+           cleaning_id,
+           cleaner_id,
+           headline,
+           comment,
+           professionalism,
+           completeness,
+           efficiency,
+           overall_rating,
+           created_at,
+           updated_at
     FROM cleaning_to_cleaner_evaluations
+    WHERE cleaner_id = :cleaner_id
+    ORDER BY created_at DESC, cleaning_id DESC;
+"""
+
+GET_CLEANER_AGGREGATE_RATINGS_QUERY = """
+    SELECT professionalism_sum::numeric / NULLIF(professionalism_count, 0) AS avg_professionalism,
+           completeness_sum::numeric / NULLIF(completeness_count, 0)       AS avg_completeness,
+           efficiency_sum::numeric / NULLIF(efficiency_count, 0)           AS avg_efficiency,
+           overall_rating_sum::numeric / NULLIF(overall_rating_count, 0)   AS avg_overall_rating,
+           CASE
+               WHEN zero_stars > 0 THEN 0
+               WHEN one_stars > 0 THEN 1
+               WHEN two_stars > 0 THEN 2
+               WHEN three_stars > 0 THEN 3
+               WHEN four_stars > 0 THEN 4
+               WHEN five_stars > 0 THEN 5
+           END                                                             AS min_overall_rating,
+           CASE
+               WHEN five_stars > 0 THEN 5
+               WHEN four_stars > 0 THEN 4
+               WHEN three_stars > 0 THEN 3
+               WHEN two_stars > 0 THEN 2
+               WHEN one_stars > 0 THEN 1
+               WHEN zero_stars > 0 THEN 0
+           END                                                             AS max_overall_rating,
+           total_evaluations,
+           total_no_show,
+           one_stars,
+           two_stars,
+           three_stars,
+           four_stars,
+           five_stars
+    FROM cleaner_rating_stats
     WHERE cleaner_id = :cleaner_id;
 """
 
+REBUILD_CLEANER_RATING_STATS_QUERY = """
+    WITH rebuilt AS (
+        INSERT INTO cleaner_rating_stats AS stats
+        SELECT cleaner_id,
+               COUNT(*),
+               COUNT(*) FILTER (WHERE no_show),
+               COALESCE(SUM(professionalism), 0),
+               COUNT(professionalism),
+               COALESCE(SUM(completeness), 0),
+               COUNT(completeness),
+               COALESCE(SUM(efficiency), 0),
+               COUNT(efficiency),
+               COALESCE(SUM(overall_rating), 0),
+               COUNT(overall_rating),
+               COUNT(*) FILTER (WHERE overall_rating = 0),
+               COUNT(*) FILTER (WHERE overall_rating = 1),
+               COUNT(*) FILTER (WHERE overall_rating = 2),
+               COUNT(*) FILTER (WHERE overall_rating = 3),
+               COUNT(*) FILTER (WHERE overall_rating = 4),
+               COUNT(*) FILTER (WHERE overall_rating = 5),
+               now()
+        FROM cleaning_to_cleaner_evaluations
+        GROUP BY cleaner_id
+        ON CONFLICT (cleaner_id) DO UPDATE
+        SET total_evaluations     = EXCLUDED.total_evaluations,
+            total_no_show         = EXCLUDED.total_no_show,
+            professionalism_sum   = EXCLUDED.professionalism_sum,
+            professionalism_count = EXCLUDED.professionalism_count,
+            completeness_sum      = EXCLUDED.completeness_sum,
+            completeness_count    = EXCLUDED.completeness_count,
+            efficiency_sum        = EXCLUDED.efficiency_sum,
+            efficiency_count      = EXCLUDED.efficiency_count,
+            overall_rating_sum    = EXCLUDED.overall_rating_sum,
+            overall_rating_count  = EXCLUDED.overall_rating_count,
+            zero_stars            = EXCLUDED.zero_stars,
+            one_stars             = EXCLUDED.one_stars,
+            two_stars             = EXCLUDED.two_stars,
+            three_stars           = EXCLUDED.three_stars,
+            four_stars            = EXCLUDED.four_stars,
+            five_stars            = EXCLUDED.five_stars,
+            updated_at            = now()
+        RETURNING cleaner_id
+    ), stale AS (
+        DELETE FROM cleaner_rating_stats
+        WHERE cleaner_id NOT IN (SELECT cleaner_id FROM rebuilt)
+    )
+    SELECT COUNT(*) FROM rebuilt;
+"""
+
+LOCK_EVALUATIONS_QUERY = """
+    LOCK TABLE cleaning_to_cleaner_evaluations IN SHARE MODE;
+"""
 
-class EvaluationsRepository(BaseRepository):
-    def __init__(self, db: Database) -> None:
-        super().__init__(db)
-        self.offers_repo = OffersRepository(db)
 
+class EvaluationsRepository(BaseRepository):
+    @writes
     async def create_evaluation_for_cleaner(
-            self, *, evaluation_create: EvaluationCreate, cleaning: CleaningInDB, cleaner: UserInDB
+            self, *, evaluation_create: EvaluationCreate, cleaning_id: int, cleaner_id: int
     ) -> EvaluationInDB:
-        async with self.db.transaction():
-            created_evaluation = await self.db.fetch_one(
-                query=CREATE_OWNER_EVALUATION_FOR_CLEANER_QUERY,
-                values={**evaluation_create.dict(), "cleaning_id": cleaning.id, "cleaner_id": cleaner.id},
-            )
-            await self.offers_repo.mark_offer_completed(cleaning=cleaning, cleaner=cleaner)
-            return EvaluationInDB(**created_evaluation)
+        """
+        Marks the cleaner's offer as completed, inserts the evaluation and adds the ratings to the cleaner's
+        rating stats, all in one statement. Nothing is inserted unless the offer can complete.
+        """
+        transition = OFFER_TRANSITIONS[OfferAction.complete]
+        self.invalidate_identities("user_offers_for_cleanings")
+        created_evaluation = await self.db.fetch_one(
+            query=CREATE_OWNER_EVALUATION_FOR_CLEANER_QUERY,
+            values={
+                **evaluation_create.dict(),
+                **offer_transition_values(transition),
+                "cleaning_id": cleaning_id,
+                "cleaner_id": cleaner_id,
+            },
+        )
+        if not created_evaluation:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=transition.error)
+        return EvaluationInDB(**created_evaluation)
 
+    @reads
     async def get_cleaner_evaluation_for_cleaning(self, *, cleaning: CleaningInDB, cleaner: UserInDB) -> EvaluationInDB:
         evaluation = await self.db.fetch_one(
             query=GET_CLEANER_EVALUATION_FOR_CLEANING_QUERY,
@@ -113,13 +256,42 @@ class EvaluationsRepository(BaseRepository):
             return None
         return EvaluationInDB(**evaluation)
 
-    async def list_evaluations_for_cleaner(self, *, cleaner: UserInDB) -> List[EvaluationInDB]:
-        evaluations = await self.db.fetch_all(
+    @reads
+    async def list_evaluations_for_cleaner(
+            self, *, cleaner: UserInDB, page: PageParams = PageParams(limit=DEFAULT_PAGE_SIZE)
+    ) -> Page[EvaluationInDB]:
+        return await self.fetch_page(
             query=LIST_EVALUATIONS_FOR_CLEANER_QUERY,
-            values={"cleaner_id": cleaner.id}
+            values={"cleaner_id": cleaner.id},
+            page=page,
+            key="cleaning_id",
+            model=EvaluationInDB,
         )
-        return [EvaluationInDB(**e) for e in evaluations]
 
-    async def get_cleaner_aggregates(self, *, cleaner: UserInDB) -> EvaluationAggregate:
+    @reads
+    async def iterate_evaluations_for_cleaner(self, *, cleaner: UserInDB) -> AsyncIterator[EvaluationInDB]:
+        async for evaluation in self.db.iterate(
+            query=ITERATE_EVALUATIONS_FOR_CLEANER_QUERY, values={"cleaner_id": cleaner.id}
+        ):
+            yield EvaluationInDB(**evaluation)
+
+    @reads
+    async def get_cleaner_aggregates(self, *, cleaner: UserInDB) -> Optional[EvaluationAggregate]:
+        """
+        Read from cleaner_rating_stats by primary key, None when the cleaner has no evaluations yet.
+        """
         aggr = await self.db.fetch_one(query=GET_CLEANER_AGGREGATE_RATINGS_QUERY, values={"cleaner_id": cleaner.id})
+        if not aggr:
+            return None
         return EvaluationAggregate(**aggr)
+
+    @writes
+    async def rebuild_cleaner_rating_stats(self) -> int:
+        """
+        Recomputes cleaner_rating_stats from the evaluations, new evaluations wait until it's done.
+        Returns the number of cleaners with stats. Run it through a UnitOfWork, so the lock and
+        the rebuild share the transaction's connection.
+        """
+        async with self.db.transaction():
+            await self.db.execute(query=LOCK_EVALUATIONS_QUERY)
+            return await self.db.fetch_val(query=REBUILD_CLEANER_RATING_STATS_QUERY)
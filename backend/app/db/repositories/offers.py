@@ -1,11 +1,16 @@
-from typing import List
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
 
 from fastapi import HTTPException, status
 from asyncpg.exceptions import UniqueViolationError
 
-from app.db.repositories.base import BaseRepository
+from app.core.config import DEFAULT_PAGE_SIZE
+from app.db.repositories.base import BaseRepository, reads, writes
 from app.models.cleaning import CleaningInDB
-from app.models.offer import OfferCreate, OfferUpdate, OfferInDB
+from app.models.offer import (
+    OfferAction, OfferCreate, OfferUpdate, OfferInDB, OfferAuthorizationContext, OfferBatchOutcome, OfferDecision,
+    OfferStatus,
+)
+from app.models.pagination import Page, PageParams
 from app.models.user import UserInDB
 
 CREATE_OFFER_FOR_CLEANING_QUERY = """
@@ -17,7 +22,9 @@ CREATE_OFFER_FOR_CLEANING_QUERY = """
 LIST_OFFERS_FOR_CLEANING_QUERY = """
     SELECT cleaning_id, user_id, status, created_at, updated_at
     FROM user_offers_for_cleanings
-    WHERE cleaning_id = :cleaning_id;
+    WHERE cleaning_id = :cleaning_id AND (created_at, user_id) < (:cursor_value, :cursor_key)
+    ORDER BY created_at DESC, user_id DESC
+    LIMIT :limit;
 """
 
 GET_OFFER_FOR_CLEANING_FROM_USER_QUERY = """
@@ -26,102 +33,453 @@ GET_OFFER_FOR_CLEANING_FROM_USER_QUERY = """
     WHERE cleaning_id = :cleaning_id AND user_id = :user_id;
 """
 
-ACCEPT_OFFER_QUERY = """
-    UPDATE user_offers_for_cleanings
-    SET status = 'accepted'
-    WHERE cleaning_id = :cleaning_id AND user_id = :user_id
-    RETURNING cleaning_id, user_id, status, created_at, updated_at; 
+GET_OFFER_AUTHORIZATION_CONTEXT_BY_USERNAME_QUERY = """
+    SELECT c.id         AS cleaning_id,
+           c.owner      AS cleaning_owner,
+           u.id         AS user_id,
+           o.status     AS status,
+           o.created_at AS created_at,
+           o.updated_at AS updated_at,
+           EXISTS (
+               SELECT 1
+               FROM user_offers_for_cleanings accepted
+               WHERE accepted.cleaning_id = c.id AND accepted.status = 'accepted'
+           )            AS has_accepted_offer
+    FROM cleanings c
+        LEFT JOIN users u ON u.username = :username
+        LEFT JOIN user_offers_for_cleanings o ON o.cleaning_id = c.id AND o.user_id = u.id
+    WHERE c.id = :cleaning_id;
 """
 
-REJECT_ALL_OTHERS_OFFER_QUERY = """
-    UPDATE user_offers_for_cleanings
-    SET status = 'rejected'
-    WHERE cleaning_id = :cleaning_id AND user_id != :user_id AND status = 'pending'
-    RETURNING cleaning_id, user_id, status, created_at, updated_at;
+GET_OFFER_AUTHORIZATION_CONTEXT_BY_USER_ID_QUERY = """
+    SELECT c.id         AS cleaning_id,
+           c.owner      AS cleaning_owner,
+           u.id         AS user_id,
+           o.status     AS status,
+           o.created_at AS created_at,
+           o.updated_at AS updated_at,
+           EXISTS (
+               SELECT 1
+               FROM user_offers_for_cleanings accepted
+               WHERE accepted.cleaning_id = c.id AND accepted.status = 'accepted'
+           )            AS has_accepted_offer
+    FROM cleanings c
+        LEFT JOIN users u ON u.id = :user_id
+        LEFT JOIN user_offers_for_cleanings o ON o.cleaning_id = c.id AND o.user_id = u.id
+    WHERE c.id = :cleaning_id;
 """
 
 
-CANCEL_OFFER_QUERY = """
-    UPDATE user_offers_for_cleanings
-    SET status = 'cancelled'
-    WHERE cleaning_id = :cleaning_id AND user_id = :user_id
-    RETURNING cleaning_id, user_id, status, created_at, updated_at;
+class OfferTransition(NamedTuple):
+    """
+    A change of an offer's status, only made from one of the allowed_from statuses.
+    - to is None for transitions removing the offer.
+    - others is a (from, to) status change applied to the other offers of the cleaning along with it.
+    - error is the reason given when the offer is in none of the allowed_from statuses.
+    """
+    allowed_from: Tuple[OfferStatus, ...]
+    to: Optional[OfferStatus]
+    error: str
+    others: Optional[Tuple[OfferStatus, OfferStatus]] = None
+
+
+OFFER_TRANSITIONS: Dict[OfferAction, OfferTransition] = {
+    OfferAction.accept: OfferTransition(
+        allowed_from=(OfferStatus.pending,),
+        to=OfferStatus.accepted,
+        error="Can only accept offers that are currently pending.",
+        others=(OfferStatus.pending, OfferStatus.rejected),
+    ),
+    OfferAction.reject: OfferTransition(
+        allowed_from=(OfferStatus.pending,),
+        to=OfferStatus.rejected,
+        error="Can only reject offers that are currently pending.",
+    ),
+    OfferAction.cancel: OfferTransition(
+        allowed_from=(OfferStatus.accepted,),
+        to=OfferStatus.cancelled,
+        error="Can only cancel offers that have been accepted.",
+        others=(OfferStatus.rejected, OfferStatus.pending),
+    ),
+    OfferAction.rescind: OfferTransition(
+        allowed_from=(OfferStatus.pending,),
+        to=None,
+        error="Can only rescind currently pending offer",
+    ),
+    OfferAction.complete: OfferTransition(
+        allowed_from=(OfferStatus.accepted,),
+        to=OfferStatus.completed,
+        error="Only users with accepted offers can be evaluated",
+    ),
+}
+
+# Transitions take a row lock on the cleaning first, so those of one cleaning run one after the other instead
+# of deadlocking on each other's offers, the lock is released with the statement's transaction.
+# The offer only changes from an allowed status, a concurrent change makes the statement a no op,
+# and uq_offers_accepted_cleaning_id refuses a second accepted offer whatever the order.
+# One row per existing cleaning: the offer's status before the statement, and the offer after it if it changed.
+OFFER_TRANSITION_QUERY = """
+    WITH locked_cleaning AS (
+        SELECT id
+        FROM cleanings
+        WHERE id = :cleaning_id
+        FOR NO KEY UPDATE
+    ), transitioned_offer AS (
+        {change}
+        WHERE cleaning_id = (SELECT id FROM locked_cleaning)
+          AND user_id = :user_id
+          AND status = ANY(CAST(:allowed_from AS text[]))
+        RETURNING cleaning_id, user_id, status, created_at, updated_at
+    ){others}
+    SELECT c.id         AS cleaning_id,
+           o.status     AS previous_status,
+           t.user_id    AS user_id,
+           t.status     AS status,
+           t.created_at AS created_at,
+           t.updated_at AS updated_at
+    FROM locked_cleaning c
+        LEFT JOIN user_offers_for_cleanings o ON o.cleaning_id = c.id AND o.user_id = :user_id
+        LEFT JOIN transitioned_offer t ON TRUE;
 """
 
-SET_ALL_OTHER_OFFERS_AS_PENDING_QUERY = """
-    UPDATE user_offers_for_cleanings
-    SET status = 'pending'
-    WHERE cleaning_id = :cleaning_id AND user_id != :user_id AND status = 'rejected'
-    RETURNING cleaning_id, user_id, status, created_at, updated_at;
+OFFER_TRANSITION_CHANGES = {
+    "update": "UPDATE user_offers_for_cleanings\n        SET status = :to",
+    "delete": "DELETE FROM user_offers_for_cleanings",
+}
+
+OFFER_TRANSITION_OTHERS = """, other_offers AS (
+        UPDATE user_offers_for_cleanings
+        SET status = :others_to
+        WHERE cleaning_id = (SELECT cleaning_id FROM transitioned_offer)
+          AND user_id != :user_id
+          AND status = :others_from
+    )
+"""
+
+
+def compile_offer_transition(transition: OfferTransition) -> str:
+    return OFFER_TRANSITION_QUERY.format(
+        change=OFFER_TRANSITION_CHANGES["delete" if transition.to is None else "update"],
+        others=OFFER_TRANSITION_OTHERS if transition.others else "\n",
+    )
+
+
+def offer_transition_values(transition: OfferTransition) -> dict:
+    """
+    Bind values of a compiled transition, besides :cleaning_id and :user_id.
+    """
+    values = {"allowed_from": [status.value for status in transition.allowed_from]}
+    if transition.to is not None:
+        values["to"] = transition.to.value
+    if transition.others:
+        values["others_from"], values["others_to"] = (status.value for status in transition.others)
+    return values
+
+
+OFFER_TRANSITION_QUERIES = {action: compile_offer_transition(t) for action, t in OFFER_TRANSITIONS.items()}
+
+BATCH_CREATE_OFFERS_QUERY = """
+    WITH requested AS (
+        SELECT DISTINCT cleaning_id
+        FROM unnest(CAST(:cleaning_ids AS integer[])) AS cleaning_id
+    ), created_offers AS (
+        INSERT INTO user_offers_for_cleanings (cleaning_id, user_id, status)
+        SELECT c.id, :user_id, 'pending'
+        FROM cleanings c
+        WHERE c.id = ANY(CAST(:cleaning_ids AS integer[])) AND c.owner != :user_id
+        ON CONFLICT (user_id, cleaning_id) DO NOTHING
+        RETURNING cleaning_id, user_id, status, created_at, updated_at
+    )
+    SELECT r.cleaning_id,
+           c.owner      AS cleaning_owner,
+           o.user_id    AS user_id,
+           o.status     AS status,
+           o.created_at AS created_at,
+           o.updated_at AS updated_at
+    FROM requested r
+        LEFT JOIN cleanings c ON c.id = r.cleaning_id
+        LEFT JOIN created_offers o ON o.cleaning_id = r.cleaning_id;
 """
 
-RESCIND_OFFER_QUERY = """
-    DELETE FROM user_offers_for_cleanings
-    WHERE cleaning_id = :cleaning_id
-    AND user_id = :user_id;
+GET_OFFER_AUTHORIZATION_CONTEXTS_QUERY = """
+    SELECT d.cleaning_id,
+           c.owner      AS cleaning_owner,
+           d.user_id,
+           o.status     AS status,
+           o.created_at AS created_at,
+           o.updated_at AS updated_at,
+           EXISTS (
+               SELECT 1
+               FROM user_offers_for_cleanings accepted
+               WHERE accepted.cleaning_id = c.id AND accepted.status = 'accepted'
+           )            AS has_accepted_offer
+    FROM unnest(CAST(:cleaning_ids AS integer[]), CAST(:user_ids AS integer[])) AS d (cleaning_id, user_id)
+        JOIN cleanings c ON c.id = d.cleaning_id
+        LEFT JOIN user_offers_for_cleanings o ON o.cleaning_id = d.cleaning_id AND o.user_id = d.user_id;
 """
 
-MARK_OFFER_COMPLETED_QUERY = """
-    UPDATE user_offers_for_cleanings
-    SET status = 'completed'
-    WHERE cleaning_id = :cleaning_id AND user_id = :user_id
+LOCK_CLEANINGS_QUERY = """
+    SELECT id
+    FROM cleanings
+    WHERE id = ANY(CAST(:cleaning_ids AS integer[]))
+    ORDER BY id
+    FOR NO KEY UPDATE;
 """
 
+DECISION_ACTIONS = {OfferStatus.accepted: OfferAction.accept, OfferStatus.rejected: OfferAction.reject}
+
+# The accept and reject transitions applied to many offers at once, both are only allowed from pending:
+# the decided offers, plus every other pending offer of a cleaning whose decision is an accept.
+DECIDE_OFFERS_QUERY = """
+    WITH decisions AS (
+        SELECT *
+        FROM unnest(
+            CAST(:cleaning_ids AS integer[]), CAST(:user_ids AS integer[]), CAST(:statuses AS text[])
+        ) AS d (cleaning_id, user_id, status)
+    ), targets AS (
+        SELECT cleaning_id, user_id, status
+        FROM decisions
+        UNION
+        SELECT o.cleaning_id, o.user_id, 'rejected'
+        FROM user_offers_for_cleanings o
+            JOIN decisions d ON d.cleaning_id = o.cleaning_id AND d.status = 'accepted' AND o.user_id != d.user_id
+        WHERE o.status = 'pending'
+    )
+    UPDATE user_offers_for_cleanings o
+    SET status = t.status
+    FROM targets t
+    WHERE o.cleaning_id = t.cleaning_id AND o.user_id = t.user_id AND o.status = 'pending'
+    RETURNING o.cleaning_id, o.user_id, o.status, o.created_at, o.updated_at;
+"""
+
+OFFER_IDENTITY_COLUMN = ("cleaning_id", "user_id")
 
 
 class OffersRepository(BaseRepository):
+    @writes
     async def create_offer_for_cleaning(self, *, new_offer: OfferCreate) -> OfferInDB:
-        created_offer = await self.db.fetch_one(
-            query=CREATE_OFFER_FOR_CLEANING_QUERY, values={**new_offer.dict(), "status": "pending"}
-        )
+        try:
+            created_offer = await self.db.fetch_one(
+                query=CREATE_OFFER_FOR_CLEANING_QUERY, values={**new_offer.dict(), "status": "pending"}
+            )
+        except UniqueViolationError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Users aren't allowed create more than one offer for cleaning job."
+            )
         return OfferInDB(**created_offer)
 
-    async def list_offers_for_cleaning(self, *, cleaning: CleaningInDB) -> List[OfferInDB]:
-        offers = await self.db.fetch_all(query=LIST_OFFERS_FOR_CLEANING_QUERY, values={"cleaning_id": cleaning.id})
-        return [OfferInDB(**o) for o in offers]
+    @reads
+    async def list_offers_for_cleaning(
+            self, *, cleaning: CleaningInDB, page: PageParams = PageParams(limit=DEFAULT_PAGE_SIZE)
+    ) -> Page[OfferInDB]:
+        return await self.fetch_page(
+            query=LIST_OFFERS_FOR_CLEANING_QUERY,
+            values={"cleaning_id": cleaning.id},
+            page=page,
+            key="user_id",
+            model=OfferInDB,
+        )
 
+    @reads
     async def get_offer_for_cleaning_from_user(self, *, cleaning: CleaningInDB, user: UserInDB) -> OfferInDB:
-        offer_record = await self.db.fetch_one(
+        offer_record = await self.fetch_one_by_identity(
+            table="user_offers_for_cleanings",
+            column=OFFER_IDENTITY_COLUMN,
+            value=(cleaning.id, user.id),
             query=GET_OFFER_FOR_CLEANING_FROM_USER_QUERY,
-            values={"cleaning_id": cleaning.id, "user_id": user.id}
+            values={"cleaning_id": cleaning.id, "user_id": user.id},
+            identity_columns=(OFFER_IDENTITY_COLUMN,),
         )
         if not offer_record:
             return None
         return OfferInDB(**offer_record)
 
-    async def accept_offer(self, *, offer: OfferInDB, offer_update: OfferUpdate) -> OfferInDB:
-        async with self.db.transaction():
-            accepted_offer = await self.db.fetch_one(
-                query=ACCEPT_OFFER_QUERY,
-                values={"cleaning_id": offer.cleaning_id, "user_id": offer.user_id}
+    async def get_offer_authorization_context(
+            self, *, cleaning_id: int, username: Optional[str] = None, user_id: Optional[int] = None
+    ) -> Optional[OfferAuthorizationContext]:
+        """
+        Cleaning owner, the given user's id and offer, and whether the cleaning already has an accepted offer.
+        The user is looked up by username or by user_id. Returns None when the cleaning doesn't exist.
+        Left unmarked so it reads the primary, decisions are made on it.
+        """
+        if username is not None:
+            context = await self.db.fetch_one(
+                query=GET_OFFER_AUTHORIZATION_CONTEXT_BY_USERNAME_QUERY,
+                values={"cleaning_id": cleaning_id, "username": username},
             )
-            await self.db.execute(
-                query=REJECT_ALL_OTHERS_OFFER_QUERY,
-                values={"cleaning_id": offer.cleaning_id, "user_id": offer.user_id},
+        else:
+            context = await self.db.fetch_one(
+                query=GET_OFFER_AUTHORIZATION_CONTEXT_BY_USER_ID_QUERY,
+                values={"cleaning_id": cleaning_id, "user_id": user_id},
             )
-            return OfferInDB(**accepted_offer)
+        if not context:
+            return None
+        return OfferAuthorizationContext(**context)
 
-    async def cancel_offer(self, *, offer: OfferInDB, offer_update: OfferUpdate) -> OfferInDB:
-        async with self.db.transaction():
-            cancelled_offer = await self.db.fetch_one(
-                query=CANCEL_OFFER_QUERY,
-                values={"cleaning_id": offer.cleaning_id, "user_id": offer.user_id},
-            )
+    async def get_offer_authorization_contexts(
+            self, *, keys: Sequence[Tuple[int, int]]
+    ) -> Dict[Tuple[int, int], OfferAuthorizationContext]:
+        """
+        Authorization contexts of many (cleaning_id, user_id) pairs in one query,
+        pairs whose cleaning doesn't exist are left out.
+        """
+        contexts = await self.db.fetch_all(
+            query=GET_OFFER_AUTHORIZATION_CONTEXTS_QUERY,
+            values={"cleaning_ids": [key[0] for key in keys], "user_ids": [key[1] for key in keys]},
+        )
+        return {
+            (context["cleaning_id"], context["user_id"]): OfferAuthorizationContext(**context)
+            for context in contexts
+        }
 
-            await self.db.execute(
-                query=SET_ALL_OTHER_OFFERS_AS_PENDING_QUERY,
-                values={"cleaning_id": offer.cleaning_id, "user_id": offer.user_id}
+    @writes
+    async def create_offers_for_cleanings(
+            self, *, cleaning_ids: Sequence[int], requesting_user: UserInDB
+    ) -> List[OfferBatchOutcome]:
+        """
+        Creates the user's offers for every cleaning in one statement, one outcome per distinct cleaning id.
+        Cleanings that don't exist, that the user owns or already made an offer for are skipped.
+        """
+        self.invalidate_identities("user_offers_for_cleanings")
+        rows = await self.db.fetch_all(
+            query=BATCH_CREATE_OFFERS_QUERY,
+            values={"cleaning_ids": list(cleaning_ids), "user_id": requesting_user.id},
+        )
+        rows = {row["cleaning_id"]: row for row in rows}
+        outcomes = []
+        for cleaning_id in dict.fromkeys(cleaning_ids):
+            row = rows[cleaning_id]
+            outcome = OfferBatchOutcome(cleaning_id=cleaning_id, user_id=requesting_user.id)
+            if row["cleaning_owner"] is None:
+                outcome.error = "No Cleaning found with that id."
+            elif row["cleaning_owner"] == requesting_user.id:
+                outcome.error = "Users are unable to create offers for cleaning jobs they own."
+            elif row["status"] is None:
+                outcome.error = "Users aren't allowed create more than one offer for cleaning job."
+            else:
+                outcome.offer = OfferInDB(**row)
+            outcomes.append(outcome)
+        return outcomes
+
+    @writes
+    async def decide_offers(
+            self, *, decisions: Sequence[OfferDecision], requesting_user: UserInDB
+    ) -> List[OfferBatchOutcome]:
+        """
+        Accepts or rejects many pending offers across the owner's cleanings.
+        - Decisions are checked like single accepts, against one query loading every offer involved.
+        - The valid ones are applied in one statement, accepting an offer rejects the other pending
+          offers of its cleaning.
+        - Only one offer per cleaning can be accepted, and each offer is decided at most once.
+        - The cleanings are locked in id order while deciding, like single accepts lock their cleaning.
+        """
+        contexts = await self.get_offer_authorization_contexts(
+            keys=[(decision.cleaning_id, decision.user_id) for decision in decisions]
+        )
+        outcomes, valid, seen, accepting = [], {}, set(), set()
+        for decision in decisions:
+            key = (decision.cleaning_id, decision.user_id)
+            context = contexts.get(key)
+            outcome = OfferBatchOutcome(cleaning_id=decision.cleaning_id, user_id=decision.user_id)
+            if not context:
+                outcome.error = "No Cleaning found with that id."
+            elif context.cleaning_owner != requesting_user.id:
+                outcome.error = "Only the owner of the cleaning may accept or reject offers."
+            elif not context.offer:
+                outcome.error = "Offer not found."
+            elif key in seen:
+                outcome.error = "The offer is decided more than once."
+            elif context.status not in OFFER_TRANSITIONS[DECISION_ACTIONS[decision.status]].allowed_from:
+                outcome.error = OFFER_TRANSITIONS[DECISION_ACTIONS[decision.status]].error
+            elif decision.status == OfferStatus.accepted and (
+                    context.has_accepted_offer or decision.cleaning_id in accepting
+            ):
+                outcome.error = "The cleaning job already has an accepted offer"
+            else:
+                valid[key] = decision
+                if decision.status == OfferStatus.accepted:
+                    accepting.add(decision.cleaning_id)
+            seen.add(key)
+            outcomes.append(outcome)
+
+        if valid:
+            self.invalidate_identities("user_offers_for_cleanings")
+            cleaning_ids = [decision.cleaning_id for decision in valid.values()]
+            try:
+                async with self.db.transaction():
+                    await self.db.execute(query=LOCK_CLEANINGS_QUERY, values={"cleaning_ids": cleaning_ids})
+                    decided = await self.db.fetch_all(
+                        query=DECIDE_OFFERS_QUERY,
+                        values={
+                            "cleaning_ids": cleaning_ids,
+                            "user_ids": [decision.user_id for decision in valid.values()],
+                            "statuses": [decision.status.value for decision in valid.values()],
+                        },
+                    )
+            except UniqueViolationError:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="An offer of one of the cleaning jobs was accepted meanwhile, no decision was applied.",
+                )
+            decided = {(offer["cleaning_id"], offer["user_id"]): offer for offer in decided}
+            for outcome in outcomes:
+                key = (outcome.cleaning_id, outcome.user_id)
+                if key in valid:
+                    if key in decided and decided[key]["status"] == valid[key].status:
+                        outcome.offer = OfferInDB(**decided[key])
+                    else:
+                        outcome.error = OFFER_TRANSITIONS[DECISION_ACTIONS[valid[key].status]].error
+        return outcomes
+
+    @writes
+    async def transition_offer(self, *, cleaning_id: int, user_id: int, action: OfferAction) -> OfferInDB:
+        """
+        Moves the user's offer for the cleaning through the action's transition in one statement,
+        see OFFER_TRANSITIONS. Nothing is read beforehand, when the offer doesn't change the returned
+        row tells why.
+        """
+        transition = OFFER_TRANSITIONS[action]
+        self.invalidate_identities("user_offers_for_cleanings")
+        try:
+            offer = await self.db.fetch_one(
+                query=OFFER_TRANSITION_QUERIES[action],
+                values={"cleaning_id": cleaning_id, "user_id": user_id, **offer_transition_values(transition)},
+            )
+        except UniqueViolationError:
+            # another offer of the cleaning was accepted concurrently, the same race decide_offers reports
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="The cleaning job already has an accepted offer"
             )
-            return OfferInDB(**cancelled_offer)
+        if not offer:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No Cleaning found with that id.")
+        if offer["user_id"] is None:
+            if offer["previous_status"] is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Offer not found.")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=transition.error)
+        return OfferInDB(**offer)
 
-    async def rescind_offer(self, *, offer: OfferInDB) -> int:
-        return await self.db.execute(
-            query=RESCIND_OFFER_QUERY,
-            values={"cleaning_id": offer.cleaning_id, "user_id": offer.user_id}
+    @writes
+    async def accept_offer(self, *, offer: OfferInDB, offer_update: OfferUpdate) -> OfferInDB:
+        """
+        Accepts the offer and rejects every other pending offer for the cleaning.
+        """
+        return await self.transition_offer(
+            cleaning_id=offer.cleaning_id, user_id=offer.user_id, action=OfferAction.accept
         )
 
-    async def mark_offer_completed(self, *, cleaning: CleaningInDB, cleaner: UserInDB) -> OfferInDB:
-        return await self.db.fetch_one(
-            query=MARK_OFFER_COMPLETED_QUERY,
-            values={"cleaning_id": cleaning.id, "user_id": cleaner.id}
+    @writes
+    async def cancel_offer(self, *, offer: OfferInDB, offer_update: OfferUpdate) -> OfferInDB:
+        """
+        Cancels the offer and puts every rejected offer for the cleaning back to pending.
+        """
+        return await self.transition_offer(
+            cleaning_id=offer.cleaning_id, user_id=offer.user_id, action=OfferAction.cancel
+        )
+
+    @writes
+    async def rescind_offer(self, *, offer: OfferInDB) -> int:
+        rescinded = await self.transition_offer(
+            cleaning_id=offer.cleaning_id, user_id=offer.user_id, action=OfferAction.rescind
         )
+        return rescinded.user_id
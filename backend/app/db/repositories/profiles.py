@@ -1,4 +1,7 @@
-from app.db.repositories.base import BaseRepository
+from datetime import datetime
+from typing import Optional
+
+from app.db.repositories.base import BaseRepository, reads, writes
 from app.models.profile import ProfileCreate, ProfileUpdate, ProfilePublic, ProfileInDB
 from app.models.user import UserInDB
 
@@ -14,6 +17,7 @@ GET_PROFILE_BY_USER_ID_QUERY = """
     WHERE user_id = :user_id 
 """
 
+# the profile as served carries the user's username and email, it changes with either row
 GET_PROFILE_BY_USERNAME_QUERY = """
     SELECT 
         p.id,
@@ -25,7 +29,7 @@ GET_PROFILE_BY_USERNAME_QUERY = """
         image,
         user_id,
         p.created_at,
-        p.updated_at
+        GREATEST(p.updated_at, u.updated_at) AS updated_at
     FROM profiles p
         INNER JOIN users u 
         ON p.user_id = u.id
@@ -33,6 +37,14 @@ GET_PROFILE_BY_USERNAME_QUERY = """
         u.id = (SELECT id FROM users WHERE username = :username)
 """
 
+GET_PROFILE_UPDATED_AT_BY_USERNAME_QUERY = """
+    SELECT GREATEST(p.updated_at, u.updated_at)
+    FROM profiles p
+        INNER JOIN users u
+        ON p.user_id = u.id
+    WHERE u.username = :username;
+"""
+
 UPDATE_PROFILE_QUERY = """
     UPDATE profiles
         SET full_name = :full_name,
@@ -45,22 +57,40 @@ UPDATE_PROFILE_QUERY = """
 
 
 class ProfilesRepository(BaseRepository):
+    @writes
     async def create_profile_for_user(self, *, profile_create: ProfileCreate) -> ProfileInDB:
         created_profile = await self.db.fetch_one(query=CREATE_PROFILE_FOR_USER_QUERY, values=profile_create.dict())
         return created_profile
 
+    @reads
     async def get_profile_by_user_id(self, *, user_id: int) -> ProfileInDB:
-        profile_record = await self.db.fetch_one(query=GET_PROFILE_BY_USER_ID_QUERY, values={"user_id": user_id})
+        profile_record = await self.fetch_one_by_identity(
+            table="profiles",
+            column="user_id",
+            value=user_id,
+            query=GET_PROFILE_BY_USER_ID_QUERY,
+            values={"user_id": user_id},
+            identity_columns=("id", "user_id"),
+        )
         if not profile_record:
             return None
         return ProfileInDB(**profile_record)
 
+    @reads
     async def get_profile_by_username(self, *, username: str) -> ProfileInDB:
         profile_record = await self.db.fetch_one(query=GET_PROFILE_BY_USERNAME_QUERY, values={"username": username})
         if not profile_record:
             return None
         return ProfileInDB(**profile_record)
 
+    @reads
+    async def get_profile_updated_at_by_username(self, *, username: str) -> Optional[datetime]:
+        """
+        updated_at of get_profile_by_username without loading the profile, None when there is none.
+        """
+        return await self.db.fetch_val(query=GET_PROFILE_UPDATED_AT_BY_USERNAME_QUERY, values={"username": username})
+
+    @writes
     async def update_profile(self, *, profile_update: ProfileUpdate, requesting_user: UserInDB) -> ProfileInDB:
         profile = await self.get_profile_by_user_id(user_id=requesting_user.id)
         update_params = profile.copy(update=profile_update.dict(exclude_unset=True))
@@ -69,4 +99,5 @@ class ProfilesRepository(BaseRepository):
             query=UPDATE_PROFILE_QUERY,
             values=update_params.dict(exclude={"id", "created_at", "updated_at", "username", "email"})
         )
+        self.invalidate_identities("profiles")
         return ProfileInDB(**updated_profile)
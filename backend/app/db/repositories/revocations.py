@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import List
+
+from app.db.repositories.base import BaseRepository, reads, writes
+from app.models.token import TokenRevocation
+
+REVOKE_USER_TOKENS_QUERY = """
+    INSERT INTO token_revocations (user_id, revoked_at)
+    VALUES (:user_id, now())
+    ON CONFLICT (user_id) DO UPDATE SET revoked_at = EXCLUDED.revoked_at
+    RETURNING user_id, revoked_at;
+"""
+
+LIST_TOKEN_REVOCATIONS_SINCE_QUERY = """
+    SELECT user_id, revoked_at
+    FROM token_revocations
+    WHERE revoked_at > :since;
+"""
+
+
+class RevocationsRepository(BaseRepository):
+    @writes
+    async def revoke_user_tokens(self, *, user_id: int) -> TokenRevocation:
+        revocation = await self.db.fetch_one(query=REVOKE_USER_TOKENS_QUERY, values={"user_id": user_id})
+        return TokenRevocation(**revocation)
+
+    @reads
+    async def list_revocations_since(self, *, since: datetime) -> List[TokenRevocation]:
+        revocations = await self.db.fetch_all(query=LIST_TOKEN_REVOCATIONS_SINCE_QUERY, values={"since": since})
+        return [TokenRevocation(**r) for r in revocations]
@@ -1,14 +1,18 @@
 from typing import Optional
 
-from app.db.repositories.base import BaseRepository
+from asyncpg.exceptions import UniqueViolationError
+
+from app.db.repositories.base import BaseRepository, reads, writes
 from app.db.repositories.profiles import ProfilesRepository
+from app.db.repositories.revocations import RevocationsRepository
 from app.models.profile import ProfileCreate
 from app.models.user import UserCreate, UserUpdate, UserInDB, UserPublic
 from fastapi import HTTPException
 from starlette import status
 from databases import Database
 
-from app.services import auth_service
+from app.db.unit_of_work import UnitOfWork
+from app.services import auth_service, principal_cache, revocation_list
 
 GET_USER_BY_EMAIL_QUERY = """
     SELECT id, username, email, email_verified, password, salt, is_active, is_superuser, created_at, updated_at
@@ -28,29 +32,64 @@ REGISTER_NEW_USER_QUERY = """
     RETURNING id, username, email, email_verified, password, salt, is_active, is_superuser, created_at, updated_at;
 """
 
+UPDATE_USER_QUERY = """
+    UPDATE users
+    SET username = :username,
+        email    = :email
+    WHERE id = :id
+    RETURNING id, username, email, email_verified, password, salt, is_active, is_superuser, created_at, updated_at;
+"""
+
+DEACTIVATE_USER_QUERY = """
+    UPDATE users
+    SET is_active = FALSE
+    WHERE id = :id
+    RETURNING id, username, email, email_verified, password, salt, is_active, is_superuser, created_at, updated_at;
+"""
+
+USER_IDENTITY_COLUMNS = ("id", "username", "email")
+
 
 class UsersRepository(BaseRepository):
-    def __init__(self, db: Database) -> None:
-        super().__init__(db)
+    def __init__(self, db: Database, *, uow: Optional[UnitOfWork] = None) -> None:
+        super().__init__(db, uow=uow)
         self.auth_service = auth_service
-        self.profiles_repo = ProfilesRepository(db)
+        self.profiles_repo = self.get_repository(ProfilesRepository)
+        self.revocations_repo = self.get_repository(RevocationsRepository)
 
+    @reads
     async def get_user_by_email(self, *, email: str, populate: bool = False) -> UserInDB:
-        user = await self.db.fetch_one(query=GET_USER_BY_EMAIL_QUERY, values={"email": email})
+        user = await self.fetch_one_by_identity(
+            table="users",
+            column="email",
+            value=email,
+            query=GET_USER_BY_EMAIL_QUERY,
+            values={"email": email},
+            identity_columns=USER_IDENTITY_COLUMNS,
+        )
         if user:
             user = UserInDB(**user)
             if populate:
                 return await self.populate_user(user=user)
             return user
 
+    @reads
     async def get_user_by_username(self, *, username: str, populate: bool = False) -> UserPublic:
-        user = await self.db.fetch_one(query=GET_USER_BY_USERNAME_QUERY, values={"username": username})
+        user = await self.fetch_one_by_identity(
+            table="users",
+            column="username",
+            value=username,
+            query=GET_USER_BY_USERNAME_QUERY,
+            values={"username": username},
+            identity_columns=USER_IDENTITY_COLUMNS,
+        )
         if user:
             user = UserPublic(**user)
             if populate:
                 return await self.populate_user(user=user)
             return user
 
+    @writes
     async def register_new_user(self, *, new_user: UserCreate) -> UserPublic:
 
         if await self.get_user_by_email(email=new_user.email):
@@ -65,21 +104,62 @@ class UsersRepository(BaseRepository):
                 detail="This username already taken. Please try another one."
             )
 
-        user_password_update = self.auth_service.create_salt_and_hashed_password(plaintext_password=new_user.password)
+        user_password_update = await self.auth_service.create_salt_and_hashed_password_async(
+            plaintext_password=new_user.password
+        )
         new_user_params = new_user.copy(update=user_password_update.dict())
         created_user = await self.db.fetch_one(query=REGISTER_NEW_USER_QUERY, values=new_user_params.dict())
 
         await self.profiles_repo.create_profile_for_user(profile_create=ProfileCreate(user_id=created_user["id"]))
         return await self.populate_user(user=UserInDB(**created_user))
 
+    @reads
     async def authenticate_user(self, *, email: str, password: str) -> Optional[UserInDB]:
         user = await self.get_user_by_email(email=email, populate=False)
         if not user:
             return None
-        if not self.auth_service.verify_password(password=password, salt=user.salt, hashed_pw=user.password):
+        is_valid = await self.auth_service.verify_password_async(
+            password=password, salt=user.salt, hashed_pw=user.password
+        )
+        if not is_valid:
             return None
         return user
 
+    @writes
+    async def update_user(self, *, user: UserInDB, user_update: UserUpdate) -> UserInDB:
+        update_params = user.copy(update=user_update.dict(exclude_unset=True))
+        try:
+            updated_user = await self.db.fetch_one(
+                query=UPDATE_USER_QUERY,
+                values=update_params.dict(include={"id", "username", "email"}),
+            )
+        except UniqueViolationError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="That email or username is already taken."
+            )
+        self.invalidate_identities("users")
+        await self.revoke_user_tokens(user=user)
+        return UserInDB(**updated_user)
+
+    @writes
+    async def deactivate_user(self, *, user: UserInDB) -> UserInDB:
+        deactivated_user = await self.db.fetch_one(query=DEACTIVATE_USER_QUERY, values={"id": user.id})
+        self.invalidate_identities("users")
+        await self.revoke_user_tokens(user=user)
+        return UserInDB(**deactivated_user)
+
+    @writes
+    async def revoke_user_tokens(self, *, user: UserInDB) -> None:
+        """
+        Reject every token issued to the user so far. Tokens carry username, email and is_active claims,
+        so this has to happen whenever one of those changes.
+        """
+        revocation = await self.revocations_repo.revoke_user_tokens(user_id=user.id)
+        revocation_list.add(revocation)
+        principal_cache.invalidate_user(user_id=user.id)
+
+    @reads
     async def populate_user(self, *, user: UserInDB) -> UserPublic:
         profile = await self.profiles_repo.get_profile_by_user_id(user_id=user.id)
         user_with_profile = UserPublic(
@@ -1,28 +1,106 @@
 import os
 
+from asyncpg.pool import Pool
 from fastapi import FastAPI
 from databases import Database
-from app.core.config import DATABASE_URL
+from app.core.config import (
+    DATABASE_REPLICA_URL,
+    DATABASE_URL,
+    DB_POOL_ACQUIRE_TIMEOUT,
+    DB_POOL_MAX_IDLE_TIME,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_MIN_SIZE,
+    DB_REPLICA_POOL_MAX_SIZE,
+    DB_REPLICA_POOL_MIN_SIZE,
+    DB_STATEMENT_TIMEOUT_MS,
+)
+from app.db import repositories
+from app.db.accounting import AccountedDatabase
+from app.db.pool import MonitoredPool
+from app.db.statements import statements
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class UnsupportedDatabaseBackend(RuntimeError):
+    """
+    The databases backend keeps its asyncpg pool somewhere else than connect_database expects.
+    """
+
+
+async def connect_database(db_url: str, *, min_size: int, max_size: int) -> Database:
+    """
+    Opens a pool whose connections prepare the registered statements, wrapped in a MonitoredPool.
+    Queries made on the database directly are accounted to the request like the unit of work's.
+    """
+    database = AccountedDatabase(
+        db_url,
+        min_size=min_size,
+        max_size=max_size,
+        max_inactive_connection_lifetime=DB_POOL_MAX_IDLE_TIME,
+        server_settings={"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)},
+        init=statements.prepare_connection,
+        # room for every registered statement next to the ones databases compiles
+        statement_cache_size=len(statements) + 100,
+    )
+    await database.connect()
+    # databases acquires from and releases to its backend's private _pool attribute, true of the pinned
+    # databases==0.5.4, check it is still there rather than monitor a pool nothing acquires from
+    pool = getattr(getattr(database, "_backend", None), "_pool", None)
+    if not isinstance(pool, Pool):
+        await database.disconnect()
+        raise UnsupportedDatabaseBackend(
+            f"Expected the asyncpg pool at Database._backend._pool, found {type(pool).__name__}. "
+            "The databases release is not the one app/db/tasks.py was written against (0.5.4)."
+        )
+    database._backend._pool = MonitoredPool(
+        database._backend._pool, acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT, max_lifetime=DB_POOL_MAX_LIFETIME
+    )
+    return database
+
+
 async def connect_to_db(app: FastAPI) -> None:
-    db_url = f"{DATABASE_URL}_test" if os.environ.get("TESTING") else DATABASE_URL
-    database = Database(db_url, min_size=2, max_size=10)
+    testing = os.environ.get("TESTING")
+    db_url = f"{DATABASE_URL}_test" if testing else DATABASE_URL
+    statements.discover_package(repositories)
 
     try:
-        await database.connect()
+        database = await connect_database(db_url, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE)
         app.state._db = database
+        app.state._db_pool = database._backend._pool
+    except UnsupportedDatabaseBackend:
+        raise
     except Exception as e:
         logger.warning("--- DB CONNECTION ERROR ---")
         logger.warning(e)
         logger.warning("--- DB CONNECTION ERROR ---")
 
+    if DATABASE_REPLICA_URL:
+        replica_url = f"{DATABASE_REPLICA_URL}_test" if testing else DATABASE_REPLICA_URL
+        try:
+            replica = await connect_database(
+                replica_url, min_size=DB_REPLICA_POOL_MIN_SIZE, max_size=DB_REPLICA_POOL_MAX_SIZE
+            )
+            app.state._db_replica = replica
+            app.state._db_replica_pool = replica._backend._pool
+        except UnsupportedDatabaseBackend:
+            raise
+        except Exception as e:
+            # reads stay on the primary
+            logger.warning("--- DB REPLICA CONNECTION ERROR ---")
+            logger.warning(e)
+            logger.warning("--- DB REPLICA CONNECTION ERROR ---")
+
 
 async def close_db_connection(app: FastAPI) -> None:
+    for stats in statements.stats()[:10]:
+        logger.info("%s: %d calls, %.3fs", stats.name, stats.calls, stats.seconds)
     try:
+        replica = getattr(app.state, "_db_replica", None)
+        if replica is not None:
+            await replica.disconnect()
         await app.state._db.disconnect()
     except Exception as e:
         logger.warning("--- DB DISCONNECT ERROR ---")
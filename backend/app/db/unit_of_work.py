@@ -0,0 +1,227 @@
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+from typing import Any, AsyncGenerator, Dict, Iterator, Mapping, Optional, Sequence, Tuple, Type, TypeVar, Union
+
+from databases import Database
+from databases.core import Connection, Transaction
+from fastapi import HTTPException
+from starlette import status
+
+from app.db.accounting import accounted, accounted_iteration
+from app.db.statements import statements
+from app.services.recent_writers import RecentWriters
+
+Repository = TypeVar("Repository")
+Column = Union[str, Tuple[str, ...]]
+
+
+class IdentityMap:
+    """
+    Rows loaded during one unit of work, so a given row is fetched at most once.
+
+    - Rows are registered under every column that identifies them, e.g. users by id, username and email.
+    - Composite keys are passed as tuples of column names and values.
+    - Misses are not remembered and any write to a table drops all of its rows.
+    """
+    def __init__(self) -> None:
+        self._rows: Dict[Tuple[str, Column, Any], Mapping] = {}
+
+    def get(self, table: str, column: Column, value: Any) -> Optional[Mapping]:
+        return self._rows.get((table, column, value))
+
+    def add(self, table: str, row: Optional[Mapping], *, columns: Sequence[Column]) -> None:
+        if row is None:
+            return
+        for column in columns:
+            value = tuple(row[c] for c in column) if isinstance(column, tuple) else row[column]
+            self._rows[(table, column, value)] = row
+
+    def invalidate(self, table: str) -> None:
+        self._rows = {key: row for key, row in self._rows.items() if key[0] != table}
+
+    def __len__(self) -> int:
+        return len({id(row) for row in self._rows.values()})
+
+
+class UnitOfWork:
+    """
+    Request scoped access to the database.
+
+    - Leases one pooled connection on the first query and holds it until close, every repository
+      of the unit of work shares it, transactions included. A pool with no connection to spare
+      within its acquire timeout is a 503.
+    - Hands out one instance per repository type.
+    - Owns the IdentityMap repositories consult before loading users, cleanings, offers and profiles.
+    - With a replica, queries made while reading() go to a second leased connection of the replica,
+      unless the unit of work already wrote or user_id wrote recently. Anything else, transactions
+      included, runs on the primary.
+
+    It exposes the query methods of databases.Database, so repositories take it as their db.
+    Queries of the statement registry run as the connection's prepared statements.
+    """
+    def __init__(
+            self,
+            db: Database,
+            *,
+            replica: Optional[Database] = None,
+            recent_writers: Optional[RecentWriters] = None,
+    ) -> None:
+        self.database = db
+        self.replica = replica
+        self.recent_writers = recent_writers
+        self.user_id: Optional[int] = None
+        self.identity_map = IdentityMap()
+        self._repositories: Dict[type, Any] = {}
+        self._connection: Optional[Connection] = None
+        self._leases = AsyncExitStack()
+        self._leased = False
+        self._replica_connection: Optional[Connection] = None
+        self._reads = 0
+        self._writes = 0
+        self._wrote = False
+
+    @property
+    def connection(self) -> Connection:
+        if self._connection is None:
+            self._connection = self.database.connection()
+        return self._connection
+
+    @property
+    def is_leased(self) -> bool:
+        return self._leased
+
+    @property
+    def routes_to_replica(self) -> bool:
+        if self.replica is None or not self._reads or self._writes or self._wrote:
+            return False
+        return not (
+            self.user_id is not None
+            and self.recent_writers is not None
+            and self.recent_writers.wrote_recently(user_id=self.user_id)
+        )
+
+    @contextmanager
+    def reading(self) -> Iterator[None]:
+        self._reads += 1
+        try:
+            yield
+        finally:
+            self._reads -= 1
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        """
+        Everything from here on runs on the primary, and so do user_id's reads for a while once the write
+        succeeded, a write that raised doesn't pin them.
+        """
+        self._writes += 1
+        try:
+            yield
+        finally:
+            self._writes -= 1
+            self._wrote = True
+        if self.user_id is not None and self.recent_writers is not None:
+            self.recent_writers.record(user_id=self.user_id)
+
+    async def _lease(self, connection: Connection) -> None:
+        try:
+            await self._leases.enter_async_context(connection)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The database is busy. Please retry shortly.",
+                headers={"Retry-After": "1"}
+            )
+
+    async def _leased_connection(self) -> Connection:
+        if not self._leased:
+            await self._lease(self.connection)
+            self._leased = True
+        return self.connection
+
+    async def _routed_connection(self) -> Connection:
+        if not self.routes_to_replica:
+            return await self._leased_connection()
+        if self._replica_connection is None:
+            connection = self.replica.connection()
+            await self._lease(connection)
+            self._replica_connection = connection
+        return self._replica_connection
+
+    async def release(self) -> None:
+        """
+        Returns the leased connections to their pools before the request waits on something else, e.g. the
+        client sending an upload. The next query leases again, the identity map is kept.
+        """
+        self._leased = False
+        self._connection = None
+        self._replica_connection = None
+        leases, self._leases = self._leases, AsyncExitStack()
+        await leases.aclose()
+
+    async def close(self) -> None:
+        await self.release()
+
+    async def __aenter__(self) -> "UnitOfWork":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+    def get_repository(self, repo_type: Type[Repository]) -> Repository:
+        repo = self._repositories.get(repo_type)
+        if repo is None:
+            repo = repo_type(self, uow=self)
+            self._repositories[repo_type] = repo
+        return repo
+
+    async def _run_prepared(self, query: str, method: str, values: Optional[dict]) -> Any:
+        connection = await self._routed_connection()
+        with accounted(query):
+            return await statements.run(connection.raw_connection, statements.get(query), method, values)
+
+    async def fetch_all(self, query: str, values: dict = None) -> list:
+        if statements.get(query):
+            return await self._run_prepared(query, "fetch", values)
+        connection = await self._routed_connection()
+        with accounted(query):
+            return await connection.fetch_all(query, values)
+
+    async def fetch_one(self, query: str, values: dict = None) -> Optional[Mapping]:
+        if statements.get(query):
+            return await self._run_prepared(query, "fetchrow", values)
+        connection = await self._routed_connection()
+        with accounted(query):
+            return await connection.fetch_one(query, values)
+
+    async def fetch_val(self, query: str, values: dict = None, column: Any = 0) -> Any:
+        if statements.get(query):
+            row = await self._run_prepared(query, "fetchrow", values)
+            return None if row is None else row[column]
+        connection = await self._routed_connection()
+        with accounted(query):
+            return await connection.fetch_val(query, values, column=column)
+
+    async def execute(self, query: str, values: dict = None) -> Any:
+        if statements.get(query):
+            return await self._run_prepared(query, "fetchval", values)
+        connection = await self._routed_connection()
+        with accounted(query):
+            return await connection.execute(query, values)
+
+    async def execute_many(self, query: str, values: list) -> None:
+        connection = await self._routed_connection()
+        with accounted(query):
+            return await connection.execute_many(query, values)
+
+    async def iterate(self, query: str, values: dict = None) -> AsyncGenerator[Mapping, None]:
+        connection = await self._routed_connection()
+        async for record in accounted_iteration(query, connection.iterate(query, values)):
+            yield record
+
+    @asynccontextmanager
+    async def transaction(self, **kwargs: Any) -> AsyncGenerator[Transaction, None]:
+        with self.writing():
+            connection = await self._leased_connection()
+            async with connection.transaction(**kwargs) as transaction:
+                yield transaction
@@ -1,4 +1,5 @@
-from typing import Optional, Union
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
 from enum import Enum
 
 from app.models.core import IDModelMixin, CoreModel
@@ -39,3 +40,46 @@ class CleaningInDB(IDModelMixin, CleaningBase):
 
 class CleaningPublic(IDModelMixin, CleaningBase):
     owner: Union[int, UserPublic]
+
+
+class CleaningFeedSort(str, Enum):
+    newest = "newest"
+    price_asc = "price_asc"
+    price_desc = "price_desc"
+
+
+class CleaningFeedFilters(CoreModel):
+    """
+    Open cleaning jobs a cleaner can browse, every filter is optional.
+    """
+    cleaning_type: Optional[CleaningType]
+    min_price: Optional[float]
+    max_price: Optional[float]
+    created_since: Optional[datetime]
+    sort: CleaningFeedSort = CleaningFeedSort.newest
+
+
+class CleaningSearchResult(CleaningPublic):
+    """
+    A cleaning matching a search, rank is between 0 and 1 and snippet wraps matched words in <b></b>.
+    """
+    rank: float
+    snippet: str
+
+
+class CleaningImportError(CoreModel):
+    """
+    A record of a bulk import that wasn't created, index is its position in the request body.
+    """
+    index: int
+    errors: List[Dict[str, Any]]
+
+
+class CleaningImportCreated(CoreModel):
+    index: int
+    cleaning: CleaningPublic
+
+
+class CleaningImportResult(CoreModel):
+    created: List[CleaningImportCreated] = []
+    errors: List[CleaningImportError] = []
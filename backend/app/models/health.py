@@ -0,0 +1,27 @@
+from typing import Optional
+
+from app.models.core import CoreModel
+
+
+class PoolStats(CoreModel):
+    """
+    Saturation of the database connection pool, counters since startup.
+    """
+    size: int
+    min_size: int
+    max_size: int
+    in_use: int
+    idle: int
+    waiting: int
+    acquires: int
+    timeouts: int
+    errors: int
+    wait_seconds: float
+    max_wait_seconds: float
+    last_error: Optional[str]
+
+
+class Readiness(CoreModel):
+    ready: bool
+    pool: Optional[PoolStats]
+    replica_pool: Optional[PoolStats]
@@ -1,6 +1,10 @@
 from typing import Optional
+from datetime import datetime
 from enum import Enum
 
+from pydantic import conlist, validator
+
+from app.core.config import OFFER_BATCH_MAX_SIZE
 from app.models.core import DateTimeModelMixin, CoreModel
 from app.models.user import UserPublic
 from app.models.cleaning import CleaningPublic
@@ -14,6 +18,17 @@ class OfferStatus(str, Enum):
     completed = "completed"
 
 
+class OfferAction(str, Enum):
+    """
+    The status transitions of an offer, see OFFER_TRANSITIONS in the offers repository.
+    """
+    accept = "accept"
+    reject = "reject"
+    cancel = "cancel"
+    rescind = "rescind"
+    complete = "complete"
+
+
 class OfferBase(CoreModel):
     user_id: Optional[int]
     cleaning_id: Optional[int]
@@ -37,3 +52,63 @@ class OfferInDB(DateTimeModelMixin, OfferBase):
 class OfferPublic(OfferInDB):
     user: Optional[UserPublic]
     cleaning: Optional[CleaningPublic]
+
+
+class OfferAuthorizationContext(CoreModel):
+    """
+    Everything the offer and evaluation permission checks need about a cleaning and one user's offer,
+    loaded in a single round trip. user_id is None when no such user exists, status is None when
+    the user hasn't made an offer for the cleaning.
+    """
+    cleaning_id: int
+    cleaning_owner: int
+    user_id: Optional[int]
+    status: Optional[OfferStatus]
+    has_accepted_offer: bool
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+    @property
+    def offer(self) -> Optional[OfferInDB]:
+        if self.status is None:
+            return None
+        return OfferInDB(
+            cleaning_id=self.cleaning_id,
+            user_id=self.user_id,
+            status=self.status,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+        )
+
+
+class OfferBatchCreate(CoreModel):
+    cleaning_ids: conlist(int, min_items=1, max_items=OFFER_BATCH_MAX_SIZE)
+
+
+class OfferDecision(CoreModel):
+    """
+    An owner's answer to one pending offer.
+    """
+    cleaning_id: int
+    user_id: int
+    status: OfferStatus
+
+    @validator("status")
+    def status_is_a_decision(cls, status: OfferStatus) -> OfferStatus:
+        if status not in (OfferStatus.accepted, OfferStatus.rejected):
+            raise ValueError("Offers can only be accepted or rejected.")
+        return status
+
+
+class OfferBatchDecide(CoreModel):
+    decisions: conlist(OfferDecision, min_items=1, max_items=OFFER_BATCH_MAX_SIZE)
+
+
+class OfferBatchOutcome(CoreModel):
+    """
+    What became of one item of a batch, offer is set on success and error otherwise.
+    """
+    cleaning_id: int
+    user_id: Optional[int]
+    offer: Optional[OfferInDB]
+    error: Optional[str]
@@ -0,0 +1,70 @@
+import base64
+import json
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Generic, List, NamedTuple, Optional, TypeVar, Union
+
+from pydantic.generics import GenericModel
+
+from app.models.core import CoreModel
+
+T = TypeVar("T")
+
+
+class Cursor(NamedTuple):
+    """
+    Keyset position of the last row of a page, (value, key) where value is the sort column, created_at
+    unless stated otherwise, and key breaks ties, e.g. the cleaning id or the user id of an offer.
+    """
+    value: Union[Decimal, datetime]
+    key: int
+
+
+# sorts after every real row, so the first page uses the same keyset query as the others
+FIRST_PAGE_CURSOR = Cursor(value=datetime.max.replace(tzinfo=timezone.utc), key=0)
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    if isinstance(cursor.value, datetime):
+        value = ["t", cursor.value.isoformat()]
+    else:
+        value = ["n", str(cursor.value)]
+    raw = json.dumps([*value, cursor.key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(value: str) -> Cursor:
+    """
+    Raises ValueError for anything encode_cursor couldn't have produced.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+        kind, sort_value, key = json.loads(raw)
+        if kind == "t":
+            sort_value = datetime.fromisoformat(sort_value)
+            if sort_value.tzinfo is None:
+                raise ValueError("Cursor timestamps are timezone aware")
+        elif kind == "n":
+            sort_value = Decimal(sort_value)
+            if not sort_value.is_finite():
+                raise ValueError("Cursor numbers are finite")
+        else:
+            raise ValueError(f"Unknown cursor kind {kind!r}")
+    except (TypeError, ValueError, InvalidOperation) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(key, int) or isinstance(key, bool):
+        raise ValueError("Invalid cursor")
+    return Cursor(value=sort_value, key=key)
+
+
+class PageParams(CoreModel):
+    limit: int
+    cursor: Optional[Cursor] = None
+
+
+class Page(GenericModel, Generic[T]):
+    """
+    One page of a list endpoint, next_cursor is None on the last page.
+    """
+    items: List[T]
+    next_cursor: Optional[str] = None
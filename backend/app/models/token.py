@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from typing import Optional
 from pydantic import EmailStr
 
 from app.core.config import JWT_AUDIENCE, ACCESS_TOKEN_EXPIRE_MINUTES
@@ -13,9 +14,15 @@ class JWTMeta(CoreModel):
 
 
 class JWTCreds(CoreModel):
-    """How we'll identify users"""
+    """
+    How we'll identify users. user_id, is_active and is_superuser let us build a principal
+    without a users lookup, tokens issued before they existed simply don't carry a user_id.
+    """
     sub: EmailStr
     username: str
+    user_id: Optional[int]
+    is_active: bool = True
+    is_superuser: bool = False
 
 
 class JWTPayload(JWTMeta, JWTCreds):
@@ -27,4 +34,10 @@ class JWTPayload(JWTMeta, JWTCreds):
 
 class AccessToken(CoreModel):
     access_token: str
-    token_type: str
\ No newline at end of file
+    token_type: str
+
+
+class TokenRevocation(CoreModel):
+    """Every token of user_id issued at or before revoked_at is rejected"""
+    user_id: int
+    revoked_at: datetime
@@ -55,6 +55,16 @@ class UserInDB(IDModelMixin, DateTimeModelMixin, UserBase):
     salt: str
 
 
+class UserPrincipal(IDModelMixin, CoreModel):
+    """
+    Lightweight identity rebuilt from access token claims, it never touches the users table.
+    """
+    email: EmailStr
+    username: str
+    is_active: bool = True
+    is_superuser: bool = False
+
+
 class UserPublic(IDModelMixin, DateTimeModelMixin, UserBase):
     access_token: Optional[AccessToken]
     profile: Optional[ProfilePublic]
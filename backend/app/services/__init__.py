@@ -1,3 +1,19 @@
+from app.core.config import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    PRINCIPAL_CACHE_MAX_SIZE,
+    PRINCIPAL_CACHE_TTL_SECONDS,
+    READ_YOUR_WRITES_SECONDS,
+    TOKEN_REVOCATION_REFRESH_SECONDS,
+)
 from app.services.authentication import AuthService
+from app.services.principal_cache import PrincipalCache
+from app.services.recent_writers import RecentWriters
+from app.services.revocations import RevocationList
 
 auth_service = AuthService()
+principal_cache = PrincipalCache(max_size=PRINCIPAL_CACHE_MAX_SIZE, ttl_seconds=PRINCIPAL_CACHE_TTL_SECONDS)
+revocation_list = RevocationList(
+    max_token_age_seconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    refresh_interval_seconds=TOKEN_REVOCATION_REFRESH_SECONDS,
+)
+recent_writers = RecentWriters(window_seconds=READ_YOUR_WRITES_SECONDS)
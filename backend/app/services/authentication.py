@@ -1,21 +1,38 @@
-from typing import Optional, Type
+from typing import Any, Callable, Optional, Type
 
 import bcrypt
 import jwt
 from fastapi import HTTPException
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 from pydantic import ValidationError
 from starlette import status
 
-from app.core.config import SECRET_KEY, JWT_AUDIENCE, ACCESS_TOKEN_EXPIRE_MINUTES, JWT_ALGORITHM
+from app.core.config import (
+    SECRET_KEY,
+    JWT_AUDIENCE,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    JWT_ALGORITHM,
+    PASSWORD_HASHING_EXECUTOR,
+    PASSWORD_HASHING_MAX_WORKERS,
+    PASSWORD_HASHING_MAX_QUEUE,
+)
 from app.models.token import JWTMeta, JWTCreds, JWTPayload
 from app.models.user import UserPasswordUpdate, UserInDB, UserBase
+from app.services.hashing import HashingPool, HashingPoolSaturated
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+def _hash_secret(secret: str) -> str:
+    return pwd_context.hash(secret)
+
+
+def _verify_secret(secret: str, hashed_pw: str) -> bool:
+    return pwd_context.verify(secret, hashed_pw)
+
+
 class AuthException(BaseException):
     """
     Custom auth exception that can be modified later on.
@@ -24,6 +41,13 @@ class AuthException(BaseException):
 
 
 class AuthService:
+    def __init__(self, *, hashing_pool: Optional[HashingPool] = None) -> None:
+        self.hashing_pool = hashing_pool or HashingPool(
+            kind=PASSWORD_HASHING_EXECUTOR,
+            max_workers=PASSWORD_HASHING_MAX_WORKERS,
+            max_queue=PASSWORD_HASHING_MAX_QUEUE,
+        )
+
     def create_salt_and_hashed_password(self, *, plaintext_password: str) -> UserPasswordUpdate:
         salt = self.generate_salt()
         hashed_password = self.hash_password(password=plaintext_password, salt=salt)
@@ -36,11 +60,33 @@ class AuthService:
 
     @staticmethod
     def hash_password(*, password: str, salt: str) -> str:
-        return pwd_context.hash(password + salt)
+        return _hash_secret(password + salt)
 
     @staticmethod
     def verify_password(*, password: str, salt: str, hashed_pw: str) -> bool:
-        return pwd_context.verify(password+salt, hashed_pw)
+        return _verify_secret(password + salt, hashed_pw)
+
+    async def create_salt_and_hashed_password_async(self, *, plaintext_password: str) -> UserPasswordUpdate:
+        salt = self.generate_salt()
+        hashed_password = await self.hash_password_async(password=plaintext_password, salt=salt)
+
+        return UserPasswordUpdate(salt=salt, password=hashed_password)
+
+    async def hash_password_async(self, *, password: str, salt: str) -> str:
+        return await self._run_in_hashing_pool(_hash_secret, password + salt)
+
+    async def verify_password_async(self, *, password: str, salt: str, hashed_pw: str) -> bool:
+        return await self._run_in_hashing_pool(_verify_secret, password + salt, hashed_pw)
+
+    async def _run_in_hashing_pool(self, fn: Callable, *args: Any) -> Any:
+        try:
+            return await self.hashing_pool.run(fn, *args)
+        except HashingPoolSaturated:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests in progress. Please retry shortly.",
+                headers={"Retry-After": "1"}
+            )
 
     @staticmethod
     def create_access_token_for_user(
@@ -52,12 +98,19 @@ class AuthService:
     ) -> str:
         if not user or not isinstance(user, UserBase):
             return None
+        issued_at = datetime.now(timezone.utc)
         jwt_meta = JWTMeta(
             aud=audience,
-            iat=datetime.timestamp(datetime.utcnow()),
-            exp=datetime.timestamp(datetime.utcnow() + timedelta(minutes=expires_in))
+            iat=datetime.timestamp(issued_at),
+            exp=datetime.timestamp(issued_at + timedelta(minutes=expires_in))
+        )
+        jwt_creds = JWTCreds(
+            sub=user.email,
+            username=user.username,
+            user_id=getattr(user, "id", None),
+            is_active=user.is_active,
+            is_superuser=user.is_superuser,
         )
-        jwt_creds = JWTCreds(sub=user.email, username=user.username)
         token_payload = JWTPayload(
             **jwt_meta.dict(),
             **jwt_creds.dict()
@@ -66,7 +119,7 @@ class AuthService:
         return access_token
 
     @staticmethod
-    def get_username_from_token(*, token: str, secret_key: str) -> Optional[str]:
+    def get_payload_from_token(*, token: str, secret_key: str) -> JWTPayload:
         try:
             decoded_token = jwt.decode(token, secret_key, audience=JWT_AUDIENCE, algorithms=[JWT_ALGORITHM])
             payload = JWTPayload(**decoded_token)
@@ -76,4 +129,7 @@ class AuthService:
                 detail="Could not validated token credentials.",
                 headers={"WWW-Authenticate": "Bearer"}
             )
-        return payload.username
+        return payload
+
+    def get_username_from_token(self, *, token: str, secret_key: str) -> Optional[str]:
+        return self.get_payload_from_token(token=token, secret_key=secret_key).username
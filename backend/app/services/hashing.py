@@ -0,0 +1,132 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.metrics import hashing_latency
+
+
+class HashingPoolSaturated(Exception):
+    """
+    Raised when the pool already holds as much work as it is allowed to queue.
+    """
+    pass
+
+
+def _timed_call(fn: Callable, *args: Any) -> Tuple[Any, float, float]:
+    """
+    Runs inside the worker. Wall clock timestamps are used so they stay comparable across processes.
+    """
+    started_at = time.time()
+    result = fn(*args)
+    return result, started_at, time.time()
+
+
+class HashingPool:
+    """
+    Bounded worker pool that keeps CPU heavy password hashing off the event loop.
+
+    - kind selects a thread or a process executor.
+    - At most max_workers jobs run at once and at most max_queue more may wait for a worker,
+      anything beyond that is rejected with HashingPoolSaturated instead of piling up.
+    """
+    KINDS = ("thread", "process")
+
+    def __init__(self, *, kind: str = "thread", max_workers: int = 4, max_queue: int = 64) -> None:
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown hashing pool kind {kind!r}, expected one of {self.KINDS}.")
+        if max_workers < 1 or max_queue < 0:
+            raise ValueError("Hashing pool needs at least one worker and a non negative queue depth.")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self.reset_stats()
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hashing")
+        return self._executor
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """
+        Run fn(*args) on a worker. fn must be a module level function when kind is "process".
+        """
+        if self._in_flight >= self.capacity:
+            self._rejected += 1
+            raise HashingPoolSaturated(f"Hashing pool is saturated ({self._in_flight} jobs in flight).")
+
+        loop = asyncio.get_running_loop()
+        future = self._get_executor().submit(_timed_call, fn, *args)
+        self._in_flight += 1
+        self._submitted += 1
+        submitted_at = time.time()
+        # a cancelled caller leaves a running job behind, it stays in flight until the worker is done with it
+        future.add_done_callback(lambda _: self._call_soon(loop, self._job_done))
+        try:
+            result, started_at, finished_at = await asyncio.wrap_future(future)
+        except Exception:
+            self._failed += 1
+            raise
+
+        queue_wait = max(started_at - submitted_at, 0.0)
+        function = fn.__name__.strip("_")
+        hashing_latency.labels(function, "queue").observe(queue_wait)
+        hashing_latency.labels(function, "run").observe(finished_at - started_at)
+        self._completed += 1
+        self._queue_wait_seconds += queue_wait
+        self._hash_seconds += finished_at - started_at
+        return result
+
+    @staticmethod
+    def _call_soon(loop: asyncio.AbstractEventLoop, callback: Callable[[], None]) -> None:
+        try:
+            loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            # the loop is closed, nothing is left to count the job against
+            pass
+
+    def _job_done(self) -> None:
+        self._in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "queue_wait_seconds_total": self._queue_wait_seconds,
+            "hash_seconds_total": self._hash_seconds,
+        }
+
+    def reset_stats(self) -> None:
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._queue_wait_seconds = 0.0
+        self._hash_seconds = 0.0
+
+    def shutdown(self, *, wait: bool = True) -> None:
+        """
+        Release the workers. The pool stays usable and starts a fresh executor on next use.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
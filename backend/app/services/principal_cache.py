@@ -0,0 +1,135 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from app.models.user import UserInDB
+
+
+class PrincipalCache:
+    """
+    In-process LRU + TTL cache of users resolved from verified access tokens.
+
+    - Entries are keyed by a digest of the token, never the token itself.
+    - An entry never outlives the token it was resolved from.
+    - get re-checks the token's issued at time against is_revoked on every hit, revocations made by
+      other processes reach the cache as soon as the revocation list has them.
+    - invalidate_user drops every entry of a user, call it whenever a user is deactivated
+      or their username / email changes.
+    - Every hit is a copy, a request changing its user can't leak into the next request's.
+    """
+    def __init__(
+            self,
+            *,
+            max_size: int = 10_000,
+            ttl_seconds: float = 30.0,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[UserInDB, float, Optional[float]]]" = OrderedDict()
+        self._digests_by_user: Dict[int, Set[str]] = {}
+        self.reset_stats()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl_seconds > 0
+
+    @staticmethod
+    def token_digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str, *, is_revoked: Optional[Callable[..., bool]] = None) -> Optional[UserInDB]:
+        """
+        is_revoked(user_id=..., issued_at=...) drops the entry of a revoked token, e.g. RevocationList.is_revoked.
+        """
+        if not self.enabled:
+            return None
+        digest = self.token_digest(token)
+        entry = self._entries.get(digest)
+        if entry is None:
+            self._misses += 1
+            return None
+        user, expires_at, issued_at = entry
+        if expires_at <= self._clock():
+            self._expirations += 1
+            self._misses += 1
+            self._remove(digest)
+            return None
+        if is_revoked is not None and issued_at is not None and is_revoked(user_id=user.id, issued_at=issued_at):
+            self._invalidations += 1
+            self._misses += 1
+            self._remove(digest)
+            return None
+        self._entries.move_to_end(digest)
+        self._hits += 1
+        return user.copy(deep=True)
+
+    def set(
+            self,
+            token: str,
+            user: UserInDB,
+            *,
+            token_expires_at: Optional[float] = None,
+            token_issued_at: Optional[float] = None,
+    ) -> None:
+        """
+        token_expires_at is the token's exp claim (a unix timestamp) and caps the entry's lifetime,
+        token_issued_at its iat claim, the one get checks revocations against.
+        """
+        if not self.enabled or user is None:
+            return
+        ttl = self.ttl_seconds
+        if token_expires_at is not None:
+            ttl = min(ttl, token_expires_at - time.time())
+        if ttl <= 0:
+            return
+
+        digest = self.token_digest(token)
+        if digest in self._entries:
+            self._remove(digest)
+        self._entries[digest] = (user.copy(deep=True), self._clock() + ttl, token_issued_at)
+        self._digests_by_user.setdefault(user.id, set()).add(digest)
+
+        while len(self._entries) > self.max_size:
+            oldest_digest = next(iter(self._entries))
+            self._remove(oldest_digest)
+            self._evictions += 1
+
+    def invalidate_user(self, *, user_id: int) -> int:
+        digests = self._digests_by_user.pop(user_id, set())
+        for digest in digests:
+            self._entries.pop(digest, None)
+        self._invalidations += len(digests)
+        return len(digests)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._digests_by_user.clear()
+
+    def _remove(self, digest: str) -> None:
+        user, _, _ = self._entries.pop(digest)
+        user_digests = self._digests_by_user.get(user.id)
+        if user_digests is not None:
+            user_digests.discard(digest)
+            if not user_digests:
+                del self._digests_by_user[user.id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+            "invalidations": self._invalidations,
+        }
+
+    def reset_stats(self) -> None:
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
@@ -0,0 +1,45 @@
+import time
+from collections import OrderedDict
+from typing import Callable
+
+
+class RecentWriters:
+    """
+    In-process record of the users that wrote in the last window_seconds, their reads stay on the
+    primary meanwhile so they don't read their own writes back from a lagging replica.
+
+    - Entries expire oldest first, at most max_size are kept.
+    - Each worker process keeps its own, a user whose next request lands on another worker may
+      still read from the replica.
+    """
+    def __init__(
+            self,
+            *,
+            window_seconds: float = 5.0,
+            max_size: int = 100_000,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.window_seconds = window_seconds
+        self.max_size = max_size
+        self._clock = clock
+        self._wrote_at: "OrderedDict[int, float]" = OrderedDict()
+
+    def record(self, *, user_id: int) -> None:
+        self._wrote_at.pop(user_id, None)
+        self._wrote_at[user_id] = self._clock()
+        self._expire()
+
+    def wrote_recently(self, *, user_id: int) -> bool:
+        self._expire()
+        return user_id in self._wrote_at
+
+    def clear(self) -> None:
+        self._wrote_at.clear()
+
+    def _expire(self) -> None:
+        oldest = self._clock() - self.window_seconds
+        while self._wrote_at and (len(self._wrote_at) > self.max_size or next(iter(self._wrote_at.values())) <= oldest):
+            self._wrote_at.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._wrote_at)
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+
+from databases import Database
+
+from app.db.repositories.revocations import RevocationsRepository
+from app.models.token import TokenRevocation
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    """
+    In-memory copy of the token_revocations table, so checking a token never needs a query.
+
+    - Maps user_id to the latest revoked_at timestamp of that user.
+    - refresh only pulls rows newer than the last one seen, run_refresher does that on an interval.
+    - Entries older than max_token_age_seconds are pruned, every token they could reject has expired.
+    """
+    def __init__(self, *, max_token_age_seconds: float, refresh_interval_seconds: float = 30.0) -> None:
+        self.max_token_age_seconds = max_token_age_seconds
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self._revoked_at: Dict[int, float] = {}
+        self._high_water_mark: Optional[datetime] = None
+        self.last_refreshed_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._revoked_at)
+
+    def is_revoked(self, *, user_id: int, issued_at: float) -> bool:
+        revoked_at = self._revoked_at.get(user_id)
+        return revoked_at is not None and issued_at <= revoked_at
+
+    def add(self, revocation: TokenRevocation) -> None:
+        revoked_at = revocation.revoked_at.timestamp()
+        if revoked_at > self._revoked_at.get(revocation.user_id, float("-inf")):
+            self._revoked_at[revocation.user_id] = revoked_at
+        if self._high_water_mark is None or revocation.revoked_at > self._high_water_mark:
+            self._high_water_mark = revocation.revoked_at
+
+    def load(self, revocations: Iterable[TokenRevocation]) -> None:
+        for revocation in revocations:
+            self.add(revocation)
+
+    def prune(self) -> None:
+        oldest_live_token = time.time() - self.max_token_age_seconds
+        self._revoked_at = {
+            user_id: revoked_at for user_id, revoked_at in self._revoked_at.items() if revoked_at >= oldest_live_token
+        }
+
+    def clear(self) -> None:
+        self._revoked_at.clear()
+        self._high_water_mark = None
+        self.last_refreshed_at = None
+
+    async def refresh(self, db: Database) -> None:
+        if self._high_water_mark is None:
+            since = datetime.now(timezone.utc) - timedelta(seconds=self.max_token_age_seconds)
+        else:
+            # revoked_at is the inserting transaction's start time, so a slow writer can commit a row
+            # slightly older than the newest one we've seen. Overlapping windows make that harmless.
+            since = self._high_water_mark - timedelta(seconds=self.refresh_interval_seconds)
+        revocations = await RevocationsRepository(db).list_revocations_since(since=since)
+        self.load(revocations)
+        self.prune()
+        self.last_refreshed_at = time.time()
+
+    async def run_refresher(self, db: Database) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval_seconds)
+            try:
+                await self.refresh(db)
+            except Exception as e:
+                logger.warning("--- TOKEN REVOCATION REFRESH ERROR ---")
+                logger.warning(e)
+                logger.warning("--- TOKEN REVOCATION REFRESH ERROR ---")
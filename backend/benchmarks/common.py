@@ -0,0 +1,18 @@
+import asyncio
+import contextvars
+import statistics
+from typing import Awaitable, List
+
+
+def in_fresh_context(coro: Awaitable) -> asyncio.Future:
+    # tasks copy the current context, databases keeps the task's connection there
+    return contextvars.Context().run(asyncio.ensure_future, coro)
+
+
+def percentile(values: List[float], pct: int) -> float:
+    """
+    pct-th percentile of latencies in seconds, in milliseconds.
+    """
+    if len(values) < 2:
+        return values[0] * 1000 if values else 0.0
+    return statistics.quantiles(values, n=100)[pct - 1] * 1000
@@ -0,0 +1,193 @@
+"""
+CPU cost of compressing response bodies against the bytes it saves, per coding and level.
+
+- codings: list pages of offers, evaluations with long comments and cleanings, encoded as the routes
+  encode them, compressed with gzip, br and zstd at several levels. Reports the compressed size, the
+  time per body and the time per KiB saved, the levels the middleware uses are marked with *.
+- event loop: the longest the event loop stalls while one body is compressed inline and in the
+  threadpool, the numbers behind COMPRESSION_THREADPOOL_MIN_SIZE.
+
+br and zstd are measured when brotli and zstandard are installed. Needs no database, run from the
+backend directory:
+
+    python -m benchmarks.compression [--rows 20 100 1000] [--rounds 20] [--stall-sizes 64 256 1024 4096]
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Callable, List, Tuple, Type
+
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from app.api import compression
+from app.api.responses import dumps
+from app.core.config import COMPRESSION_BROTLI_QUALITY, COMPRESSION_GZIP_LEVEL, COMPRESSION_ZSTD_LEVEL
+from app.models.cleaning import CleaningInDB, CleaningPublic
+from app.models.evaluation import EvaluationInDB, EvaluationPublic
+from app.models.offer import OfferInDB, OfferPublic
+from app.models.pagination import Page
+
+NOW = datetime(2026, 10, 18, 10, 0, tzinfo=timezone.utc)
+WORDS = (
+    "spotless kitchen bathroom arrived early late friendly careful thorough windows floors carpet dust oven "
+    "fridge pets allergies recommend again quick efficient missed corner polite professional smell fresh "
+    "laundry stairs balcony garden garage scrubbed vacuumed mopped organised chatty quiet tidy grout"
+).split()
+
+
+def comment(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def offers(rows: int, rng: random.Random) -> Page:
+    statuses = ("pending", "accepted", "rejected", "cancelled", "completed")
+    return Page(items=[
+        OfferInDB(cleaning_id=rng.randint(1, 10_000), user_id=i, status=rng.choice(statuses), created_at=NOW,
+                  updated_at=NOW)
+        for i in range(1, rows + 1)
+    ])
+
+
+def evaluations(rows: int, rng: random.Random) -> Page:
+    return Page(items=[
+        EvaluationInDB(
+            cleaning_id=i, cleaner_id=1, headline=comment(rng, 5), comment=comment(rng, rng.randint(20, 120)),
+            professionalism=rng.randint(1, 5), completeness=rng.randint(1, 5), efficiency=rng.randint(1, 5),
+            overall_rating=rng.randint(1, 5), created_at=NOW, updated_at=NOW,
+        )
+        for i in range(1, rows + 1)
+    ])
+
+
+def cleanings(rows: int, rng: random.Random) -> Page:
+    return Page(items=[
+        CleaningInDB(
+            id=i, name=f"cleaning {i}", description=comment(rng, rng.randint(5, 30)),
+            price=round(rng.uniform(10, 300), 2), cleaning_type=rng.choice(("dust_up", "spot_clean", "full_clean")),
+            owner=rng.randint(1, 1000),
+        )
+        for i in range(1, rows + 1)
+    ])
+
+
+PAYLOADS: List[Tuple[str, Callable[[int, random.Random], Page], Type[BaseModel]]] = [
+    ("offers", offers, OfferPublic),
+    ("evaluations", evaluations, EvaluationPublic),
+    ("cleanings", cleanings, CleaningPublic),
+]
+
+
+def codings() -> List[Tuple[str, int, Callable[[bytes], bytes], bool]]:
+    """
+    (coding, level, compress, whether the middleware uses that level) of the installed libraries.
+    """
+    found = [
+        ("gzip", level, partial(compression._gzip, level=level), level == COMPRESSION_GZIP_LEVEL)
+        for level in (1, 6, 9)
+    ]
+    if compression.brotli is not None:
+        found += [
+            ("br", quality, partial(compression._brotli, quality=quality), quality == COMPRESSION_BROTLI_QUALITY)
+            for quality in (1, 4, 6, 11)
+        ]
+    if compression.zstandard is not None:
+        found += [
+            ("zstd", level, partial(compression._zstd, level=level), level == COMPRESSION_ZSTD_LEVEL)
+            for level in (1, 3, 10)
+        ]
+    return found
+
+
+def time_per_call(compress: Callable[[bytes], bytes], body: bytes, rounds: int) -> float:
+    """
+    Fastest of rounds calls, in microseconds.
+    """
+    compress(body)
+    fastest = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        compress(body)
+        fastest = min(fastest, time.perf_counter() - started)
+    return fastest * 1e6
+
+
+def run_codings(rows: List[int], rounds: int) -> None:
+    available = codings()
+    print(f"{'payload':<12} {'rows':>5} {'KiB':>8} {'coding':<8} {'KiB out':>8} {'saved':>6} "
+          f"{'us':>9} {'MB/s':>7} {'us/KiB saved':>13}")
+    for name, build, response_model in PAYLOADS:
+        for count in rows:
+            body = dumps(build(count, random.Random(count)), response_model=Page[response_model])
+            for coding, level, compress, default in available:
+                out = len(compress(body))
+                us = time_per_call(compress, body, rounds)
+                saved = len(body) - out
+                label = f"{coding}-{level}{'*' if default else ''}"
+                print(
+                    f"{name:<12} {count:>5} {len(body) / 1024:>8.1f} {label:<8} "
+                    f"{out / 1024:>8.1f} {saved / len(body):>6.0%} {us:>9.0f} {len(body) / us:>7.0f} "
+                    f"{us / (saved / 1024) if saved > 0 else float('inf'):>13.1f}"
+                )
+
+
+async def longest_stall(work: Callable[[], Any]) -> float:
+    """
+    Longest gap between ticks of a 1ms ticker while work runs, in milliseconds.
+    """
+    done = False
+    longest = 0.0
+
+    async def ticker() -> None:
+        nonlocal longest
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            longest = max(longest, now - last)
+            last = now
+
+    task = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0.01)
+    await work()
+    done = True
+    await task
+    return longest * 1000
+
+
+async def run_stalls(sizes_kib: List[int]) -> None:
+    rng = random.Random(0)
+    corpus = dumps(evaluations(5000, rng), response_model=Page[EvaluationPublic])
+    compress = partial(compression._gzip, level=COMPRESSION_GZIP_LEVEL)
+    await run_in_threadpool(compress, b"warm up the threadpool")
+    print(f"\ngzip-{COMPRESSION_GZIP_LEVEL}, longest event loop stall while compressing one body")
+    print(f"{'KiB':>6} {'inline ms':>10} {'threadpool ms':>14}")
+    for size in sizes_kib:
+        body = (corpus * (size * 1024 // len(corpus) + 1))[:size * 1024]
+
+        async def inline() -> None:
+            compress(body)
+
+        async def threadpool() -> None:
+            await run_in_threadpool(compress, body)
+
+        print(f"{size:>6} {await longest_stall(inline):>10.2f} {await longest_stall(threadpool):>14.2f}")
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[20, 100, 1000])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--stall-sizes", type=int, nargs="+", default=[64, 256, 1024, 4096], help="body sizes, KiB")
+    args = parser.parse_args(argv)
+    print(f"brotli: {'yes' if compression.brotli is not None else 'no'}, "
+          f"zstandard: {'yes' if compression.zstandard is not None else 'no'}")
+    run_codings(args.rows, args.rounds)
+    asyncio.run(run_stalls(args.stall_sizes))
+
+
+if __name__ == "__main__":
+    main()
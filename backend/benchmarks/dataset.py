@@ -0,0 +1,309 @@
+"""
+Deterministic synthetic marketplace for scale testing: users, profiles, cleanings, offers and evaluations.
+
+The same --seed and counts always give the same rows, whatever --workers and --chunk-size, so query
+plans can be reproduced on another machine. The rows keep the invariants of the app:
+
+- every user has a profile, as registration creates one, and they all log in with PASSWORD;
+- offers are spread evenly over the cleanings, never made by the owner, one per user and cleaning;
+- --accepted cleanings have one offer taken, the others were rejected, the rest are pending;
+- --evaluations of the accepted offers were evaluated, their offer is completed as the app leaves it;
+- cleaner_rating_stats is rebuilt from the evaluations once they're in.
+
+Rows are loaded with binary COPY by --workers processes, chunks of users with their profiles first,
+then chunks of cleanings with their offers and evaluations. Sequences are moved past the generated
+ids and the tables analyzed at the end. The tables must be empty, --truncate empties them first.
+Targets the database of the environment (TESTING=1 for the _test one), from the backend directory:
+
+    python -m benchmarks.dataset [--users 1000000] [--cleanings 2000000] [--offers 6000000]
+        [--accepted 600000] [--evaluations 400000] [--seed 0] [--workers 4] [--chunk-size 20000] [--truncate]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+import asyncpg
+
+from app.core.config import DATABASE_URL
+from app.db import commands
+from app.models.cleaning import CleaningType
+
+TABLES_ARE_EMPTY_QUERY = """
+    SELECT NOT EXISTS (SELECT 1 FROM users) AND NOT EXISTS (SELECT 1 FROM cleanings);
+"""
+
+TRUNCATE_TABLES_QUERY = """
+    TRUNCATE users, profiles, cleanings, user_offers_for_cleanings, cleaning_to_cleaner_evaluations,
+        cleaner_rating_stats, token_revocations
+    RESTART IDENTITY CASCADE;
+"""
+
+RESET_SEQUENCES_QUERY = """
+    SELECT setval(pg_get_serial_sequence('users', 'id'), COALESCE((SELECT MAX(id) FROM users), 0) + 1, false),
+           setval(pg_get_serial_sequence('profiles', 'id'), COALESCE((SELECT MAX(id) FROM profiles), 0) + 1, false),
+           setval(pg_get_serial_sequence('cleanings', 'id'), COALESCE((SELECT MAX(id) FROM cleanings), 0) + 1, false);
+"""
+
+ANALYZE_TABLES_QUERY = """
+    ANALYZE users, profiles, cleanings, user_offers_for_cleanings, cleaning_to_cleaner_evaluations,
+        cleaner_rating_stats;
+"""
+
+COLUMNS = {
+    "users": (
+        "id", "username", "email", "email_verified", "salt", "password", "is_active", "is_superuser",
+        "created_at", "updated_at",
+    ),
+    "profiles": ("id", "full_name", "phone_number", "bio", "image", "user_id", "created_at", "updated_at"),
+    "cleanings": ("id", "name", "description", "cleaning_type", "price", "owner", "created_at", "updated_at"),
+    "user_offers_for_cleanings": ("user_id", "cleaning_id", "status", "created_at", "updated_at"),
+    "cleaning_to_cleaner_evaluations": (
+        "cleaning_id", "cleaner_id", "no_show", "headline", "comment", "professionalism", "completeness",
+        "efficiency", "overall_rating", "created_at", "updated_at",
+    ),
+}
+
+PASSWORD = "phreshdata"
+# AuthService.create_salt_and_hashed_password of PASSWORD, computed once so every load stores the same
+# one, hashing millions of passwords would take days
+SALT = "$2b$12$yMiPn0r3J0MpIn7CHibmsu"
+PASSWORD_HASH = "$2b$12$YDiiQiXdkB2d3ZKbvojuQe1jaWk41wy3os/rzVXdsF/VoKBmkVHlu"
+# timestamps are spread over the two years before, not relative to now, so they're reproducible too
+ANCHOR = datetime(2026, 1, 1, tzinfo=timezone.utc)
+YEAR_SECONDS = 365 * 24 * 3600
+# rows are drawn from one random generator per block of ids, chunks are made of whole blocks
+BLOCK_SIZE = 1_000
+
+FIRST_NAMES = ("Ada", "Brad", "Chen", "Dana", "Elif", "Femi", "Gia", "Hugo", "Ines", "Jon", "Kai", "Lea", "Mo", "Noor")
+LAST_NAMES = ("Pitt", "Okafor", "Nakamura", "Silva", "Kowalski", "Haddad", "Larsen", "Moreau", "Singh", "Reyes")
+PLACES = ("apartment", "house", "studio", "office", "loft", "cabin", "condo", "garage", "basement", "villa")
+JOBS = ("deep clean", "move out clean", "window washing", "carpet shampoo", "kitchen scrub", "spring clean")
+DETAILS = (
+    "two bedrooms and a balcony", "pets in the house", "bring your own supplies", "weekly if it goes well",
+    "oven and fridge included", "hardwood floors throughout", "after a renovation", "three flights of stairs",
+)
+HEADLINES = ("Spotless", "Great job", "On time and thorough", "Missed a few spots", "Would hire again", "Okay")
+CLEANING_TYPES = tuple(cleaning_type.value for cleaning_type in CleaningType)
+
+
+class Plan(NamedTuple):
+    dsn: str
+    seed: int
+    users: int
+    cleanings: int
+    offers: int
+    accepted: int
+    evaluations: int
+
+    @property
+    def cleanings_with_offers(self) -> int:
+        return self.cleanings if self.offers >= self.cleanings else self.offers
+
+
+def spread(i: int, n: int, total: int) -> bool:
+    """
+    Whether item i (1 based) of n is among total of them picked evenly, exactly total items are.
+    """
+    return (i * total) // n != ((i - 1) * total) // n
+
+
+def offer_count(plan: Plan, cleaning_id: int) -> int:
+    return (cleaning_id * plan.offers) // plan.cleanings - ((cleaning_id - 1) * plan.offers) // plan.cleanings
+
+
+def block_rng(plan: Plan, kind: str, row_id: int) -> random.Random:
+    return random.Random(f"{plan.seed}:{kind}:{(row_id - 1) // BLOCK_SIZE}")
+
+
+def timestamp(rng: random.Random, after: datetime, within_seconds: int) -> datetime:
+    return after + timedelta(seconds=rng.randrange(within_seconds))
+
+
+def user_rows(plan: Plan, start: int, stop: int) -> Tuple[List[tuple], List[tuple]]:
+    users, profiles = [], []
+    for user_id in range(start, stop):
+        if (user_id - 1) % BLOCK_SIZE == 0:
+            rng = block_rng(plan, "users", user_id)
+        created_at = timestamp(rng, ANCHOR - timedelta(seconds=2 * YEAR_SECONDS), YEAR_SECONDS)
+        users.append((
+            user_id, f"user{user_id}", f"user{user_id}@phresh.io", rng.random() < 0.8, SALT, PASSWORD_HASH,
+            rng.random() < 0.98, False, created_at, created_at,
+        ))
+        profiles.append((
+            user_id,
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" if rng.random() < 0.7 else None,
+            f"555-{rng.randrange(10_000):04d}" if rng.random() < 0.4 else None,
+            "",
+            None,
+            user_id,
+            created_at,
+            created_at,
+        ))
+    return users, profiles
+
+
+def cleaning_rows(plan: Plan, start: int, stop: int) -> Tuple[List[tuple], List[tuple], List[tuple]]:
+    cleanings, offers, evaluations = [], [], []
+    with_offers = plan.cleanings_with_offers
+    for cleaning_id in range(start, stop):
+        if (cleaning_id - 1) % BLOCK_SIZE == 0:
+            rng = block_rng(plan, "cleanings", cleaning_id)
+        owner = rng.randint(1, plan.users)
+        created_at = timestamp(rng, ANCHOR - timedelta(seconds=YEAR_SECONDS), YEAR_SECONDS)
+        cleanings.append((
+            cleaning_id,
+            f"{rng.choice(JOBS)} for a {rng.choice(PLACES)}",
+            f"{rng.choice(DETAILS)}, {rng.choice(DETAILS)}" if rng.random() < 0.9 else None,
+            rng.choice(CLEANING_TYPES),
+            Decimal(rng.randrange(1_500, 50_000)).scaleb(-2),
+            owner,
+            created_at,
+            created_at,
+        ))
+
+        count = offer_count(plan, cleaning_id)
+        if not count:
+            continue
+        cleaners = [user_id for user_id in rng.sample(range(1, plan.users + 1), count + 1) if user_id != owner]
+        # rank of the cleaning among those with offers, the accepted ones are spread over them
+        rank = cleaning_id if plan.offers >= plan.cleanings else (cleaning_id * plan.offers) // plan.cleanings
+        accepted = plan.accepted and spread(rank, with_offers, plan.accepted)
+        evaluated = accepted and plan.evaluations and spread(
+            (rank * plan.accepted) // with_offers, plan.accepted, plan.evaluations
+        )
+        for position, cleaner_id in enumerate(cleaners[:count]):
+            offered_at = timestamp(rng, created_at, 3 * 24 * 3600)
+            status = "pending"
+            if accepted:
+                status = "rejected" if position else "completed" if evaluated else "accepted"
+            offers.append((cleaner_id, cleaning_id, status, offered_at, offered_at))
+            if position == 0 and evaluated:
+                no_show = rng.random() < 0.03
+                ratings = [rng.choices((1, 2, 3, 4, 5), weights=(1, 1, 3, 6, 9))[0] for _ in range(4)]
+                evaluated_at = timestamp(rng, offered_at, 14 * 24 * 3600)
+                evaluations.append((
+                    cleaning_id, cleaner_id, no_show, rng.choice(HEADLINES), None,
+                    *(None if no_show else rating for rating in ratings[:3]),
+                    0 if no_show else ratings[3],
+                    evaluated_at, evaluated_at,
+                ))
+    return cleanings, offers, evaluations
+
+
+async def copy_rows(dsn: str, batches: List[Tuple[str, List[tuple]]]) -> Dict[str, int]:
+    connection = await asyncpg.connect(dsn)
+    try:
+        # a lost chunk is simply generated again
+        await connection.execute("SET synchronous_commit TO off;")
+        async with connection.transaction():
+            for table, rows in batches:
+                if rows:
+                    await connection.copy_records_to_table(table, records=rows, columns=COLUMNS[table])
+    finally:
+        await connection.close()
+    return {table: len(rows) for table, rows in batches}
+
+
+def load_users(plan: Plan, start: int, stop: int) -> Dict[str, int]:
+    users, profiles = user_rows(plan, start, stop)
+    return asyncio.run(copy_rows(plan.dsn, [("users", users), ("profiles", profiles)]))
+
+
+def load_cleanings(plan: Plan, start: int, stop: int) -> Dict[str, int]:
+    cleanings, offers, evaluations = cleaning_rows(plan, start, stop)
+    return asyncio.run(copy_rows(plan.dsn, [
+        ("cleanings", cleanings),
+        ("user_offers_for_cleanings", offers),
+        ("cleaning_to_cleaner_evaluations", evaluations),
+    ]))
+
+
+def load_phase(
+        executor: ProcessPoolExecutor, load: Callable, plan: Plan, total: int, chunk_size: int
+) -> Dict[str, int]:
+    started = time.perf_counter()
+    futures = [
+        executor.submit(load, plan, start, min(start + chunk_size, total + 1))
+        for start in range(1, total + 1, chunk_size)
+    ]
+    counts: Dict[str, int] = {}
+    for future in futures:
+        for table, rows in future.result().items():
+            counts[table] = counts.get(table, 0) + rows
+    elapsed = time.perf_counter() - started
+    rows = sum(counts.values())
+    print(f"{', '.join(f'{n} {table}' for table, n in counts.items())} in {elapsed:.1f}s, {rows / elapsed:,.0f} rows/s")
+    return counts
+
+
+async def prepare(dsn: str, truncate: bool) -> None:
+    connection = await asyncpg.connect(dsn)
+    try:
+        if truncate:
+            await connection.execute(TRUNCATE_TABLES_QUERY)
+        elif not await connection.fetchval(TABLES_ARE_EMPTY_QUERY):
+            raise SystemExit("The tables already hold rows, pass --truncate to replace them.")
+    finally:
+        await connection.close()
+
+
+async def finish(dsn: str) -> None:
+    connection = await asyncpg.connect(dsn)
+    try:
+        await connection.execute(RESET_SEQUENCES_QUERY)
+        await connection.execute(ANALYZE_TABLES_QUERY)
+    finally:
+        await connection.close()
+
+
+def check_plan(parser: argparse.ArgumentParser, plan: Plan) -> None:
+    most_offers = -(-plan.offers // plan.cleanings) if plan.cleanings else 0
+    if plan.users < 1:
+        parser.error("--users must be at least 1.")
+    if plan.offers and (not plan.cleanings or most_offers > plan.users - 1):
+        parser.error("Too many offers, a cleaning can't get more offers than there are users besides its owner.")
+    if plan.accepted > plan.cleanings_with_offers:
+        parser.error("--accepted can't exceed the number of cleanings with offers.")
+    if plan.evaluations > plan.accepted:
+        parser.error("--evaluations can't exceed --accepted, only accepted offers are evaluated.")
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--cleanings", type=int, default=2_000_000)
+    parser.add_argument("--offers", type=int, default=6_000_000)
+    parser.add_argument("--accepted", type=int, default=600_000)
+    parser.add_argument("--evaluations", type=int, default=400_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=20_000)
+    parser.add_argument("--truncate", action="store_true")
+    args = parser.parse_args(argv)
+
+    dsn = f"{DATABASE_URL}_test" if os.environ.get("TESTING") else str(DATABASE_URL)
+    plan = Plan(
+        dsn=dsn, seed=args.seed, users=args.users, cleanings=args.cleanings, offers=args.offers,
+        accepted=args.accepted, evaluations=args.evaluations,
+    )
+    check_plan(parser, plan)
+    chunk_size = -(-args.chunk_size // BLOCK_SIZE) * BLOCK_SIZE
+
+    started = time.perf_counter()
+    asyncio.run(prepare(dsn, args.truncate))
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        load_phase(executor, load_users, plan, plan.users, chunk_size)
+        load_phase(executor, load_cleanings, plan, plan.cleanings, chunk_size)
+    asyncio.run(commands.run("rebuild-rating-stats"))
+    asyncio.run(finish(dsn))
+    print(f"Loaded in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""
+Load test of the marketplace workflow: register, login, post cleanings, offer, accept, evaluate, read stats.
+
+Seeds --users users through the API, each posting --cleanings cleanings with one bulk import, then
+--concurrency clients run --requests scenarios picked by --weights. Scenarios build on each other's
+results, an offer is made on a seeded or posted cleaning, accepted by its owner and then evaluated.
+A scenario with nothing to act on yet is swapped for another one.
+
+Reports throughput, p50/p95/p99 latency, error rate and status codes per route name as JSON, on stdout
+or in --output, so runs can be diffed. Anything but the statuses a scenario expects is an error.
+
+By default the app runs in process against the database of the environment (TESTING=1 for the _test
+one), and the users it creates are deleted afterwards unless --keep is given. --base-url targets a
+running server instead, whose users are left in place. From the backend directory:
+
+    python -m benchmarks.load_test [--requests 1000] [--concurrency 20] [--users 20] [--cleanings 5]
+        [--weights register=1,login=2,create_cleaning=3,offer=4,accept=2,evaluate=2,read_stats=6]
+        [--base-url http://localhost:8000] [--output run.json] [--keep]
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from asgi_lifespan import LifespanManager
+from fastapi import FastAPI
+from httpx import AsyncClient, Response
+
+from app.api.server import get_application
+from benchmarks.common import in_fresh_context, percentile
+
+# evaluations would outlive their cleaner, their cleaner_id can't be set to null
+DELETE_LOAD_TEST_EVALUATIONS_QUERY = """
+    DELETE FROM cleaning_to_cleaner_evaluations
+    WHERE cleaner_id IN (SELECT id FROM users WHERE username LIKE :prefix);
+"""
+
+DELETE_LOAD_TEST_USERS_QUERY = """
+    DELETE FROM users
+    WHERE username LIKE :prefix;
+"""
+
+PASSWORD = "loadtesting"
+DEFAULT_WEIGHTS = "register=1,login=2,create_cleaning=3,offer=4,accept=2,evaluate=2,read_stats=6"
+
+
+class User:
+    __slots__ = ("id", "username", "email", "headers")
+
+    def __init__(self, body: Dict[str, Any]) -> None:
+        self.id = body["id"]
+        self.username = body["username"]
+        self.email = body["email"]
+        self.headers = {"Authorization": f"Bearer {body['access_token']['access_token']}"}
+
+
+class Marketplace:
+    """
+    What the scenarios have produced so far. Items are taken out before a call awaits,
+    so concurrent scenarios never act on the same offer.
+    """
+    def __init__(self, run_id: str, rng: random.Random) -> None:
+        self.run_id = run_id
+        self.rng = rng
+        self.registered = 0
+        self.users: List[User] = []
+        self.cleanings: List[Tuple[int, User]] = []
+        self.offered: Set[Tuple[int, int]] = set()
+        self.pending: List[Tuple[int, User, User]] = []
+        self.decided: Set[int] = set()
+        self.accepted: List[Tuple[int, User, User]] = []
+        self.evaluated: List[User] = []
+
+    def next_username(self) -> str:
+        self.registered += 1
+        return f"load{self.run_id}u{self.registered}"
+
+    def take(self, items: List[Any]) -> Any:
+        return items.pop(self.rng.randrange(len(items)))
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.errors: Counter = Counter()
+
+    async def call(
+            self, route: str, request: Awaitable[Response], expected: Tuple[int, ...] = (200,)
+    ) -> Optional[Response]:
+        started = time.perf_counter()
+        try:
+            res = await request
+        except Exception as e:
+            self.latencies[route].append(time.perf_counter() - started)
+            self.statuses[route][type(e).__name__] += 1
+            self.errors[route] += 1
+            return None
+        self.latencies[route].append(time.perf_counter() - started)
+        self.statuses[route][str(res.status_code)] += 1
+        if res.status_code not in expected:
+            self.errors[route] += 1
+            return None
+        return res
+
+
+Scenario = Callable[[AsyncClient, FastAPI, Marketplace, Recorder], Awaitable[bool]]
+
+
+async def register(client: AsyncClient, app: FastAPI, market: Marketplace, recorder: Recorder) -> bool:
+    username = market.next_username()
+    res = await recorder.call(
+        "users:register-new-user",
+        client.post(
+            app.url_path_for("users:register-new-user"),
+            json={"email": f"{username}@phresh.io", "username": username, "password": PASSWORD},
+        ),
+        expected=(201,),
+    )
+    if res is not None:
+        market.users.append(User(res.json()))
+    return True
+
+
+async def login(client: AsyncClient, app: FastAPI, market: Marketplace, recorder: Recorder) -> bool:
+    if not market.users:
+        return False
+    user = market.rng.choice(market.users)
+    await recorder.call(
+        "users:login-email-and-password",
+        client.post(
+            app.url_path_for("users:login-email-and-password"), data={"username": user.email, "password": PASSWORD}
+        ),
+    )
+    return True
+
+
+async def create_cleaning(client: AsyncClient, app: FastAPI, market: Marketplace, recorder: Recorder) -> bool:
+    if not market.users:
+        return False
+    owner = market.rng.choice(market.users)
+    res = await recorder.call(
+        "cleanings:create-cleaning",
+        client.post(
+            app.url_path_for("cleanings:create-cleaning"),
+            json={"name": "load test cleaning", "price": market.rng.randint(10, 200), "cleaning_type": "full_clean"},
+            headers=owner.headers,
+        ),
+        expected=(201,),
+    )
+    if res is not None:
+        market.cleanings.append((res.json()["id"], owner))
+    return True
+
+
+async def offer(client: AsyncClient, app: FastAPI, market: Marketplace, recorder: Recorder) -> bool:
+    if not market.cleanings or len(market.users) < 2:
+        return False
+    cleaning_id, owner = market.rng.choice(market.cleanings)
+    cleaner = market.rng.choice(market.users)
+    if cleaner is owner or (cleaning_id, cleaner.id) in market.offered or cleaning_id in market.decided:
+        return False
+    market.offered.add((cleaning_id, cleaner.id))
+    res = await recorder.call(
+        "offers:create-offer",
+        client.post(app.url_path_for("offers:create-offer", cleaning_id=str(cleaning_id)), headers=cleaner.headers),
+        expected=(201,),
+    )
+    if res is not None:
+        market.pending.append((cleaning_id, owner, cleaner))
+    return True
+
+
+async def accept(client: AsyncClient, app: FastAPI, market: Marketplace, recorder: Recorder) -> bool:
+    undecided = [i for i, (cleaning_id, _, _) in enumerate(market.pending) if cleaning_id not in market.decided]
+    if not undecided:
+        return False
+    cleaning_id, owner, cleaner = market.pending.pop(market.rng.choice(undecided))
+    market.decided.add(cleaning_id)
+    res = await recorder.call(
+        "offers:accept-offer-from-user",
+        client.put(
+            app.url_path_for("offers:accept-offer-from-user", cleaning_id=str(cleaning_id), username=cleaner.username),
+            headers=owner.headers,
+        ),
+    )
+    if res is not None:
+        market.accepted.append((cleaning_id, owner, cleaner))
+    return True
+
+
+async def evaluate(client: AsyncClient, app: FastAPI, market: Marketplace, recorder: Recorder) -> bool:
+    if not market.accepted:
+        return False
+    cleaning_id, owner, cleaner = market.take(market.accepted)
+    rating = market.rng.randint(1, 5)
+    res = await recorder.call(
+        "evaluations:create-evaluation-for-cleaner",
+        client.post(
+            app.url_path_for(
+                "evaluations:create-evaluation-for-cleaner", cleaning_id=str(cleaning_id), username=cleaner.username
+            ),
+            json={"overall_rating": rating, "professionalism": rating, "completeness": rating, "efficiency": rating},
+            headers=owner.headers,
+        ),
+        expected=(201,),
+    )
+    if res is not None:
+        market.evaluated.append(cleaner)
+    return True
+
+
+async def read_stats(client: AsyncClient, app: FastAPI, market: Marketplace, recorder: Recorder) -> bool:
+    # stats of a cleaner nobody evaluated are a 404
+    if not market.evaluated:
+        return False
+    reader, cleaner = market.rng.choice(market.users), market.rng.choice(market.evaluated)
+    await recorder.call(
+        "evaluations:get-stats-for-cleaner",
+        client.get(
+            app.url_path_for("evaluations:get-stats-for-cleaner", username=cleaner.username), headers=reader.headers
+        ),
+    )
+    return True
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "register": register,
+    "login": login,
+    "create_cleaning": create_cleaning,
+    "offer": offer,
+    "accept": accept,
+    "evaluate": evaluate,
+    "read_stats": read_stats,
+}
+
+
+def parse_weights(text: str) -> Dict[str, float]:
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name.strip()!r}, expected one of {list(SCENARIOS)}.")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+async def seed(client: AsyncClient, app: FastAPI, market: Marketplace, users: int, cleanings: int) -> None:
+    recorder = Recorder()
+    await asyncio.gather(*[in_fresh_context(register(client, app, market, recorder)) for _ in range(users)])
+    records = [
+        {"name": f"seeded cleaning {i}", "price": 25 + i, "cleaning_type": "spot_clean"} for i in range(cleanings)
+    ]
+
+    async def import_cleanings(owner: User) -> None:
+        res = await recorder.call(
+            "cleanings:bulk-create-cleanings",
+            client.post(app.url_path_for("cleanings:bulk-create-cleanings"), json=records, headers=owner.headers),
+            expected=(201,),
+        )
+        if res is not None:
+            market.cleanings.extend((created["cleaning"]["id"], owner) for created in res.json()["created"])
+
+    if cleanings:
+        await asyncio.gather(*[in_fresh_context(import_cleanings(owner)) for owner in market.users])
+    if sum(recorder.errors.values()):
+        raise RuntimeError(f"Seeding failed: {dict(recorder.statuses)}")
+
+
+async def drive(
+        client: AsyncClient,
+        app: FastAPI,
+        market: Marketplace,
+        weights: Dict[str, float],
+        requests: int,
+        concurrency: int,
+) -> Tuple[Recorder, float]:
+    recorder = Recorder()
+    names, shares = list(weights), list(weights.values())
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            # a scenario that has nothing to act on yet gives way to another
+            for _ in range(10):
+                if await SCENARIOS[market.rng.choices(names, weights=shares)[0]](client, app, market, recorder):
+                    break
+
+    started = time.perf_counter()
+    await asyncio.gather(*[in_fresh_context(worker()) for _ in range(concurrency)])
+    return recorder, time.perf_counter() - started
+
+
+def report(recorder: Recorder, elapsed: float, config: Dict[str, Any]) -> Dict[str, Any]:
+    routes = {}
+    for route, latencies in sorted(recorder.latencies.items()):
+        routes[route] = {
+            "requests": len(latencies),
+            "throughput": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "errors": recorder.errors[route],
+            "error_rate": round(recorder.errors[route] / len(latencies), 4),
+            "statuses": dict(sorted(recorder.statuses[route].items())),
+        }
+    total = sum(route["requests"] for route in routes.values())
+    everything = [latency for latencies in recorder.latencies.values() for latency in latencies]
+    return {
+        "config": config,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": total,
+        "throughput": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(everything, 50), 2),
+        "p95_ms": round(percentile(everything, 95), 2),
+        "p99_ms": round(percentile(everything, 99), 2),
+        "error_rate": round(sum(recorder.errors.values()) / total, 4) if total else 0.0,
+        "routes": routes,
+    }
+
+
+@asynccontextmanager
+async def target(app: FastAPI, base_url: Optional[str]) -> AsyncIterator[AsyncClient]:
+    if base_url:
+        async with AsyncClient(base_url=base_url, timeout=60) as client:
+            yield client
+        return
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://testserver", timeout=60) as client:
+            yield client
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    app = get_application()
+    market = Marketplace(uuid.uuid4().hex[:8], random.Random(args.seed))
+    async with target(app, args.base_url) as client:
+        try:
+            await seed(client, app, market, args.users, args.cleanings)
+            recorder, elapsed = await drive(client, app, market, args.weights, args.requests, args.concurrency)
+        finally:
+            if not args.base_url and not args.keep:
+                prefix = {"prefix": f"load{market.run_id}u%"}
+                await app.state._db.execute(DELETE_LOAD_TEST_EVALUATIONS_QUERY, prefix)
+                await app.state._db.execute(DELETE_LOAD_TEST_USERS_QUERY, prefix)
+    config = {
+        "target": args.base_url or "asgi",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "users": args.users,
+        "cleanings": args.cleanings,
+        "weights": args.weights,
+        "seed": args.seed,
+    }
+    return report(recorder, elapsed, config)
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--cleanings", type=int, default=5)
+    parser.add_argument("--weights", type=parse_weights, default=parse_weights(DEFAULT_WEIGHTS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--base-url")
+    parser.add_argument("--output")
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args(argv)
+    result = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(result + "\n")
+    else:
+        sys.stdout.write(result + "\n")
+
+
+if __name__ == "__main__":
+    main()
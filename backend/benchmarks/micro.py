@@ -0,0 +1,290 @@
+"""
+Fixed CPU cost of a request outside the database: models, tokens and dependency resolution.
+
+- models: building UserPublic, OfferInDB and EvaluationAggregate from rows, with and without
+  the timestamps DateTimeModelMixin fills in.
+- auth: AuthService encoding and decoding access tokens.
+- dependencies: solving the Depends chain of a route for one request, the database stubbed with
+  canned rows, with the principal cache warm and cold.
+
+Every case runs --repeats times for at least --min-time seconds each, with the garbage collector off,
+and is reported as the median and fastest time per call. --save writes the results as JSON, --compare
+reads such a file and reports the change of every case, exiting with 1 when one is more than --threshold
+slower. Comparisons use the fastest repeat, the one other processes disturbed least.
+Needs no database, run from the backend directory:
+
+    python -m benchmarks.micro [--repeats 7] [--min-time 0.05] [--filter auth]
+        [--save baseline.json] [--compare baseline.json] [--threshold 0.1]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import re
+import statistics
+import sys
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional
+
+from fastapi import FastAPI
+from fastapi.dependencies.utils import solve_dependencies
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+
+from app.api.server import get_application
+from app.core.config import JWT_TOKEN_PREFIX, SECRET_KEY
+from app.db.repositories.cleanings import GET_CLEANING_BY_ID_QUERY
+from app.db.repositories.offers import GET_OFFER_AUTHORIZATION_CONTEXT_BY_USERNAME_QUERY
+from app.db.repositories.users import GET_USER_BY_USERNAME_QUERY
+from app.models.evaluation import EvaluationAggregate
+from app.models.offer import OfferInDB
+from app.models.user import UserInDB, UserPublic
+from app.services import auth_service, principal_cache
+
+NOW = datetime(2026, 10, 18, 10, 0, tzinfo=timezone.utc)
+
+USER_ROW = {
+    "id": 1, "username": "benchmark", "email": "benchmark@phresh.io", "email_verified": True,
+    "password": "$2b$12$benchmarkbenchmarkbenchmarkbenchmarkbenchmarkbenc", "salt": "$2b$12$benchmarkbenchmarkbe",
+    "is_active": True, "is_superuser": False, "created_at": NOW, "updated_at": NOW,
+}
+OFFER_ROW = {"cleaning_id": 1, "user_id": 2, "status": "pending", "created_at": NOW, "updated_at": NOW}
+AGGREGATE_ROW = {
+    "avg_professionalism": 4.5, "avg_completeness": 4.25, "avg_efficiency": 4.75, "avg_overall_rating": 4.5,
+    "max_overall_rating": 5, "min_overall_rating": 3, "one_stars": 0, "two_stars": 0, "three_stars": 2,
+    "four_stars": 4, "five_stars": 6, "total_evaluations": 12, "total_no_show": 0,
+}
+
+# what the stubbed database answers, by query
+ROWS = {
+    GET_USER_BY_USERNAME_QUERY: USER_ROW,
+    GET_CLEANING_BY_ID_QUERY: {
+        "id": 1, "name": "benchmark cleaning", "description": "the whole house", "price": 29.99,
+        "cleaning_type": "full_clean", "owner": 1,
+    },
+    GET_OFFER_AUTHORIZATION_CONTEXT_BY_USERNAME_QUERY: {
+        "cleaning_id": 1, "cleaning_owner": 1, "user_id": 2, "status": "pending", "has_accepted_offer": False,
+        "created_at": NOW, "updated_at": NOW,
+    },
+}
+
+
+class StubConnection:
+    """
+    Enough of databases.core.Connection for a unit of work, queries answer with the canned rows.
+    """
+    def __init__(self, rows: Mapping[str, Mapping]) -> None:
+        self.rows = rows
+
+    async def __aenter__(self) -> "StubConnection":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    async def fetch_one(self, query: str, values: dict = None) -> Optional[Mapping]:
+        return self.rows.get(query)
+
+    async def fetch_all(self, query: str, values: dict = None) -> List[Mapping]:
+        return [self.rows[query]] if query in self.rows else []
+
+    async def fetch_val(self, query: str, values: dict = None, column: Any = 0) -> Any:
+        row = self.rows.get(query)
+        return None if row is None else row[column]
+
+    async def execute(self, query: str, values: dict = None) -> Any:
+        return None
+
+
+class StubDatabase:
+    def __init__(self, rows: Mapping[str, Mapping]) -> None:
+        self.rows = rows
+
+    def connection(self) -> StubConnection:
+        return StubConnection(self.rows)
+
+
+class Case(NamedTuple):
+    group: str
+    name: str
+    run: Callable[[], Any]
+    is_async: bool = False
+
+
+def model_cases() -> List[Case]:
+    no_timestamps = {**OFFER_ROW, "created_at": None, "updated_at": None}
+    return [
+        Case("models", "UserPublic", lambda: UserPublic(**USER_ROW)),
+        Case("models", "OfferInDB", lambda: OfferInDB(**OFFER_ROW)),
+        # the DateTimeModelMixin validator filling in now()
+        Case("models", "OfferInDB, no timestamps", lambda: OfferInDB(**no_timestamps)),
+        Case("models", "EvaluationAggregate", lambda: EvaluationAggregate(**AGGREGATE_ROW)),
+    ]
+
+
+def auth_cases() -> List[Case]:
+    user = UserInDB(**USER_ROW)
+    token = auth_service.create_access_token_for_user(user=user, secret_key=str(SECRET_KEY))
+    return [
+        Case("auth", "create_access_token_for_user", lambda: auth_service.create_access_token_for_user(
+            user=user, secret_key=str(SECRET_KEY)
+        )),
+        Case("auth", "get_payload_from_token", lambda: auth_service.get_payload_from_token(
+            token=token, secret_key=str(SECRET_KEY)
+        )),
+    ]
+
+
+def find_route(app: FastAPI, name: str) -> APIRoute:
+    return next(route for route in app.routes if isinstance(route, APIRoute) and route.name == name)
+
+
+def dependency_case(app: FastAPI, route_name: str, token: str, *, warm: bool, **path_params: Any) -> Case:
+    route = find_route(app, route_name)
+    scope = {
+        "type": "http",
+        "method": next(iter(route.methods)),
+        "path": app.url_path_for(route_name, **path_params),
+        "path_params": path_params,
+        "query_string": b"",
+        "headers": [(b"authorization", f"{JWT_TOKEN_PREFIX} {token}".encode())],
+        "app": app,
+    }
+
+    async def resolve() -> None:
+        if not warm:
+            principal_cache.clear()
+        async with AsyncExitStack() as stack:
+            request = Request({**scope, "fastapi_astack": stack})
+            _, errors, _, _, _ = await solve_dependencies(
+                request=request, dependant=route.dependant, dependency_overrides_provider=app
+            )
+        if errors:
+            raise RuntimeError(f"{route_name} did not resolve: {errors}")
+
+    return Case("dependencies", f"{route_name}{'' if warm else ', cold cache'}", resolve, is_async=True)
+
+
+def dependency_cases() -> List[Case]:
+    app = get_application()
+    app.state._db = StubDatabase(ROWS)
+    token = auth_service.create_access_token_for_user(user=UserInDB(**USER_ROW), secret_key=str(SECRET_KEY))
+    cases = []
+    for warm in (True, False):
+        cases += [
+            dependency_case(app, "users:get-current-user", token, warm=warm),
+            dependency_case(app, "cleanings:get-cleaning-by-id", token, warm=warm, cleaning_id="1"),
+            dependency_case(
+                app, "offers:accept-offer-from-user", token, warm=warm, cleaning_id="1", username="cleaner"
+            ),
+        ]
+    return cases
+
+
+async def time_calls(case: Case, number: int) -> float:
+    started = time.perf_counter()
+    if case.is_async:
+        for _ in range(number):
+            await case.run()
+    else:
+        for _ in range(number):
+            case.run()
+    return time.perf_counter() - started
+
+
+async def calibrate(case: Case, min_time: float) -> int:
+    """
+    Calls per repeat, doubled from 1 until a repeat takes min_time, like timeit's autorange.
+    """
+    number = 1
+    while await time_calls(case, number) < min_time:
+        number *= 2
+    return number
+
+
+async def measure(case: Case, repeats: int, min_time: float) -> Dict[str, float]:
+    number = await calibrate(case, min_time)
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    for _ in range(repeats):
+        gc.collect()
+        gc.disable()
+        try:
+            timings.append(await time_calls(case, number) / number * 1e6)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+    median = statistics.median(timings)
+    return {
+        "median_us": round(median, 3),
+        "min_us": round(min(timings), 3),
+        "spread": round((max(timings) - min(timings)) / median, 4),
+        "calls": number,
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> int:
+    """
+    Prints the change of every case against the baseline, returns the number that regressed.
+    """
+    regressions = 0
+    print(f"\n{'case':<58} {'baseline us':>11} {'now us':>9} {'change':>8}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<58} {'-':>11} {result['min_us']:>9.2f} {'new':>8}")
+            continue
+        change = result["min_us"] / before["min_us"] - 1
+        verdict = ""
+        if change > threshold:
+            regressions += 1
+            verdict = "  slower"
+        elif change < -threshold:
+            verdict = "  faster"
+        print(f"{name:<58} {before['min_us']:>11.2f} {result['min_us']:>9.2f} {change:>+8.1%}{verdict}")
+    for name in sorted(baseline.keys() - results.keys()):
+        print(f"{name:<58} {baseline[name]['min_us']:>11.2f} {'-':>9} {'gone':>8}")
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    cases = model_cases() + auth_cases() + dependency_cases()
+    results = {}
+    print(f"{'case':<58} {'median us':>10} {'min us':>9} {'spread':>7}")
+    for case in cases:
+        name = f"{case.group}: {case.name}"
+        if args.filter and not re.search(args.filter, name):
+            continue
+        result = results[name] = await measure(case, args.repeats, args.min_time)
+        print(f"{name:<58} {result['median_us']:>10.2f} {result['min_us']:>9.2f} {result['spread']:>7.1%}")
+    return results
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.05)
+    parser.add_argument("--filter", help="regular expression, only the cases whose name matches run")
+    parser.add_argument("--save")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+    results = asyncio.run(run(args))
+    if args.save:
+        saved = {"python": platform.python_version(), "machine": platform.machine(), "cases": results}
+        with open(args.save, "w") as f:
+            f.write(json.dumps(saved, indent=2) + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["cases"]
+        if args.filter:
+            baseline = {name: result for name, result in baseline.items() if re.search(args.filter, name)}
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Concurrent accept, cancel, rescind and re-offer calls against one hot cleaning.
+
+A cleaning gets an offer from every cleaner, then --workers concurrent clients fire --requests calls
+through the API: the owner accepting a random offer, cleaners cancelling, rescinding and offering again.
+A monitor counts the accepted offers of the cleaning throughout, more than one is an invariant violation,
+so are server errors. Reports throughput, latency percentiles and status codes per call.
+
+Runs the app in process against the database of the environment (TESTING=1 for the _test one),
+the users it creates are deleted afterwards. From the backend directory:
+
+    python -m benchmarks.offer_contention [--workers 50] [--requests 500] [--cleaners 20]
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from asgi_lifespan import LifespanManager
+from databases import Database
+from httpx import AsyncClient
+
+from app.api.server import get_application
+from app.core.config import JWT_TOKEN_PREFIX, SECRET_KEY
+from app.db.repositories.cleanings import CleaningsRepository
+from app.db.repositories.offers import OffersRepository
+from app.db.repositories.users import UsersRepository
+from app.models.cleaning import CleaningCreate
+from app.models.offer import OfferCreate
+from app.models.user import UserCreate, UserInDB
+from app.services import auth_service
+from benchmarks.common import in_fresh_context, percentile
+
+COUNT_ACCEPTED_OFFERS_QUERY = """
+    SELECT COUNT(*)
+    FROM user_offers_for_cleanings
+    WHERE cleaning_id = :cleaning_id AND status = 'accepted';
+"""
+
+DELETE_USERS_QUERY = """
+    DELETE FROM users
+    WHERE id = ANY(:ids);
+"""
+
+
+def auth_headers(user: UserInDB) -> Dict[str, str]:
+    token = auth_service.create_access_token_for_user(user=user, secret_key=str(SECRET_KEY))
+    return {"Authorization": f"{JWT_TOKEN_PREFIX} {token}"}
+
+
+async def create_users(db: Database, run: str, count: int) -> List[UserInDB]:
+    users_repo = UsersRepository(db)
+    users = []
+    for i in range(count):
+        await users_repo.register_new_user(
+            new_user=UserCreate(email=f"bench{run}{i}@phresh.io", username=f"bench{run}{i}", password="benchmark")
+        )
+        users.append(await users_repo.get_user_by_username(username=f"bench{run}{i}"))
+    return users
+
+
+async def run(workers: int, requests: int, cleaners: int, seed: int) -> None:
+    rng = random.Random(seed)
+    app = get_application()
+    async with LifespanManager(app):
+        db: Database = app.state._db
+        run_id = uuid.uuid4().hex[:8]
+        owner, *cleaner_users = await create_users(db, run_id, cleaners + 1)
+        try:
+            cleaning = await CleaningsRepository(db).create_cleaning(
+                new_cleaning=CleaningCreate(name="hot cleaning", price=50, cleaning_type="full_clean"),
+                requesting_user=owner,
+            )
+            for cleaner in cleaner_users:
+                await OffersRepository(db).create_offer_for_cleaning(
+                    new_offer=OfferCreate(cleaning_id=cleaning.id, user_id=cleaner.id)
+                )
+            offers_path = f"/api/cleanings/{cleaning.id}/offers/"
+            headers = {user.id: auth_headers(user) for user in [owner, *cleaner_users]}
+            calls: List[Tuple[str, Callable[[AsyncClient], Awaitable[Any]]]] = []
+            for _ in range(requests):
+                cleaner = rng.choice(cleaner_users)
+                calls.append(rng.choice([
+                    ("accept", lambda c, u=cleaner: c.put(f"{offers_path}{u.username}/", headers=headers[owner.id])),
+                    ("cancel", lambda c, u=cleaner: c.put(offers_path, headers=headers[u.id])),
+                    ("rescind", lambda c, u=cleaner: c.delete(offers_path, headers=headers[u.id])),
+                    ("offer", lambda c, u=cleaner: c.post(offers_path, headers=headers[u.id])),
+                ]))
+
+            latencies: Dict[str, List[float]] = defaultdict(list)
+            statuses: Dict[str, Counter] = defaultdict(Counter)
+            max_accepted, samples, violations = 0, 0, 0
+            done = asyncio.Event()
+
+            async def monitor() -> None:
+                nonlocal max_accepted, samples, violations
+                while not done.is_set():
+                    accepted = await db.fetch_val(COUNT_ACCEPTED_OFFERS_QUERY, {"cleaning_id": cleaning.id})
+                    samples += 1
+                    max_accepted = max(max_accepted, accepted)
+                    violations += accepted > 1
+                    await asyncio.sleep(0.005)
+
+            async def worker(client: AsyncClient) -> None:
+                while calls:
+                    name, call = calls.pop()
+                    started = time.perf_counter()
+                    res = await call(client)
+                    latencies[name].append(time.perf_counter() - started)
+                    statuses[name][res.status_code] += 1
+
+            async with AsyncClient(app=app, base_url="http://testserver") as client:
+                monitoring = in_fresh_context(monitor())
+                started = time.perf_counter()
+                await asyncio.gather(*[in_fresh_context(worker(client)) for _ in range(workers)])
+                elapsed = time.perf_counter() - started
+                done.set()
+                await monitoring
+            final_accepted = await db.fetch_val(COUNT_ACCEPTED_OFFERS_QUERY, {"cleaning_id": cleaning.id})
+        finally:
+            await db.execute(DELETE_USERS_QUERY, {"ids": [owner.id] + [u.id for u in cleaner_users]})
+
+    everything = [latency for call_latencies in latencies.values() for latency in call_latencies]
+    server_errors = sum(n for counter in statuses.values() for code, n in counter.items() if code >= 500)
+    print(f"{requests} calls, {workers} workers, {cleaners} cleaners on one cleaning")
+    print(f"throughput: {requests / elapsed:.0f} calls/s over {elapsed:.2f}s")
+    print(f"{'call':<8} {'count':>6} {'p50 ms':>8} {'p99 ms':>8}  statuses")
+    for name, call_latencies in sorted(latencies.items()) + [("all", everything)]:
+        p50, p99 = percentile(call_latencies, 50), percentile(call_latencies, 99)
+        codes = " ".join(f"{code}:{n}" for code, n in sorted(statuses[name].items())) if name != "all" else ""
+        print(f"{name:<8} {len(call_latencies):>6} {p50:>8.1f} {p99:>8.1f}  {codes}".rstrip())
+    print(f"accepted offers: max {max_accepted} over {samples} samples, {final_accepted} at the end")
+    print(
+        f"invariant violations: {violations} samples with more than one accepted offer, "
+        f"{server_errors} server errors"
+    )
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--cleaners", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.workers, args.requests, args.cleaners, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+CPU spent turning one page of repository output into a response body.
+
+- default: what a route returning the models does, validate against response_model, jsonable_encoder, json.dumps.
+- trusted: returning TrustedJSONResponse, the response_model's fields of the models are encoded without validation.
+
+Needs no database, run from the backend directory:
+
+    python -m benchmarks.serialization [--rounds 200]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, List, Tuple, Type
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import BaseModel
+from pydantic.fields import ModelField
+
+from app.api import responses
+from app.api.responses import TrustedJSONResponse
+from app.models.cleaning import CleaningInDB, CleaningPublic
+from app.models.evaluation import EvaluationInDB, EvaluationPublic
+from app.models.offer import OfferInDB, OfferPublic
+from app.models.pagination import Page
+
+
+def make_page(size: int, build: Callable[[int], BaseModel]) -> Page:
+    return Page(items=[build(i) for i in range(1, size + 1)], next_cursor="WyIyMDI2LTEwLTE4VDEwOjAwOjAwKzAwOjAwIiwxXQ")
+
+
+def build_cleaning(i: int) -> CleaningInDB:
+    return CleaningInDB(
+        id=i, name=f"cleaning {i}", description="the whole house", price=29.99, cleaning_type="full_clean", owner=1
+    )
+
+
+def build_offer(i: int) -> OfferInDB:
+    now = datetime.now(timezone.utc)
+    return OfferInDB(cleaning_id=1, user_id=i, status="pending", created_at=now, updated_at=now)
+
+
+def build_evaluation(i: int) -> EvaluationInDB:
+    now = datetime.now(timezone.utc)
+    return EvaluationInDB(
+        cleaning_id=i, cleaner_id=1, headline="great job", comment="spotless", professionalism=5, completeness=4,
+        efficiency=5, overall_rating=5, created_at=now, updated_at=now,
+    )
+
+
+CASES: List[Tuple[str, Callable[[int], BaseModel], Type[BaseModel]]] = [
+    ("cleanings", build_cleaning, CleaningPublic),
+    ("offers", build_offer, OfferPublic),
+    ("evaluations", build_evaluation, EvaluationPublic),
+]
+
+
+async def default_body(page: Page, field: ModelField) -> bytes:
+    content = await serialize_response(field=field, response_content=page)
+    return JSONResponse(content).body
+
+
+async def trusted_body(page: Page, field: ModelField) -> bytes:
+    return TrustedJSONResponse(page, response_model=field.type_).body
+
+
+async def per_request_us(render: Callable, page: Page, field: ModelField, rounds: int) -> float:
+    await render(page, field)
+    started = time.process_time()
+    for _ in range(rounds):
+        await render(page, field)
+    return (time.process_time() - started) / rounds * 1e6
+
+
+async def run(rounds: int, sizes: List[int]) -> None:
+    print(f"orjson: {'yes' if responses.orjson is not None else 'no, stdlib json fallback'}")
+    print(f"{'endpoint':<12} {'rows':>5} {'default us':>11} {'trusted us':>11} {'saved':>7}")
+    for name, build, response_model in CASES:
+        for size in sizes:
+            page = make_page(size, build)
+            # built once per route by FastAPI, not per request
+            field = create_response_field(name="response", type_=Page[response_model])
+            default = await per_request_us(default_body, page, field, rounds)
+            trusted = await per_request_us(trusted_body, page, field, rounds)
+            print(f"{name:<12} {size:>5} {default:>11.0f} {trusted:>11.0f} {1 - trusted / default:>7.0%}")
+
+
+def main(argv: Any = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100])
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.rounds, args.sizes))
+
+
+if __name__ == "__main__":
+    main()
@@ -231,7 +231,7 @@ async def create_cleaning_with_evaluated_offer_helper(
     )
     await offers_repo.accept_offer(offer=offer, offer_update=OfferUpdate(status="accepted"))
     await evals_repo.create_evaluation_for_cleaner(
-        evaluation_create=evaluation_create, cleaning=created_planning, cleaner=cleaner
+        evaluation_create=evaluation_create, cleaning_id=created_planning.id, cleaner_id=cleaner.id
     )
     return created_planning
 
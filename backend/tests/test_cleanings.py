@@ -1,4 +1,5 @@
-from typing import List
+import json
+from typing import Callable, List
 
 import pytest
 from databases import Database
@@ -6,12 +7,18 @@ from databases import Database
 from httpx import AsyncClient
 from fastapi import FastAPI
 from starlette import status
+from starlette.requests import Request
 
 from starlette.status import HTTP_404_NOT_FOUND, HTTP_422_UNPROCESSABLE_ENTITY, HTTP_201_CREATED, HTTP_200_OK, \
     HTTP_204_NO_CONTENT, HTTP_401_UNAUTHORIZED
 
+from app.api.dependencies.cleanings import get_cleaning_import_records
+from app.api.responses import iter_json_array
 from app.db.repositories.cleanings import CleaningsRepository
+from app.db.repositories.offers import OffersRepository
+from app.db.unit_of_work import UnitOfWork
 from app.models.cleaning import CleaningCreate, CleaningInDB, CleaningPublic
+from app.models.offer import OfferCreate, OfferUpdate
 from app.models.user import UserInDB
 
 pytestmark = pytest.mark.asyncio
@@ -108,6 +115,98 @@ class TestCreateCleaning:
         assert status_code == res.status_code
 
 
+class TestBulkCreateCleanings:
+    async def test_json_array_creates_valid_cleanings_and_reports_invalid_ones(
+            self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        records = [
+            {"name": "bulk 0", "price": 10.5, "cleaning_type": "dust_up"},
+            {"name": "bulk 1"},
+            {"name": "bulk 2", "description": "stairs", "price": 20},
+        ]
+        res = await authorized_client.post(app.url_path_for("cleanings:bulk-create-cleanings"), json=records)
+        assert res.status_code == HTTP_201_CREATED
+        created, errors = res.json()["created"], res.json()["errors"]
+        assert [c["index"] for c in created] == [0, 2]
+        assert [c["cleaning"]["name"] for c in created] == ["bulk 0", "bulk 2"]
+        assert created[0]["cleaning"]["price"] == 10.5
+        assert created[1]["cleaning"]["cleaning_type"] == "spot_clean"
+        assert all(c["cleaning"]["owner"] == test_user.id for c in created)
+        assert [(e["index"], e["errors"][0]["loc"]) for e in errors] == [(1, ["price"])]
+
+    async def test_ndjson_is_imported_in_chunks(
+            self, app: FastAPI, authorized_client: AsyncClient, monkeypatch
+    ) -> None:
+        monkeypatch.setattr("app.db.repositories.cleanings.BULK_IMPORT_CHUNK_SIZE", 2)
+        lines = [json.dumps({"name": f"ndjson {i}", "price": i}) for i in range(5)] + ["{not json", ""]
+        res = await authorized_client.post(
+            app.url_path_for("cleanings:bulk-create-cleanings"),
+            content="\n".join(lines).encode(),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert res.status_code == HTTP_201_CREATED
+        assert [c["cleaning"]["name"] for c in res.json()["created"]] == [f"ndjson {i}" for i in range(5)]
+        assert [e["index"] for e in res.json()["errors"]] == [5]
+
+    async def test_too_many_records_creates_nothing(
+            self, app: FastAPI, authorized_client: AsyncClient, monkeypatch
+    ) -> None:
+        monkeypatch.setattr("app.db.repositories.cleanings.BULK_IMPORT_CHUNK_SIZE", 1)
+        monkeypatch.setattr("app.db.repositories.cleanings.BULK_IMPORT_MAX_ROWS", 2)
+        records = [{"name": "too many", "price": 1}] * 3
+        res = await authorized_client.post(app.url_path_for("cleanings:bulk-create-cleanings"), json=records)
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+        res = await authorized_client.get(app.url_path_for("cleanings:stream-all-user-cleanings"))
+        assert all(c["name"] != "too many" for c in res.json())
+
+    @pytest.mark.parametrize("records", ([{"name": "no price"}, {"price": 1}], []))
+    async def test_import_creating_nothing_is_unprocessable(
+            self, app: FastAPI, authorized_client: AsyncClient, records: list
+    ) -> None:
+        res = await authorized_client.post(app.url_path_for("cleanings:bulk-create-cleanings"), json=records)
+        assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+        if records:
+            assert [e["index"] for e in res.json()["detail"]] == [0, 1]
+
+    async def test_no_connection_is_held_while_records_are_read(
+            self, client: AsyncClient, db: Database, test_user: UserInDB
+    ) -> None:
+        uow = UnitOfWork(db)
+        repo = uow.get_repository(CleaningsRepository)
+        await repo.get_cleaning_by_id(id=1, requesting_user=test_user)
+        assert uow.is_leased
+
+        async def records():
+            for i in range(3):
+                assert not uow.is_leased
+                yield {"name": f"unleased {i}", "price": i}
+
+        result = await repo.import_cleanings(records=records(), requesting_user=test_user)
+        assert len(result.created) == 3
+        await uow.close()
+
+    async def test_no_connection_is_held_while_the_body_is_read(
+            self, client: AsyncClient, db: Database
+    ) -> None:
+        uow = UnitOfWork(db)
+        await uow.fetch_val("SELECT 1")
+        assert uow.is_leased
+
+        async def receive() -> dict:
+            assert not uow.is_leased
+            return {"type": "http.request", "body": b'[{"name": "unleased", "price": 1}]', "more_body": False}
+
+        request = Request({"type": "http", "headers": [(b"content-type", b"application/json")]}, receive)
+        records = await get_cleaning_import_records(request, uow=uow)
+        assert [record async for record in records] == [{"name": "unleased", "price": 1}]
+        await uow.close()
+
+    @pytest.mark.parametrize("payload", ({"name": "not a list", "price": 1}, "nope"))
+    async def test_body_must_be_a_json_array(self, app: FastAPI, authorized_client: AsyncClient, payload) -> None:
+        res = await authorized_client.post(app.url_path_for("cleanings:bulk-create-cleanings"), json=payload)
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
 class TestGetCleaning:
     async def test_get_cleaning_by_id(
             self,
@@ -145,15 +244,261 @@ class TestGetCleaning:
     ) -> None:
         res = await authorized_client.get(app.url_path_for("cleanings:list-all-user-cleanings"))
         assert res.status_code == HTTP_200_OK
-        assert isinstance(res.json(), list)
-        assert len(res.json()) > 0
-        cleanings = [CleaningInDB(**l) for l in res.json()]
+        assert isinstance(res.json()["items"], list)
+        assert len(res.json()["items"]) > 0
+        cleanings = [CleaningInDB(**l) for l in res.json()["items"]]
         assert test_cleaning in cleanings
         for cleaning in cleanings:
             assert cleaning.owner == test_user.id
         assert all(c not in cleanings for c in test_cleaning_list)
 
 
+class TestConditionalGetCleaning:
+    async def test_cleaning_comes_with_validators(
+            self, app: FastAPI, authorized_client: AsyncClient, test_cleaning: CleaningInDB
+    ) -> None:
+        url = app.url_path_for("cleanings:get-cleaning-by-id", cleaning_id=test_cleaning.id)
+        res = await authorized_client.get(url)
+        assert res.status_code == HTTP_200_OK
+        assert res.headers["etag"].startswith('W/"')
+        assert res.headers["last-modified"].endswith("GMT")
+        assert res.headers["cache-control"] == "private, no-cache"
+
+    async def test_matching_etag_is_not_modified_without_loading_the_cleaning(
+            self, app: FastAPI, authorized_client: AsyncClient, test_cleaning: CleaningInDB, monkeypatch
+    ) -> None:
+        url = app.url_path_for("cleanings:get-cleaning-by-id", cleaning_id=test_cleaning.id)
+        etag = (await authorized_client.get(url)).headers["etag"]
+
+        async def get_cleaning_by_id(*args, **kwargs):
+            raise AssertionError("the cleaning should not be loaded for a 304")
+
+        monkeypatch.setattr(CleaningsRepository, "get_cleaning_by_id", get_cleaning_by_id)
+        res = await authorized_client.get(url, headers={"If-None-Match": etag})
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+        assert res.content == b""
+        assert res.headers["etag"] == etag
+
+    async def test_if_modified_since(
+            self, app: FastAPI, authorized_client: AsyncClient, test_cleaning: CleaningInDB
+    ) -> None:
+        url = app.url_path_for("cleanings:get-cleaning-by-id", cleaning_id=test_cleaning.id)
+        last_modified = (await authorized_client.get(url)).headers["last-modified"]
+        res = await authorized_client.get(url, headers={"If-Modified-Since": last_modified})
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+        for stale in ("Mon, 01 Jan 2001 00:00:00 GMT", "not a date"):
+            res = await authorized_client.get(url, headers={"If-Modified-Since": stale})
+            assert res.status_code == HTTP_200_OK
+
+    async def test_update_changes_etag(
+            self, app: FastAPI, authorized_client: AsyncClient, test_cleaning: CleaningInDB
+    ) -> None:
+        url = app.url_path_for("cleanings:get-cleaning-by-id", cleaning_id=test_cleaning.id)
+        etag = (await authorized_client.get(url)).headers["etag"]
+        res = await authorized_client.put(
+            app.url_path_for("cleanings:update-cleaning-by-id", cleaning_id=test_cleaning.id),
+            json={"description": "changed since the client cached it"}
+        )
+        assert res.status_code == HTTP_200_OK
+        res = await authorized_client.get(url, headers={"If-None-Match": etag})
+        assert res.status_code == HTTP_200_OK
+        assert res.headers["etag"] != etag
+        assert res.json()["description"] == "changed since the client cached it"
+
+    async def test_unknown_cleaning_is_not_found_even_if_conditional(
+            self, app: FastAPI, authorized_client: AsyncClient
+    ) -> None:
+        res = await authorized_client.get(
+            app.url_path_for("cleanings:get-cleaning-by-id", cleaning_id=50000), headers={"If-None-Match": "*"}
+        )
+        assert res.status_code == HTTP_404_NOT_FOUND
+
+
+class TestPaginateCleanings:
+    async def test_pages_cover_every_cleaning_once_newest_first(
+            self,
+            app: FastAPI,
+            create_authorized_client: Callable,
+            test_user2: UserInDB,
+            test_cleaning_list: List[CleaningInDB],
+    ) -> None:
+        authorized_client = create_authorized_client(user=test_user2)
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            res = await authorized_client.get(app.url_path_for("cleanings:list-all-user-cleanings"), params=params)
+            assert res.status_code == HTTP_200_OK
+            page = res.json()
+            assert len(page["items"]) <= 2
+            seen.extend(CleaningInDB(**c) for c in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        ids = [c.id for c in seen]
+        assert len(ids) == len(set(ids))
+        assert all(c.id in ids for c in test_cleaning_list)
+        # created one after the other, so newest first is also descending ids
+        assert ids == sorted(ids, reverse=True)
+
+    @pytest.mark.parametrize(
+        "params, status_code",
+        (
+            ({"limit": 0}, 422),
+            ({"limit": 1000}, 422),
+            ({"cursor": "not-a-cursor"}, 400),
+        ),
+    )
+    async def test_invalid_page_params(
+            self, app: FastAPI, authorized_client: AsyncClient, params: dict, status_code: int
+    ) -> None:
+        res = await authorized_client.get(app.url_path_for("cleanings:list-all-user-cleanings"), params=params)
+        assert res.status_code == status_code
+
+    async def test_feed_cursor_is_rejected_by_the_list(
+            self, app: FastAPI, authorized_client: AsyncClient, test_cleaning_list: List[CleaningInDB]
+    ) -> None:
+        res = await authorized_client.get(
+            app.url_path_for("cleanings:get-cleaning-feed"), params={"sort": "price_asc", "limit": 1}
+        )
+        assert res.status_code == HTTP_200_OK
+        res = await authorized_client.get(
+            app.url_path_for("cleanings:list-all-user-cleanings"), params={"cursor": res.json()["next_cursor"]}
+        )
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+        assert res.json()["detail"] == "Invalid cursor."
+
+
+class TestStreamCleanings:
+    @pytest.mark.parametrize("count", (0, 1, 5))
+    async def test_json_array_is_encoded_in_chunks(self, new_cleaning: CleaningCreate, count: int) -> None:
+        async def cleanings():
+            for i in range(count):
+                yield CleaningInDB(id=i + 1, owner=1, **new_cleaning.dict())
+
+        chunks = [c async for c in iter_json_array(cleanings(), response_model=CleaningPublic, chunk_size=2)]
+        assert len(chunks) == count // 2 + count % 2 + 1
+        assert [c["id"] for c in json.loads(b"".join(chunks))] == list(range(1, count + 1))
+
+    async def test_stream_returns_every_user_cleaning(
+            self,
+            app: FastAPI,
+            create_authorized_client: Callable,
+            test_user2: UserInDB,
+            test_cleaning_list: List[CleaningInDB],
+    ) -> None:
+        authorized_client = create_authorized_client(user=test_user2)
+        res = await authorized_client.get(app.url_path_for("cleanings:stream-all-user-cleanings"))
+        assert res.status_code == HTTP_200_OK
+        assert res.headers["content-type"] == "application/json"
+        streamed = [CleaningPublic(**c) for c in res.json()]
+        assert all(c.owner == test_user2.id for c in streamed)
+        assert all(c in streamed for c in test_cleaning_list)
+
+
+class TestCleaningFeed:
+    async def test_feed_filters_sorts_and_pages_open_cleanings(
+            self,
+            app: FastAPI,
+            create_authorized_client: Callable,
+            db: Database,
+            test_user2: UserInDB,
+            test_user3: UserInDB,
+            test_user4: UserInDB,
+    ) -> None:
+        since = await db.fetch_val("SELECT now()")
+        cleanings_repo, offers_repo = CleaningsRepository(db), OffersRepository(db)
+        cheap, pricey, taken = [
+            await cleanings_repo.create_cleaning(
+                new_cleaning=CleaningCreate(name=f"feed {price}", price=price, cleaning_type=cleaning_type),
+                requesting_user=test_user2,
+            )
+            for price, cleaning_type in ((10, "full_clean"), (20, "spot_clean"), (30, "dust_up"))
+        ]
+        offer = await offers_repo.create_offer_for_cleaning(
+            new_offer=OfferCreate(cleaning_id=taken.id, user_id=test_user3.id)
+        )
+        await offers_repo.accept_offer(offer=offer, offer_update=OfferUpdate(status="accepted"))
+
+        async def feed_ids(user: UserInDB, **params) -> List[int]:
+            ids, cursor = [], None
+            while True:
+                page_params = {"created_since": since.isoformat(), "limit": 1, **params}
+                if cursor:
+                    page_params["cursor"] = cursor
+                res = await create_authorized_client(user=user).get(
+                    app.url_path_for("cleanings:get-cleaning-feed"), params=page_params
+                )
+                assert res.status_code == HTTP_200_OK
+                ids.extend(c["id"] for c in res.json()["items"])
+                cursor = res.json()["next_cursor"]
+                if cursor is None:
+                    return ids
+
+        assert await feed_ids(test_user4) == [pricey.id, cheap.id]
+        assert await feed_ids(test_user4, sort="price_asc") == [cheap.id, pricey.id]
+        assert await feed_ids(test_user4, sort="price_desc") == [pricey.id, cheap.id]
+        assert await feed_ids(test_user4, cleaning_type="full_clean") == [cheap.id]
+        assert await feed_ids(test_user4, min_price=15, max_price=25) == [pricey.id]
+        assert await feed_ids(test_user2) == []
+
+    async def test_cursor_must_match_the_feed_sort(
+            self, app: FastAPI, authorized_client: AsyncClient, test_cleaning_list: List[CleaningInDB]
+    ) -> None:
+        res = await authorized_client.get(
+            app.url_path_for("cleanings:get-cleaning-feed"), params={"sort": "price_asc", "limit": 1}
+        )
+        assert res.status_code == HTTP_200_OK
+        res = await authorized_client.get(
+            app.url_path_for("cleanings:get-cleaning-feed"), params={"cursor": res.json()["next_cursor"]}
+        )
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestSearchCleanings:
+    async def test_search_ranks_name_matches_first_and_pages(
+            self,
+            app: FastAPI,
+            authorized_client: AsyncClient,
+            db: Database,
+            test_user2: UserInDB,
+    ) -> None:
+        cleanings_repo = CleaningsRepository(db)
+        in_description, in_name, unrelated = [
+            await cleanings_repo.create_cleaning(
+                new_cleaning=CleaningCreate(name=name, description=description, price=10, cleaning_type="dust_up"),
+                requesting_user=test_user2,
+            )
+            for name, description in (
+                ("Kitchen", "Scrub the greasy chandeliers above the island"),
+                ("Chandelier polishing", "Three chandeliers in the hallway"),
+                ("Garage", "Sweep the floor"),
+            )
+        ]
+        ids, snippets, cursor = [], [], None
+        while True:
+            params = {"q": "chandeliers", "limit": 1, **({"cursor": cursor} if cursor else {})}
+            res = await authorized_client.get(app.url_path_for("cleanings:search-cleanings"), params=params)
+            assert res.status_code == HTTP_200_OK
+            ids.extend(c["id"] for c in res.json()["items"])
+            snippets.extend(c["snippet"] for c in res.json()["items"])
+            cursor = res.json()["next_cursor"]
+            if cursor is None:
+                break
+        assert ids == [in_name.id, in_description.id]
+        assert all("<b>chandeliers</b>" in snippet for snippet in snippets)
+
+        res = await authorized_client.get(
+            app.url_path_for("cleanings:search-cleanings"), params={"q": "chandelier -hallway"}
+        )
+        assert [c["id"] for c in res.json()["items"]] == [in_description.id]
+
+    @pytest.mark.parametrize("params", ({}, {"q": ""}, {"q": "x" * 201}))
+    async def test_invalid_search_query(self, app: FastAPI, authorized_client: AsyncClient, params: dict) -> None:
+        res = await authorized_client.get(app.url_path_for("cleanings:search-cleanings"), params=params)
+        assert res.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+
+
 class TestUpdateCleaning:
     @pytest.mark.parametrize(
         "attrs_to_change, values",
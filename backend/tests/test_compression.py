@@ -0,0 +1,186 @@
+import gzip
+import json
+import threading
+import zlib
+from typing import Callable, Dict, List
+
+import pytest
+
+from fastapi import FastAPI, Response
+from httpx import AsyncClient
+from starlette import status
+from starlette.responses import StreamingResponse
+
+from app.api import compression
+from app.api.compression import Codec, available_codecs, negotiate
+from app.api.middleware import CompressionMiddleware
+from app.models.cleaning import CleaningInDB
+
+pytestmark = pytest.mark.asyncio
+
+LARGE = [{"id": i, "comment": f"spotless, would book again {i}"} for i in range(200)]
+SMALL = {"id": 1}
+
+DECOMPRESS: Dict[str, Callable[[bytes], bytes]] = {"gzip": gzip.decompress}
+if compression.brotli is not None:
+    DECOMPRESS["br"] = compression.brotli.decompress
+if compression.zstandard is not None:
+    DECOMPRESS["zstd"] = lambda data: compression.zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+def codec(encoding: str) -> Codec:
+    return Codec(encoding, lambda data: data, lambda: None)
+
+
+ALL_CODECS = [codec("zstd"), codec("br"), codec("gzip")]
+
+
+def compressed_app(**kwargs) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, **kwargs)
+
+    @app.get("/large", name="test:large")
+    async def large() -> List[dict]:
+        return LARGE
+
+    @app.get("/small", name="test:small")
+    async def small() -> dict:
+        return SMALL
+
+    @app.get("/excluded", name="test:excluded")
+    async def excluded() -> List[dict]:
+        return LARGE
+
+    @app.get("/binary", name="test:binary")
+    async def binary() -> Response:
+        return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+    @app.get("/stream", name="test:stream")
+    async def stream() -> StreamingResponse:
+        async def chunks():
+            for i in range(3):
+                yield f"chunk {i};".encode()
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    return app
+
+
+class TestNegotiation:
+    @pytest.mark.parametrize(
+        "accept_encoding, expected",
+        (
+                (None, None),
+                ("", None),
+                ("identity", None),
+                ("gzip", "gzip"),
+                ("gzip, deflate, br", "br"),
+                ("gzip, br, zstd", "zstd"),
+                ("br;q=0.5, gzip", "gzip"),
+                ("zstd;q=0, br;q=0, gzip;q=0.1", "gzip"),
+                ("GZIP;Q=0.8", "gzip"),
+                ("*", "zstd"),
+                ("zstd;q=0, *;q=0.5", "br"),
+                ("gzip;q=nope, br;q=0.2", "br"),
+        ),
+    )
+    def test_client_preference_wins_and_ties_go_to_the_best_codec(self, accept_encoding: str, expected: str) -> None:
+        chosen = negotiate(accept_encoding, ALL_CODECS)
+        assert (chosen and chosen.encoding) == expected
+
+    def test_codings_that_are_not_installed_are_never_chosen(self) -> None:
+        assert negotiate("zstd, br", [codec("gzip")]) is None
+
+
+class TestCodecs:
+    @pytest.mark.parametrize("encoding", sorted(DECOMPRESS))
+    def test_whole_and_streamed_bodies_round_trip(self, encoding: str) -> None:
+        codecs = {c.encoding: c for c in available_codecs()}
+        body = b"".join(f'{{"id":{i},"comment":"spotless"}},'.encode() for i in range(500))
+        compressed = codecs[encoding].compress(body)
+        assert len(compressed) < len(body)
+        assert DECOMPRESS[encoding](compressed) == body
+
+        stream = codecs[encoding].stream()
+        chunks = [stream.compress(body[:1000]), stream.compress(body[1000:])]
+        assert DECOMPRESS[encoding](b"".join(chunks) + stream.finish()) == body
+
+    def test_streamed_chunks_can_be_decoded_as_they_arrive(self) -> None:
+        stream = next(c for c in available_codecs() if c.encoding == "gzip").stream()
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        assert decompressor.decompress(stream.compress(b"first chunk")) == b"first chunk"
+        assert decompressor.decompress(stream.compress(b"second chunk")) == b"second chunk"
+
+
+class TestCompressionMiddleware:
+    @pytest.mark.parametrize("encoding", sorted(DECOMPRESS))
+    async def test_large_json_is_compressed_with_the_negotiated_coding(self, encoding: str) -> None:
+        app = compressed_app()
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            res = await client.get("/large", headers={"Accept-Encoding": encoding})
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["content-encoding"] == encoding
+        assert res.headers["vary"] == "Accept-Encoding"
+        # httpx decodes gzip and br itself
+        body = DECOMPRESS[encoding](res.content) if encoding == "zstd" else res.content
+        assert json.loads(body) == LARGE
+        assert int(res.headers["content-length"]) < len(body)
+
+    async def test_what_is_not_worth_compressing_goes_out_as_it_is(self) -> None:
+        app = compressed_app(exclude_routes=["test:excluded"])
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            for path in ("/small", "/excluded", "/binary"):
+                res = await client.get(path, headers={"Accept-Encoding": "gzip"})
+                assert res.status_code == status.HTTP_200_OK
+                assert "content-encoding" not in res.headers
+                assert int(res.headers["content-length"]) == len(res.content)
+            res = await client.get("/large", headers={"Accept-Encoding": "identity"})
+            assert "content-encoding" not in res.headers
+            assert res.json() == LARGE
+
+    async def test_uncompressed_text_and_json_still_vary_on_accept_encoding(self) -> None:
+        app = compressed_app(exclude_routes=["test:excluded"])
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            for path, accept_encoding in (
+                    ("/small", "gzip"), ("/excluded", "gzip"), ("/large", "identity"), ("/large", ""),
+            ):
+                res = await client.get(path, headers={"Accept-Encoding": accept_encoding})
+                assert "content-encoding" not in res.headers
+                assert res.headers["vary"] == "Accept-Encoding"
+            res = await client.get("/binary", headers={"Accept-Encoding": "gzip"})
+            assert "vary" not in res.headers
+
+    async def test_streamed_body_is_compressed_whatever_its_size(self) -> None:
+        app = compressed_app()
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            res = await client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        assert res.headers["content-encoding"] == "gzip"
+        assert "content-length" not in res.headers
+        assert res.text == "chunk 0;chunk 1;chunk 2;"
+
+    async def test_large_bodies_are_compressed_off_the_event_loop(self) -> None:
+        threads = []
+
+        def compress(data: bytes) -> bytes:
+            threads.append(threading.get_ident())
+            return gzip.compress(data)
+
+        codecs = [Codec("gzip", compress, lambda: None)]
+        async with AsyncClient(app=compressed_app(codecs=codecs), base_url="http://testserver") as client:
+            await client.get("/large", headers={"Accept-Encoding": "gzip"})
+        app = compressed_app(codecs=codecs, threadpool_min_size=1)
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            res = await client.get("/large", headers={"Accept-Encoding": "gzip"})
+        assert res.json() == LARGE
+        on_loop, in_pool = threads
+        assert on_loop == threading.get_ident()
+        assert in_pool != threading.get_ident()
+
+    async def test_app_compresses_responses(
+            self, app: FastAPI, authorized_client: AsyncClient, test_cleaning: CleaningInDB
+    ) -> None:
+        res = await authorized_client.get(
+            app.url_path_for("cleanings:stream-all-user-cleanings"), headers={"Accept-Encoding": "gzip"}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["content-encoding"] == "gzip"
+        assert test_cleaning in [CleaningInDB(**c) for c in res.json()]
@@ -3,10 +3,13 @@ from statistics import mean
 
 import pytest
 
+from databases import Database
 from httpx import AsyncClient
 from fastapi import FastAPI, status
 
 
+from app.db.repositories.evaluations import EvaluationsRepository
+from app.db.unit_of_work import UnitOfWork
 from app.models.cleaning import CleaningInDB
 from app.models.user import UserInDB
 from app.models.offer import OfferInDB
@@ -197,7 +200,7 @@ class TestGetEvaluations:
             )
         )
         assert res.status_code == status.HTTP_200_OK
-        evaluations = [EvaluationPublic(**e) for e in res.json()]
+        evaluations = [EvaluationPublic(**e) for e in res.json()["items"]]
         assert len(evaluations) > 1
         for evaluation in evaluations:
             assert evaluation.cleaner_id == test_user3.id
@@ -213,7 +216,7 @@ class TestGetEvaluations:
     ) -> None:
         authorized_client = create_authorized_client(user=test_user4)
         res = await authorized_client.get(
-            app.url_path_for("evaluations:list-evaluations-for-cleaner", username=test_user3.username)
+            app.url_path_for("evaluations:stream-evaluations-for-cleaner", username=test_user3.username)
         )
         assert res.status_code == status.HTTP_200_OK
         evaluations = [EvaluationPublic(**e) for e in res.json()]
@@ -238,6 +241,24 @@ class TestGetEvaluations:
         assert len([e for e in evaluations if e.overall_rating == 4]) == stats.four_stars
         assert len([e for e in evaluations if e.overall_rating == 5]) == stats.five_stars
 
+    async def test_streamed_evaluations_have_every_public_field(
+            self,
+            app: FastAPI,
+            create_authorized_client: Callable,
+            test_user3: UserInDB,
+            test_user4: UserInDB,
+            test_list_of_cleanings_with_evaluated_offer: List[CleaningInDB],
+    ) -> None:
+        authorized_client = create_authorized_client(user=test_user4)
+        res = await authorized_client.get(
+            app.url_path_for("evaluations:stream-evaluations-for-cleaner", username=test_user3.username)
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()
+        for evaluation in res.json():
+            assert set(evaluation) == set(EvaluationPublic.__fields__)
+            assert evaluation["cleaner"] is None
+
     async def test_unauthenticated_user_forbidden_from_get_requests(
             self,
             app: FastAPI,
@@ -257,3 +278,76 @@ class TestGetEvaluations:
             app.url_path_for("evaluations:list-evaluations-for-cleaner", username=test_user3.username)
         )
         assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+    @pytest.mark.parametrize(
+        "route_name", ("evaluations:list-evaluations-for-cleaner", "evaluations:get-stats-for-cleaner")
+    )
+    async def test_matching_etag_is_not_modified(
+            self,
+            app: FastAPI,
+            create_authorized_client: Callable,
+            test_user3: UserInDB,
+            test_user4: UserInDB,
+            test_list_of_cleanings_with_evaluated_offer: List[CleaningInDB],
+            route_name: str,
+    ) -> None:
+        authorized_client = create_authorized_client(user=test_user4)
+        url = app.url_path_for(route_name, username=test_user3.username)
+        res = await authorized_client.get(url)
+        assert res.status_code == status.HTTP_200_OK
+        res = await authorized_client.get(url, headers={"If-None-Match": res.headers["etag"]})
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+        assert res.content == b""
+        res = await authorized_client.get(url, headers={"If-None-Match": 'W/"stale"'})
+        assert res.status_code == status.HTTP_200_OK
+
+    async def test_evaluation_is_not_modified_since(
+            self,
+            app: FastAPI,
+            create_authorized_client: Callable,
+            test_user3: UserInDB,
+            test_user4: UserInDB,
+            test_list_of_cleanings_with_evaluated_offer: List[CleaningInDB]
+    ) -> None:
+        authorized_client = create_authorized_client(user=test_user4)
+        url = app.url_path_for(
+            "evaluations:get-evaluation-for-cleaner",
+            cleaning_id=str(test_list_of_cleanings_with_evaluated_offer[0].id),
+            username=test_user3.username
+        )
+        res = await authorized_client.get(url)
+        assert res.status_code == status.HTTP_200_OK
+        res = await authorized_client.get(url, headers={"If-Modified-Since": res.headers["last-modified"]})
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+
+class TestCleanerRatingStats:
+    async def test_rebuild_matches_incrementally_maintained_stats(
+            self,
+            app: FastAPI,
+            client: AsyncClient,
+            db: Database,
+            test_user3: UserInDB,
+            test_list_of_cleanings_with_evaluated_offer: List[CleaningInDB],
+    ) -> None:
+        uow = UnitOfWork(db)
+        evals_repo = uow.get_repository(EvaluationsRepository)
+        maintained = await evals_repo.get_cleaner_aggregates(cleaner=test_user3)
+        assert maintained.total_evaluations >= len(test_list_of_cleanings_with_evaluated_offer)
+
+        await db.execute(
+            "UPDATE cleaner_rating_stats SET total_evaluations = 0, five_stars = 0 WHERE cleaner_id = :cleaner_id",
+            values={"cleaner_id": test_user3.id},
+        )
+        assert await evals_repo.rebuild_cleaner_rating_stats() >= 1
+        assert await evals_repo.get_cleaner_aggregates(cleaner=test_user3) == maintained
+        await uow.close()
+
+    async def test_stats_for_cleaner_without_evaluations_return_404(
+            self, app: FastAPI, create_authorized_client: Callable, test_user: UserInDB, test_user4: UserInDB
+    ) -> None:
+        authorized_client = create_authorized_client(user=test_user4)
+        res = await authorized_client.get(
+            app.url_path_for("evaluations:get-stats-for-cleaner", username=test_user.username)
+        )
+        assert res.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,60 @@
+import pytest
+
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from app.core.config import DATABASE_URL
+from app.db.accounting import AccountedDatabase
+from app.db.tasks import UnsupportedDatabaseBackend, connect_database
+from app.models.health import Readiness
+from app.models.user import UserInDB
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestReadiness:
+    async def test_ready_reports_pool_stats(self, app: FastAPI, client: AsyncClient, test_user: UserInDB) -> None:
+        res = await client.get(app.url_path_for("health:readiness"))
+        assert res.status_code == status.HTTP_200_OK
+        readiness = Readiness(**res.json())
+        assert readiness.ready
+        assert readiness.pool.acquires >= 1
+        assert readiness.pool.in_use == readiness.pool.size - readiness.pool.idle
+        assert readiness.pool.max_size >= readiness.pool.size
+
+    async def test_saturated_pool_is_a_503_until_a_connection_frees_up(
+            self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        client = authorized_client
+        pool = app.state._db_pool
+        held = [await pool.acquire() for _ in range(pool.get_max_size())]
+        pool._acquire_timeout = 0.1
+        try:
+            res = await client.put(app.url_path_for("profiles:update-own-profile"), json={})
+            assert res.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+            assert res.headers["Retry-After"] == "1"
+
+            res = await client.get(app.url_path_for("health:readiness"))
+            assert res.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+            readiness = Readiness(**res.json())
+            assert not readiness.ready
+            assert readiness.pool.timeouts == 1
+            assert readiness.pool.in_use == readiness.pool.max_size
+        finally:
+            for connection in held:
+                await pool.release(connection)
+
+        res = await client.put(app.url_path_for("profiles:update-own-profile"), json={})
+        assert res.status_code == status.HTTP_200_OK
+        res = await client.get(app.url_path_for("health:readiness"))
+        assert res.status_code == status.HTTP_200_OK
+
+
+class TestDatabaseStartup:
+    async def test_a_databases_release_without_the_backend_pool_fails_startup(self, monkeypatch) -> None:
+        async def connect(self) -> None:
+            pass
+
+        monkeypatch.setattr(AccountedDatabase, "connect", connect)
+        with pytest.raises(UnsupportedDatabaseBackend):
+            await connect_database(DATABASE_URL, min_size=1, max_size=1)
@@ -0,0 +1,91 @@
+import logging
+
+import pytest
+
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from app.api.middleware import ServerTimingMiddleware, logger as middleware_logger
+from app.core.metrics import Exposition, HistogramFamily
+from app.db.accounting import RequestQueries
+from app.models.user import UserInDB
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestHistograms:
+    def test_buckets_are_cumulative_and_rendered_in_text_format(self) -> None:
+        family = HistogramFamily("test_seconds", "Test latency.", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            family.labels("a").observe(value)
+        assert family.labels("a").count == 4
+
+        exposition = Exposition()
+        exposition.add_histograms(family)
+        lines = exposition.render().splitlines()
+        assert lines[:2] == ["# HELP test_seconds Test latency.", "# TYPE test_seconds histogram"]
+        assert 'test_seconds_bucket{route="a",le="0.1"} 2' in lines
+        assert 'test_seconds_bucket{route="a",le="1.0"} 3' in lines
+        assert 'test_seconds_bucket{route="a",le="+Inf"} 4' in lines
+        assert 'test_seconds_sum{route="a"} 3.65' in lines
+        assert 'test_seconds_count{route="a"} 4' in lines
+
+
+class TestMetricsEndpoint:
+    async def test_requests_queries_and_pools_are_reported(
+            self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        res = await authorized_client.get(
+            app.url_path_for("profiles:get-profile-by-username", username=test_user.username)
+        )
+        assert res.status_code == status.HTTP_200_OK
+        await authorized_client.get("/api/nothing-here/")
+
+        res = await authorized_client.get(app.url_path_for("metrics"))
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+        body = res.text
+        assert (
+            'phresh_http_request_duration_seconds_count'
+            '{route="profiles:get-profile-by-username",method="GET",status="200"}'
+        ) in body
+        assert 'route="unmatched",method="GET",status="404"' in body
+        assert 'phresh_db_query_duration_seconds_count{query="profiles.GET_PROFILE_BY_USERNAME_QUERY"}' in body
+        assert 'phresh_db_pool_connections{pool="primary",state="in_use"}' in body
+        assert "# TYPE phresh_auth_hashing_jobs_total counter" in body
+
+
+class TestServerTiming:
+    async def test_queries_of_the_request_are_reported(
+            self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        res = await authorized_client.get(
+            app.url_path_for("profiles:get-profile-by-username", username=test_user.username)
+        )
+        assert res.status_code == status.HTTP_200_OK
+        db_timing, app_timing = res.headers["Server-Timing"].split(", ")
+        assert db_timing.startswith("db;dur=")
+        assert int(db_timing.split('desc="')[1].split(" ")[0]) >= 1
+        assert app_timing.startswith("app;dur=")
+
+    async def test_budget_and_repeated_statements_are_logged(
+            self, caplog: pytest.LogCaptureFixture, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        # alembic's logging config disables the loggers that existed when the migrations ran
+        monkeypatch.setattr(middleware_logger, "disabled", False)
+        middleware = ServerTimingMiddleware(None, query_budget=3, repeated_threshold=3)
+        scope = {"method": "GET", "path": "/api/cleanings/"}
+        queries = RequestQueries()
+        for name in ("users.GET_USER_BY_USERNAME_QUERY", "cleanings.GET_CLEANING_BY_ID_QUERY"):
+            queries.record(name, 0.001)
+        with caplog.at_level(logging.WARNING):
+            middleware.check_budget(scope, queries)
+            assert not caplog.records
+
+            for _ in range(2):
+                queries.record("cleanings.GET_CLEANING_BY_ID_QUERY", 0.001)
+            middleware.check_budget(scope, queries)
+        assert len(caplog.records) == 1
+        message = caplog.records[0].getMessage()
+        assert "ran 4 queries" in message
+        assert "cleanings.GET_CLEANING_BY_ID_QUERY x3" in message
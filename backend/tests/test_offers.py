@@ -1,16 +1,31 @@
+import asyncio
+import contextvars
+import json
 import random
-from typing import List, Callable
+import re
+from datetime import datetime, timezone
+from typing import List, Callable, Union
 
 import pytest
 
 from httpx import AsyncClient
-from fastapi import FastAPI, status
+from fastapi import FastAPI, HTTPException, status
 from databases import Database
-
-from app.db.repositories.offers import OffersRepository
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.api import responses
+from app.api.responses import TrustedJSONResponse
+from app.db.repositories.cleanings import CleaningsRepository
+from app.db.repositories.offers import (
+    OFFER_TRANSITION_QUERIES, OFFER_TRANSITIONS, OffersRepository, offer_transition_values
+)
 from app.models.cleaning import CleaningCreate, CleaningInDB
+from app.models.evaluation import EvaluationInDB, EvaluationPublic
 from app.models.user import UserInDB
-from app.models.offer import OfferCreate, OfferUpdate, OfferInDB, OfferPublic
+from app.models.offer import OfferAction, OfferCreate, OfferUpdate, OfferInDB, OfferPublic
+from app.models.pagination import Page
 
 
 pytestmark = pytest.mark.asyncio
@@ -163,7 +178,7 @@ class TestGetOffers:
             )
         )
         assert res.status_code ==  status.HTTP_200_OK
-        for offer in res.json():
+        for offer in res.json()["items"]:
             assert offer["user_id"] in [user.id for user in test_user_list]
 
     async def test_non_owners_forbidden_from_fetching_all_offers_for_cleaning(
@@ -274,7 +289,7 @@ class TestAcceptOffers:
                 cleaning_id=str(test_cleaning_with_offers.id)
             )
         )
-        offers = [OfferPublic(**o) for o in res.json()]
+        offers = [OfferPublic(**o) for o in res.json()["items"]]
         for offer in offers:
             if offer.user_id == selected_user.id:
                 assert offer.status == "accepted"
@@ -334,7 +349,7 @@ class TestCancelOffers:
 
         offers_repo = OffersRepository(app.state._db)
         offers = await offers_repo.list_offers_for_cleaning(cleaning=test_cleaning_with_accepted_offer)
-        for offer in offers:
+        for offer in offers.items:
             if offer.user_id == test_user3.id:
                 assert offer.status == "cancelled"
             else:
@@ -362,7 +377,7 @@ class TestRescindingOffer:
         offers_repo = OffersRepository(app.state._db)
         offers = await offers_repo.list_offers_for_cleaning(cleaning=test_cleaning_with_offers)
         user_ids = [user.id for user in test_user_list]
-        for offer in offers:
+        for offer in offers.items:
             assert offer.user_id in user_ids
             assert offer.user_id != test_user4.id
 
@@ -408,4 +423,296 @@ class TestRescindingOffer:
         res = await authorized_client.delete(
             app.url_path_for("offers:rescind-offer-from-user", cleaning_id=test_cleaning_with_accepted_offer.id)
         )
-        assert res.status_code == status.HTTP_400_BAD_REQUEST
\ No newline at end of file
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestOfferAuthorizationContext:
+    async def test_context_describes_cleaning_user_and_offer(
+            self,
+            app: FastAPI,
+            client: AsyncClient,
+            db: Database,
+            test_user2: UserInDB,
+            test_user3: UserInDB,
+            test_cleaning_with_accepted_offer: CleaningInDB,
+    ) -> None:
+        offers_repo = OffersRepository(db)
+        by_username = await offers_repo.get_offer_authorization_context(
+            cleaning_id=test_cleaning_with_accepted_offer.id, username=test_user3.username
+        )
+        by_user_id = await offers_repo.get_offer_authorization_context(
+            cleaning_id=test_cleaning_with_accepted_offer.id, user_id=test_user3.id
+        )
+        assert by_username == by_user_id
+        assert by_username.cleaning_owner == test_user2.id
+        assert by_username.user_id == test_user3.id
+        assert by_username.has_accepted_offer
+        assert by_username.offer.status == "accepted"
+
+    async def test_context_for_missing_user_offer_or_cleaning(
+            self,
+            app: FastAPI,
+            client: AsyncClient,
+            db: Database,
+            test_user2: UserInDB,
+            test_cleaning_with_offers: CleaningInDB,
+    ) -> None:
+        offers_repo = OffersRepository(db)
+        owner_context = await offers_repo.get_offer_authorization_context(
+            cleaning_id=test_cleaning_with_offers.id, user_id=test_user2.id
+        )
+        assert owner_context.offer is None
+        assert not owner_context.has_accepted_offer
+
+        unknown_user = await offers_repo.get_offer_authorization_context(
+            cleaning_id=test_cleaning_with_offers.id, username="nobodyhere"
+        )
+        assert unknown_user.user_id is None
+
+        assert await offers_repo.get_offer_authorization_context(cleaning_id=5000000, user_id=test_user2.id) is None
+
+    async def test_accepting_offer_for_unknown_user_returns_404(
+            self,
+            app: FastAPI,
+            create_authorized_client: Callable,
+            test_user2: UserInDB,
+            test_cleaning_with_offers: CleaningInDB,
+    ) -> None:
+        authorized_client = create_authorized_client(user=test_user2)
+        res = await authorized_client.put(
+            app.url_path_for(
+                "offers:accept-offer-from-user",
+                cleaning_id=str(test_cleaning_with_offers.id),
+                username="nobodyhere",
+            )
+        )
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+        assert res.json()["detail"] == "No user found with that username"
+
+
+class TestOfferTransitions:
+    @pytest.mark.parametrize("action", list(OfferAction))
+    def test_compiled_transitions_bind_their_values(self, action: OfferAction) -> None:
+        query = OFFER_TRANSITION_QUERIES[action]
+        values = {"cleaning_id", "user_id", *offer_transition_values(OFFER_TRANSITIONS[action])}
+        assert set(re.findall(r"(?<!:):(\w+)", query)) == values
+
+    async def test_transition_errors(
+            self,
+            app: FastAPI,
+            client: AsyncClient,
+            db: Database,
+            test_user2: UserInDB,
+            test_user3: UserInDB,
+            test_cleaning_with_offers: CleaningInDB,
+    ) -> None:
+        offers_repo = OffersRepository(db)
+        cases = (
+            (5000000, test_user3.id, status.HTTP_404_NOT_FOUND, "No Cleaning found with that id."),
+            (test_cleaning_with_offers.id, test_user2.id, status.HTTP_404_NOT_FOUND, "Offer not found."),
+            (
+                test_cleaning_with_offers.id,
+                test_user3.id,
+                status.HTTP_400_BAD_REQUEST,
+                "Can only cancel offers that have been accepted.",
+            ),
+        )
+        for cleaning_id, user_id, status_code, detail in cases:
+            with pytest.raises(HTTPException) as e:
+                await offers_repo.transition_offer(
+                    cleaning_id=cleaning_id, user_id=user_id, action=OfferAction.cancel
+                )
+            assert (e.value.status_code, e.value.detail) == (status_code, detail)
+
+        rejected = await offers_repo.transition_offer(
+            cleaning_id=test_cleaning_with_offers.id, user_id=test_user3.id, action=OfferAction.reject
+        )
+        assert rejected.status == "rejected"
+
+
+class TestConcurrentOfferDecisions:
+    async def test_concurrent_accepts_leave_one_accepted_offer(
+            self,
+            app: FastAPI,
+            client: AsyncClient,
+            db: Database,
+            test_user_list: List[UserInDB],
+            test_cleaning_with_offers: CleaningInDB,
+    ) -> None:
+        offers_repo = OffersRepository(db)
+        offers = (await offers_repo.list_offers_for_cleaning(cleaning=test_cleaning_with_offers)).items
+
+        async def accept(offer: OfferInDB) -> Union[OfferInDB, HTTPException]:
+            try:
+                return await offers_repo.accept_offer(offer=offer, offer_update=OfferUpdate(status="accepted"))
+            except HTTPException as e:
+                return e
+
+        # tasks inherit the test's database connection, an empty context gives each its own
+        results = await asyncio.gather(
+            *[contextvars.Context().run(asyncio.ensure_future, accept(offer)) for offer in offers]
+        )
+        accepted = [result for result in results if isinstance(result, OfferInDB)]
+        assert len(accepted) == 1
+        # losers either find their offer already rejected by the winner or collide with it on the unique index
+        assert all(
+            (result.status_code, result.detail) in {
+                (status.HTTP_400_BAD_REQUEST, "Can only accept offers that are currently pending."),
+                (status.HTTP_409_CONFLICT, "The cleaning job already has an accepted offer"),
+            }
+            for result in results if result not in accepted
+        )
+
+        offers = (await offers_repo.list_offers_for_cleaning(cleaning=test_cleaning_with_offers)).items
+        assert sorted(o.status for o in offers) == ["accepted"] + ["rejected"] * (len(test_user_list) - 1)
+
+        with pytest.raises(HTTPException):
+            await offers_repo.rescind_offer(offer=accepted[0])
+        await offers_repo.cancel_offer(offer=accepted[0], offer_update=OfferUpdate(status="cancelled"))
+        with pytest.raises(HTTPException):
+            await offers_repo.cancel_offer(offer=accepted[0], offer_update=OfferUpdate(status="cancelled"))
+
+    async def test_losing_an_accept_race_is_a_conflict(
+            self, app: FastAPI, client: AsyncClient, db: Database, test_cleaning_with_offers: CleaningInDB
+    ) -> None:
+        offers_repo = OffersRepository(db)
+        winner, loser = (await offers_repo.list_offers_for_cleaning(cleaning=test_cleaning_with_offers)).items[:2]
+        # the winner's accept committed, the loser's offer is still pending as if read before it
+        await db.execute(
+            "UPDATE user_offers_for_cleanings SET status = 'accepted' "
+            "WHERE cleaning_id = :cleaning_id AND user_id = :user_id",
+            values={"cleaning_id": winner.cleaning_id, "user_id": winner.user_id},
+        )
+        with pytest.raises(HTTPException) as e:
+            await offers_repo.accept_offer(offer=loser, offer_update=OfferUpdate(status="accepted"))
+        assert e.value.status_code == status.HTTP_409_CONFLICT
+
+
+class TestBatchOffers:
+    async def test_cleaner_creates_offers_for_many_cleanings(
+            self,
+            app: FastAPI,
+            create_authorized_client: Callable,
+            db: Database,
+            test_user2: UserInDB,
+            test_user3: UserInDB,
+            test_cleaning_with_offers: CleaningInDB,
+    ) -> None:
+        cleaning_repo = CleaningsRepository(db)
+        open_cleaning, own_cleaning = [
+            await cleaning_repo.create_cleaning(
+                new_cleaning=CleaningCreate(name="batch offer", price=5, cleaning_type="dust_up"), requesting_user=user
+            )
+            for user in (test_user2, test_user3)
+        ]
+        cleaning_ids = [open_cleaning.id, test_cleaning_with_offers.id, own_cleaning.id, 5000000, open_cleaning.id]
+        res = await create_authorized_client(user=test_user3).post(
+            app.url_path_for("offers:create-offers-batch"), json={"cleaning_ids": cleaning_ids}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        outcomes = res.json()
+        assert [o["cleaning_id"] for o in outcomes] == cleaning_ids[:4]
+        assert outcomes[0]["offer"]["status"] == "pending" and outcomes[0]["error"] is None
+        assert [o["offer"] for o in outcomes[1:]] == [None, None, None]
+        assert outcomes[1]["error"] == "Users aren't allowed create more than one offer for cleaning job."
+        assert outcomes[2]["error"] == "Users are unable to create offers for cleaning jobs they own."
+        assert outcomes[3]["error"] == "No Cleaning found with that id."
+
+    async def test_owner_decides_offers_across_cleanings(
+            self,
+            app: FastAPI,
+            create_authorized_client: Callable,
+            db: Database,
+            test_user2: UserInDB,
+            test_user_list: List[UserInDB],
+            test_cleaning_with_offers: CleaningInDB,
+    ) -> None:
+        offers_repo = OffersRepository(db)
+        other_cleaning = await CleaningsRepository(db).create_cleaning(
+            new_cleaning=CleaningCreate(name="batch decide", price=5, cleaning_type="dust_up"),
+            requesting_user=test_user2,
+        )
+        for user in test_user_list[:2]:
+            await offers_repo.create_offer_for_cleaning(
+                new_offer=OfferCreate(cleaning_id=other_cleaning.id, user_id=user.id)
+            )
+        accepted, second, *rest = test_user_list
+        decisions = [
+            {"cleaning_id": test_cleaning_with_offers.id, "user_id": accepted.id, "status": "accepted"},
+            {"cleaning_id": test_cleaning_with_offers.id, "user_id": second.id, "status": "accepted"},
+            {"cleaning_id": other_cleaning.id, "user_id": accepted.id, "status": "rejected"},
+            {"cleaning_id": other_cleaning.id, "user_id": rest[0].id, "status": "rejected"},
+        ]
+        res = await create_authorized_client(user=test_user2).put(
+            app.url_path_for("offers:decide-offers-batch"), json={"decisions": decisions}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        outcomes = res.json()
+        assert [o["offer"]["status"] if o["offer"] else o["error"] for o in outcomes] == [
+            "accepted",
+            "The cleaning job already has an accepted offer",
+            "rejected",
+            "Offer not found.",
+        ]
+        offers = await offers_repo.list_offers_for_cleaning(cleaning=test_cleaning_with_offers)
+        assert {o.user_id: o.status for o in offers.items} == {
+            user.id: "accepted" if user == accepted else "rejected" for user in test_user_list
+        }
+        other_offers = await offers_repo.list_offers_for_cleaning(cleaning=other_cleaning)
+        assert {o.user_id: o.status for o in other_offers.items} == {accepted.id: "rejected", second.id: "pending"}
+
+    async def test_only_owners_decide_and_only_accept_or_reject(
+            self,
+            app: FastAPI,
+            create_authorized_client: Callable,
+            test_user3: UserInDB,
+            test_cleaning_with_offers: CleaningInDB,
+    ) -> None:
+        authorized_client = create_authorized_client(user=test_user3)
+        decision = {"cleaning_id": test_cleaning_with_offers.id, "user_id": test_user3.id, "status": "accepted"}
+        res = await authorized_client.put(
+            app.url_path_for("offers:decide-offers-batch"), json={"decisions": [decision]}
+        )
+        assert res.json()[0]["error"] == "Only the owner of the cleaning may accept or reject offers."
+        res = await authorized_client.put(
+            app.url_path_for("offers:decide-offers-batch"), json={"decisions": [{**decision, "status": "completed"}]}
+        )
+        assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestTrustedOfferResponses:
+    @pytest.mark.parametrize(
+        "build, response_model",
+        (
+            (
+                lambda i, now: OfferInDB(cleaning_id=1, user_id=i, status="pending", created_at=now, updated_at=now),
+                OfferPublic,
+            ),
+            (
+                lambda i, now: EvaluationInDB(
+                    cleaning_id=i, cleaner_id=1, headline="great", comment="spotless", professionalism=5,
+                    completeness=4, efficiency=5, overall_rating=5, created_at=now, updated_at=now,
+                ),
+                EvaluationPublic,
+            ),
+        ),
+    )
+    async def test_trusted_response_matches_default_encoding(self, monkeypatch, build, response_model) -> None:
+        now = datetime.now(timezone.utc)
+        page = Page(items=[build(i, now) for i in (1, 2)], next_cursor="abc")
+        # what FastAPI writes for a route returning the page with response_model=Page[response_model]
+        field = create_response_field(name="response", type_=Page[response_model])
+        expected = json.loads(JSONResponse(await serialize_response(field=field, response_content=page)).body)
+
+        assert json.loads(TrustedJSONResponse(page, response_model=Page[response_model]).body) == expected
+        monkeypatch.setattr(responses, "orjson", None)
+        assert json.loads(TrustedJSONResponse(page, response_model=Page[response_model]).body) == expected
+
+    def test_fields_outside_the_response_model_are_not_written(self) -> None:
+        class OfferWithInternals(OfferInDB):
+            internal_note: str = "not for clients"
+
+        offer = OfferWithInternals(cleaning_id=1, user_id=2, status="pending")
+        body = json.loads(TrustedJSONResponse(Page(items=[offer]), response_model=Page[OfferPublic]).body)
+        assert set(body["items"][0]) == set(OfferPublic.__fields__)
+        assert body["items"][0]["user"] is None and body["items"][0]["cleaning"] is None
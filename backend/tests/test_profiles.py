@@ -118,3 +118,26 @@ class TestProfileManagement:
         )
         assert res.status_code == status_code
 
+
+class TestConditionalGetProfile:
+    async def test_matching_etag_is_not_modified(
+            self, app: FastAPI, authorized_client: AsyncClient, test_user2: UserInDB
+    ) -> None:
+        url = app.url_path_for("profiles:get-profile-by-username", username=test_user2.username)
+        res = await authorized_client.get(url)
+        assert res.status_code == status.HTTP_200_OK
+        etag = res.headers["etag"]
+        res = await authorized_client.get(url, headers={"If-None-Match": etag})
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+        assert res.content == b""
+
+    async def test_profile_update_changes_etag(
+            self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        url = app.url_path_for("profiles:get-profile-by-username", username=test_user.username)
+        etag = (await authorized_client.get(url)).headers["etag"]
+        res = await authorized_client.put(app.url_path_for("profiles:update-own-profile"), json={"bio": "changed"})
+        assert res.status_code == status.HTTP_200_OK
+        res = await authorized_client.get(url, headers={"If-None-Match": etag})
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["etag"] != etag
@@ -0,0 +1,102 @@
+import pytest
+
+from databases import Database
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from app.core.config import DATABASE_REPLICA_URL
+from app.db.repositories.base import BaseRepository, reads, writes
+from app.db.unit_of_work import UnitOfWork
+from app.models.user import UserInDB
+from app.services.recent_writers import RecentWriters
+
+# DATABASE_REPLICA_URL points at a streaming replica of the primary, e.g. a second local instance
+pytestmark = [
+    pytest.mark.asyncio,
+    pytest.mark.skipif(not DATABASE_REPLICA_URL, reason="DATABASE_REPLICA_URL is not configured"),
+]
+
+IN_RECOVERY_QUERY = "SELECT pg_is_in_recovery();"
+
+
+class ProbeRepository(BaseRepository):
+    @reads
+    async def on_replica(self) -> bool:
+        return await self.db.fetch_val(query=IN_RECOVERY_QUERY)
+
+    @writes
+    async def on_replica_while_writing(self) -> bool:
+        return await self.on_replica()
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def replica(app: FastAPI, client: AsyncClient) -> Database:
+    return app.state._db_replica
+
+
+class TestReplicaRouting:
+    async def test_reads_go_to_the_replica_and_everything_else_to_the_primary(
+            self, app: FastAPI, client: AsyncClient, db: Database, replica: Database
+    ) -> None:
+        async with UnitOfWork(db, replica=replica) as uow:
+            probe = uow.get_repository(ProbeRepository)
+            assert await probe.on_replica()
+            assert not await uow.fetch_val(IN_RECOVERY_QUERY)
+            async with uow.transaction():
+                assert not await probe.on_replica()
+
+    async def test_reads_stay_on_the_primary_once_the_unit_of_work_wrote(
+            self, app: FastAPI, client: AsyncClient, db: Database, replica: Database
+    ) -> None:
+        async with UnitOfWork(db, replica=replica) as uow:
+            probe = uow.get_repository(ProbeRepository)
+            assert not await probe.on_replica_while_writing()
+            assert not await probe.on_replica()
+
+    async def test_users_read_their_writes_for_the_window(
+            self, app: FastAPI, client: AsyncClient, db: Database, replica: Database, test_user: UserInDB
+    ) -> None:
+        clock = FakeClock()
+        recent_writers = RecentWriters(window_seconds=5.0, clock=clock)
+
+        async def on_replica(user_id: int, *, write: bool = False) -> bool:
+            async with UnitOfWork(db, replica=replica, recent_writers=recent_writers) as uow:
+                uow.user_id = user_id
+                probe = uow.get_repository(ProbeRepository)
+                if write:
+                    await probe.on_replica_while_writing()
+                return await probe.on_replica()
+
+        assert await on_replica(test_user.id)
+        await on_replica(test_user.id, write=True)
+        clock.now = 4.0
+        assert not await on_replica(test_user.id)
+        assert await on_replica(test_user.id + 1)
+        clock.now = 5.5
+        assert await on_replica(test_user.id)
+
+    async def test_api_reads_after_a_write_see_it(
+            self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        res = await authorized_client.put(
+            app.url_path_for("profiles:update-own-profile"), json={"full_name": "Replica Reader"}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        res = await authorized_client.get(
+            app.url_path_for("profiles:get-profile-by-username", username=test_user.username)
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["full_name"] == "Replica Reader"
+
+    async def test_readiness_reports_the_replica_pool(self, app: FastAPI, client: AsyncClient) -> None:
+        res = await client.get(app.url_path_for("health:readiness"))
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["replica_pool"]["size"] >= 1
@@ -0,0 +1,175 @@
+import pytest
+
+from databases import Database
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from app.api.dependencies.database import get_repository
+from app.db.repositories.base import BaseRepository, writes
+from app.db.repositories.cleanings import CleaningsRepository
+from app.db.repositories.profiles import ProfilesRepository
+from app.db.repositories.users import GET_USER_BY_USERNAME_QUERY, UsersRepository
+from app.db.statements import Statement, statements as statement_registry
+from app.db.unit_of_work import IdentityMap, UnitOfWork
+from app.models.cleaning import CleaningInDB, CleaningUpdate
+from app.models.user import UserInDB
+from app.services.recent_writers import RecentWriters
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def count_queries(uow: UnitOfWork) -> list:
+    """
+    Record every statement that reaches the leased connection, registered ones included.
+    """
+    statements = []
+    connection = uow.connection
+    original_fetch_one = connection.fetch_one
+
+    async def fetch_one(query, values=None):
+        statements.append(query)
+        return await original_fetch_one(query, values)
+
+    async def run_prepared(query, method, values):
+        statements.append(query)
+        return await original_run_prepared(query, method, values)
+
+    connection.fetch_one = fetch_one
+    original_run_prepared = uow._run_prepared
+    uow._run_prepared = run_prepared
+    return statements
+
+
+class WriterRepository(BaseRepository):
+    @writes
+    async def write(self, *, fail: bool) -> None:
+        await self.db.execute(query="SELECT 1")
+        if fail:
+            raise ValueError("write failed")
+
+
+class TestRepositoryDependencies:
+    def test_get_repository_is_memoized_per_type(self) -> None:
+        assert get_repository(UsersRepository) is get_repository(UsersRepository)
+        assert get_repository(UsersRepository) is not get_repository(CleaningsRepository)
+
+    async def test_unit_of_work_shares_repository_instances(
+            self, app: FastAPI, client: AsyncClient, db: Database
+    ) -> None:
+        async with UnitOfWork(db) as uow:
+            users_repo = uow.get_repository(UsersRepository)
+            assert uow.get_repository(UsersRepository) is users_repo
+            assert users_repo.profiles_repo is uow.get_repository(ProfilesRepository)
+
+
+class TestUnitOfWork:
+    async def test_connection_is_leased_lazily_and_released_on_close(
+            self, app: FastAPI, client: AsyncClient, db: Database
+    ) -> None:
+        uow = UnitOfWork(db)
+        assert not uow.is_leased
+        await uow.fetch_val("SELECT 1")
+        assert uow.is_leased
+        await uow.close()
+        assert not uow.is_leased
+
+    async def test_transactions_run_on_the_leased_connection(
+            self, app: FastAPI, client: AsyncClient, db: Database
+    ) -> None:
+        async with UnitOfWork(db) as uow:
+            backend_pid = await uow.fetch_val("SELECT pg_backend_pid()")
+            async with uow.transaction():
+                assert await uow.fetch_val("SELECT pg_backend_pid()") == backend_pid
+            assert await uow.fetch_val("SELECT pg_backend_pid()") == backend_pid
+
+    async def test_rows_are_loaded_once_per_unit_of_work(
+            self, app: FastAPI, client: AsyncClient, db: Database, test_user: UserInDB
+    ) -> None:
+        async with UnitOfWork(db) as uow:
+            statements = count_queries(uow)
+            users_repo = uow.get_repository(UsersRepository)
+
+            by_username = await users_repo.get_user_by_username(username=test_user.username)
+            by_email = await users_repo.get_user_by_email(email=test_user.email)
+            again = await users_repo.get_user_by_username(username=test_user.username)
+
+            assert by_username.id == by_email.id == again.id == test_user.id
+            assert len(statements) == 1
+
+    async def test_writes_invalidate_loaded_rows(
+            self, app: FastAPI, client: AsyncClient, db: Database, test_user: UserInDB, test_cleaning: CleaningInDB
+    ) -> None:
+        async with UnitOfWork(db) as uow:
+            statements = count_queries(uow)
+            cleanings_repo = uow.get_repository(CleaningsRepository)
+
+            cleaning = await cleanings_repo.get_cleaning_by_id(id=test_cleaning.id, requesting_user=test_user)
+            await cleanings_repo.update_cleaning(cleaning=cleaning, cleaning_update=CleaningUpdate(price=19.99))
+            updated = await cleanings_repo.get_cleaning_by_id(id=test_cleaning.id, requesting_user=test_user)
+
+            assert updated.price == 19.99
+            assert len(statements) == 3
+
+    async def test_only_successful_writes_pin_the_user_to_the_primary(
+            self, app: FastAPI, client: AsyncClient, db: Database
+    ) -> None:
+        recent_writers = RecentWriters(window_seconds=60)
+        async with UnitOfWork(db, recent_writers=recent_writers) as uow:
+            uow.user_id = 1
+            with pytest.raises(ValueError):
+                await uow.get_repository(WriterRepository).write(fail=True)
+            assert not recent_writers.wrote_recently(user_id=1)
+
+            await uow.get_repository(WriterRepository).write(fail=False)
+            assert recent_writers.wrote_recently(user_id=1)
+
+    async def test_repositories_without_unit_of_work_always_query(
+            self, app: FastAPI, client: AsyncClient, db: Database, test_user: UserInDB
+    ) -> None:
+        users_repo = UsersRepository(db)
+        assert users_repo.uow is None
+        assert (await users_repo.get_user_by_email(email=test_user.email)).id == test_user.id
+
+
+class TestStatementRegistry:
+    def test_named_parameters_compile_to_positional_ones(self) -> None:
+        statement = Statement("query", "SELECT 'x'::text, CAST(:a AS int), :b WHERE x = :a;")
+        assert statement.sql == "SELECT 'x'::text, CAST($1 AS int), $2 WHERE x = $1;"
+        assert statement.args({"b": "two", "a": 1}) == [1, "two"]
+
+    async def test_registered_queries_are_run_and_timed_by_the_registry(
+            self, app: FastAPI, client: AsyncClient, db: Database, test_user: UserInDB
+    ) -> None:
+        statement = statement_registry.get(GET_USER_BY_USERNAME_QUERY)
+        assert statement is not None
+        calls = statement.calls
+        async with UnitOfWork(db) as uow:
+            user = await uow.get_repository(UsersRepository).get_user_by_username(username=test_user.username)
+        assert user.id == test_user.id
+        assert statement.calls == calls + 1
+        assert statement.name in {stats.name for stats in statement_registry.stats()}
+
+
+class TestIdentityMap:
+    def test_rows_are_registered_under_every_identity_column(self) -> None:
+        identity_map = IdentityMap()
+        row = {"id": 1, "username": "lebronjames", "email": "lebron@james.io"}
+        identity_map.add("users", row, columns=("id", "username", "email"))
+
+        assert identity_map.get("users", "id", 1) is row
+        assert identity_map.get("users", "email", "lebron@james.io") is row
+        assert identity_map.get("users", "username", "other") is None
+        assert len(identity_map) == 1
+
+    def test_composite_keys_and_invalidation(self) -> None:
+        identity_map = IdentityMap()
+        offer = {"cleaning_id": 1, "user_id": 2, "status": "pending"}
+        cleaning = {"id": 1}
+        identity_map.add("user_offers_for_cleanings", offer, columns=(("cleaning_id", "user_id"),))
+        identity_map.add("cleanings", cleaning, columns=("id",))
+        assert identity_map.get("user_offers_for_cleanings", ("cleaning_id", "user_id"), (1, 2)) is offer
+
+        identity_map.invalidate("user_offers_for_cleanings")
+        assert identity_map.get("user_offers_for_cleanings", ("cleaning_id", "user_id"), (1, 2)) is None
+        assert identity_map.get("cleanings", "id", 1) is cleaning
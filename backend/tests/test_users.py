@@ -1,3 +1,7 @@
+import asyncio
+import threading
+from datetime import datetime
+
 import jwt
 import pytest
 from databases import Database
@@ -6,21 +10,26 @@ from httpx import AsyncClient
 from fastapi import FastAPI, HTTPException
 from pydantic import ValidationError
 from starlette.datastructures import Secret
-from typing import Union, Type, Optional
+from typing import List, Union, Type, Optional
 
 from starlette.status import (
     HTTP_200_OK,
     HTTP_201_CREATED,
+    HTTP_304_NOT_MODIFIED,
     HTTP_400_BAD_REQUEST,
     HTTP_401_UNAUTHORIZED,
     HTTP_404_NOT_FOUND,
     HTTP_422_UNPROCESSABLE_ENTITY
 )
 
-from app.core.config import SECRET_KEY, JWT_AUDIENCE, ACCESS_TOKEN_EXPIRE_MINUTES, JWT_ALGORITHM
-from app.models.user import UserCreate, UserInDB, UserPublic
+from app.core.config import SECRET_KEY, JWT_AUDIENCE, ACCESS_TOKEN_EXPIRE_MINUTES, JWT_ALGORITHM, JWT_TOKEN_PREFIX
+from app.models.user import UserCreate, UserInDB, UserPublic, UserUpdate
 from app.db.repositories.users import UsersRepository
-from app.services import auth_service
+from app.db.repositories.revocations import RevocationsRepository
+from app.services import auth_service, principal_cache, revocation_list
+from app.services.principal_cache import PrincipalCache
+from app.services.authentication import AuthService
+from app.services.hashing import HashingPool, HashingPoolSaturated
 
 
 pytesmark = pytest.mark.asyncio
@@ -280,3 +289,353 @@ class TestUserMe:
             app.url_path_for("users:get-current-user"), headers={"Authorization": f"{jwt_prefix} {token}"}
         )
         assert res.status_code == HTTP_401_UNAUTHORIZED
+
+
+    async def test_matching_etag_is_not_modified(self, app: FastAPI, authorized_client: AsyncClient) -> None:
+        res = await authorized_client.get(app.url_path_for("users:get-current-user"))
+        assert res.status_code == HTTP_200_OK
+        assert res.headers["cache-control"] == "private, no-cache"
+        res = await authorized_client.get(
+            app.url_path_for("users:get-current-user"), headers={"If-None-Match": res.headers["etag"]}
+        )
+        assert res.status_code == HTTP_304_NOT_MODIFIED
+        assert res.content == b""
+
+
+class TestPasswordHashingPool:
+    async def test_async_hashing_round_trips_through_the_pool(self) -> None:
+        service = AuthService(hashing_pool=HashingPool(kind="thread", max_workers=1, max_queue=1))
+        password_update = await service.create_salt_and_hashed_password_async(plaintext_password="password123")
+        assert password_update.password != "password123"
+
+        assert await service.verify_password_async(
+            password="password123", salt=password_update.salt, hashed_pw=password_update.password
+        )
+        assert not await service.verify_password_async(
+            password="wrongpassword", salt=password_update.salt, hashed_pw=password_update.password
+        )
+        # sync and async variants must stay interchangeable
+        assert service.verify_password(
+            password="password123", salt=password_update.salt, hashed_pw=password_update.password
+        )
+
+        stats = service.hashing_pool.stats()
+        assert stats["submitted"] == stats["completed"] == 3
+        assert stats["in_flight"] == 0
+        assert stats["hash_seconds_total"] > 0
+        assert stats["queue_wait_seconds_total"] >= 0
+        service.hashing_pool.shutdown()
+
+    async def test_saturated_pool_rejects_work(self) -> None:
+        pool = HashingPool(kind="thread", max_workers=1, max_queue=0)
+        release = threading.Event()
+        blocked = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0)
+
+        with pytest.raises(HashingPoolSaturated):
+            await pool.run(len, "password")
+
+        release.set()
+        assert await blocked is True
+        assert await pool.run(len, "password") == 8
+
+        stats = pool.stats()
+        assert stats["rejected"] == 1
+        assert stats["completed"] == 2
+        pool.shutdown()
+
+    async def test_cancelled_callers_job_counts_until_the_worker_finishes_it(self) -> None:
+        pool = HashingPool(kind="thread", max_workers=1, max_queue=0)
+        release = threading.Event()
+        blocked = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0)
+        blocked.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await blocked
+
+        try:
+            # the worker is still busy, so is the pool
+            assert pool.in_flight == 1
+            with pytest.raises(HashingPoolSaturated):
+                await pool.run(len, "password")
+        finally:
+            release.set()
+        while pool.in_flight:
+            await asyncio.sleep(0.01)
+        assert await pool.run(len, "password") == 8
+        pool.shutdown()
+
+    async def test_saturated_pool_surfaces_as_service_unavailable(self) -> None:
+        pool = HashingPool(kind="thread", max_workers=1, max_queue=0)
+        service = AuthService(hashing_pool=pool)
+        release = threading.Event()
+        blocked = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await service.hash_password_async(password="password123", salt=service.generate_salt())
+        assert exc_info.value.status_code == 503
+
+        release.set()
+        await blocked
+        pool.shutdown()
+
+    async def test_process_pool_hashes_off_the_event_loop(self) -> None:
+        service = AuthService(hashing_pool=HashingPool(kind="process", max_workers=1, max_queue=1))
+        salt = service.generate_salt()
+        hashed_pw = await service.hash_password_async(password="password123", salt=salt)
+        assert service.verify_password(password="password123", salt=salt, hashed_pw=hashed_pw)
+        service.hashing_pool.shutdown()
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_user(id: int) -> UserInDB:
+    return UserInDB(
+        id=id, email=f"user{id}@mail.io", username=f"user{id}", password="hashedpassword", salt="salt"
+    )
+
+
+class TestPrincipalCache:
+    def test_cache_hits_misses_and_ttl(self) -> None:
+        test_user = make_user(1)
+        clock = FakeClock()
+        cache = PrincipalCache(max_size=10, ttl_seconds=5, clock=clock)
+        assert cache.get("token") is None
+
+        cache.set("token", test_user)
+        assert cache.get("token") == test_user
+
+        clock.now = 6
+        assert cache.get("token") is None
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 2
+        assert stats["expirations"] == 1
+        assert stats["size"] == 0
+
+    def test_cache_never_outlives_the_token(self) -> None:
+        test_user = make_user(1)
+        cache = PrincipalCache(max_size=10, ttl_seconds=60)
+        cache.set("expired-token", test_user, token_expires_at=datetime.timestamp(datetime.utcnow()) - 1)
+        assert cache.get("expired-token") is None
+
+    def test_cache_evicts_least_recently_used(self) -> None:
+        test_user, test_user2 = make_user(1), make_user(2)
+        cache = PrincipalCache(max_size=2, ttl_seconds=60)
+        cache.set("first", test_user)
+        cache.set("second", test_user2)
+        assert cache.get("first") == test_user
+        cache.set("third", test_user2)
+
+        assert cache.get("second") is None
+        assert cache.get("first") == test_user
+        assert cache.stats()["evictions"] == 1
+
+    def test_hits_are_copies_requests_cannot_change(self) -> None:
+        class UserWithScopes(UserInDB):
+            scopes: List[str] = []
+
+        test_user = UserWithScopes(**make_user(1).dict(), scopes=["read"])
+        cache = PrincipalCache(max_size=10, ttl_seconds=60)
+        cache.set("token", test_user)
+        test_user.username = "changed-after-set"
+        test_user.scopes.append("appended-after-set")
+
+        first = cache.get("token")
+        first.username = "changed-by-a-request"
+        first.scopes.append("appended-by-a-request")
+        second = cache.get("token")
+        assert second is not first
+        assert second.username == "user1"
+        assert second.scopes == ["read"]
+
+    def test_invalidate_user_drops_all_of_their_tokens(self) -> None:
+        test_user, test_user2 = make_user(1), make_user(2)
+        cache = PrincipalCache(max_size=10, ttl_seconds=60)
+        cache.set("phone", test_user)
+        cache.set("laptop", test_user)
+        cache.set("other", test_user2)
+
+        assert cache.invalidate_user(user_id=test_user.id) == 2
+        assert cache.get("phone") is None
+        assert cache.get("laptop") is None
+        assert cache.get("other") == test_user2
+        assert cache.stats()["invalidations"] == 2
+
+
+class TestCachedPrincipalResolution:
+    async def _register(self, db: Database, username: str) -> UserInDB:
+        user_repo = UsersRepository(db)
+        await user_repo.register_new_user(
+            new_user=UserCreate(email=f"{username}@mail.io", username=username, password="password123")
+        )
+        return await user_repo.get_user_by_email(email=f"{username}@mail.io")
+
+    async def test_repeated_requests_are_served_from_cache(
+            self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        principal_cache.clear()
+        principal_cache.reset_stats()
+
+        for _ in range(3):
+            res = await authorized_client.get(app.url_path_for("users:get-current-user"))
+            assert res.status_code == HTTP_200_OK
+            assert res.json()["username"] == test_user.username
+
+        stats = principal_cache.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 2
+
+    async def test_deactivated_user_is_rejected_immediately(
+            self, app: FastAPI, client: AsyncClient, db: Database
+    ) -> None:
+        user = await self._register(db, "soontobegone")
+        token = auth_service.create_access_token_for_user(user=user, secret_key=str(SECRET_KEY))
+        headers = {"Authorization": f"{JWT_TOKEN_PREFIX} {token}"}
+
+        res = await client.get(app.url_path_for("users:get-current-user"), headers=headers)
+        assert res.status_code == HTTP_200_OK
+
+        await UsersRepository(db).deactivate_user(user=user)
+        res = await client.get(app.url_path_for("users:get-current-user"), headers=headers)
+        assert res.status_code == HTTP_401_UNAUTHORIZED
+
+    async def test_revocations_reach_cached_tokens_without_invalidation(
+            self, app: FastAPI, client: AsyncClient, db: Database
+    ) -> None:
+        user = await self._register(db, "revokedwhilecached")
+        token = auth_service.create_access_token_for_user(user=user, secret_key=str(SECRET_KEY))
+        headers = {"Authorization": f"{JWT_TOKEN_PREFIX} {token}"}
+
+        res = await client.get(app.url_path_for("users:get-current-user"), headers=headers)
+        assert res.status_code == HTTP_200_OK
+
+        # revoked by another worker, only the refreshed revocation list knows about it
+        await RevocationsRepository(db).revoke_user_tokens(user_id=user.id)
+        await revocation_list.refresh(db)
+        res = await client.get(app.url_path_for("users:get-current-user"), headers=headers)
+        assert res.status_code == HTTP_401_UNAUTHORIZED
+        assert res.json()["detail"] == "Token has been revoked."
+
+    async def test_username_change_invalidates_cached_tokens(
+            self, app: FastAPI, client: AsyncClient, db: Database
+    ) -> None:
+        user = await self._register(db, "renameme")
+        token = auth_service.create_access_token_for_user(user=user, secret_key=str(SECRET_KEY))
+        headers = {"Authorization": f"{JWT_TOKEN_PREFIX} {token}"}
+
+        res = await client.get(app.url_path_for("users:get-current-user"), headers=headers)
+        assert res.status_code == HTTP_200_OK
+
+        updated_user = await UsersRepository(db).update_user(user=user, user_update=UserUpdate(username="renamed"))
+        assert updated_user.username == "renamed"
+        assert updated_user.email == user.email
+
+        res = await client.get(app.url_path_for("users:get-current-user"), headers=headers)
+        assert res.status_code == HTTP_401_UNAUTHORIZED
+
+
+@pytest.fixture
+def stateless_principal(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("app.api.dependencies.auth.AUTH_STATELESS_PRINCIPAL", True)
+
+
+class TestStatelessPrincipal:
+    async def _register(self, db: Database, username: str) -> UserInDB:
+        user_repo = UsersRepository(db)
+        await user_repo.register_new_user(
+            new_user=UserCreate(email=f"{username}@mail.io", username=username, password="password123")
+        )
+        return await user_repo.get_user_by_email(email=f"{username}@mail.io")
+
+    def _auth_headers(self, user: UserInDB) -> dict:
+        token = auth_service.create_access_token_for_user(user=user, secret_key=str(SECRET_KEY))
+        return {"Authorization": f"{JWT_TOKEN_PREFIX} {token}"}
+
+    async def test_token_carries_principal_claims(self, app: FastAPI, client: AsyncClient, test_user: UserInDB) -> None:
+        token = auth_service.create_access_token_for_user(user=test_user, secret_key=str(SECRET_KEY))
+        payload = auth_service.get_payload_from_token(token=token, secret_key=str(SECRET_KEY))
+        assert payload.user_id == test_user.id
+        assert payload.is_active is True
+        assert payload.is_superuser is False
+
+    async def test_principal_is_built_from_claims_without_users_lookup(
+            self, app: FastAPI, client: AsyncClient, test_user: UserInDB, stateless_principal: None
+    ) -> None:
+        # the username doesn't exist, so only a claims based principal can get through
+        ghost = test_user.copy(update={"username": "ghost_user"})
+        headers = self._auth_headers(ghost)
+
+        res = await client.get(app.url_path_for("cleanings:list-all-user-cleanings"), headers=headers)
+        assert res.status_code == HTTP_200_OK
+
+        # routes that need the full row still look the user up
+        res = await client.get(app.url_path_for("users:get-current-user"), headers=headers)
+        assert res.status_code == HTTP_401_UNAUTHORIZED
+
+    async def test_claims_are_ignored_without_stateless_mode(
+            self, app: FastAPI, client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        ghost = test_user.copy(update={"username": "ghost_user"})
+        res = await client.get(
+            app.url_path_for("cleanings:list-all-user-cleanings"), headers=self._auth_headers(ghost)
+        )
+        assert res.status_code == HTTP_401_UNAUTHORIZED
+
+    async def test_inactive_claims_are_rejected(
+            self, app: FastAPI, client: AsyncClient, test_user: UserInDB, stateless_principal: None
+    ) -> None:
+        inactive = test_user.copy(update={"is_active": False})
+        res = await client.get(
+            app.url_path_for("cleanings:list-all-user-cleanings"), headers=self._auth_headers(inactive)
+        )
+        assert res.status_code == HTTP_401_UNAUTHORIZED
+
+    async def test_revoked_tokens_are_rejected_in_memory(
+            self, app: FastAPI, client: AsyncClient, db: Database, stateless_principal: None
+    ) -> None:
+        user = await self._register(db, "revokeme")
+        headers = self._auth_headers(user)
+        res = await client.get(app.url_path_for("cleanings:list-all-user-cleanings"), headers=headers)
+        assert res.status_code == HTTP_200_OK
+
+        await UsersRepository(db).revoke_user_tokens(user=user)
+        res = await client.get(app.url_path_for("cleanings:list-all-user-cleanings"), headers=headers)
+        assert res.status_code == HTTP_401_UNAUTHORIZED
+
+        res = await client.get(
+            app.url_path_for("cleanings:list-all-user-cleanings"), headers=self._auth_headers(user)
+        )
+        assert res.status_code == HTTP_200_OK
+
+    async def test_deactivation_revokes_stateless_tokens(
+            self, app: FastAPI, client: AsyncClient, db: Database, stateless_principal: None
+    ) -> None:
+        user = await self._register(db, "deactivateme")
+        headers = self._auth_headers(user)
+
+        await UsersRepository(db).deactivate_user(user=user)
+        res = await client.get(app.url_path_for("cleanings:list-all-user-cleanings"), headers=headers)
+        assert res.status_code == HTTP_401_UNAUTHORIZED
+
+    async def test_revocations_from_other_processes_are_picked_up_on_refresh(
+            self, app: FastAPI, client: AsyncClient, db: Database, stateless_principal: None
+    ) -> None:
+        user = await self._register(db, "revokedelsewhere")
+        headers = self._auth_headers(user)
+
+        # written straight to the table, like another worker would
+        await RevocationsRepository(db).revoke_user_tokens(user_id=user.id)
+        res = await client.get(app.url_path_for("cleanings:list-all-user-cleanings"), headers=headers)
+        assert res.status_code == HTTP_200_OK
+
+        await revocation_list.refresh(db)
+        res = await client.get(app.url_path_for("cleanings:list-all-user-cleanings"), headers=headers)
+        assert res.status_code == HTTP_401_UNAUTHORIZED